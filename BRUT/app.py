@@ -1,10 +1,24 @@
 import os
-import json
+import time
 import logging
-from flask import Flask, request, jsonify, send_from_directory
+import threading
+
+# startup_seconds is measured from here, so it covers the imports below
+STARTUP_BEGAN = time.perf_counter()
+
+from flask import Flask, Response, request, jsonify, send_from_directory, stream_with_context
 from flask_cors import CORS
-from pdf_processor import extract_outline
-from doc_analyzer import analyze_documents
+from werkzeug.exceptions import RequestEntityTooLarge
+from pdf_processor import extract_outline, watch_directory
+from doc_analyzer import (analyze_documents, analyze_queries, iter_analysis, index_document,
+                          parse_priority, parse_queries)
+from model_registry import registry
+from score_cache import get_score_cache
+from extraction_cache import get_cache
+from metrics import metrics, process_memory, StageTimings, ANALYSIS_TIMINGS
+from job_manager import JobManager, JobQueueFull
+from ingest import ingest_upload, UploadTooLarge, MAX_UPLOAD_BYTES
+from responses import dumps, json_response
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -13,10 +27,56 @@ app = Flask(__name__, static_folder='static')
 app.secret_key = os.environ.get("SESSION_SECRET", "adobe-hackathon-2025-secret")
 CORS(app)
 
+# Reject oversized uploads from Content-Length before the body is read
+app.config["MAX_CONTENT_LENGTH"] = MAX_UPLOAD_BYTES
+
+# Also write analysis results to output/analysis_output.json (per request: "save_output")
+SAVE_ANALYSIS_OUTPUT = os.environ.get("SAVE_ANALYSIS_OUTPUT", "0") == "1"
+ANALYSIS_OUTPUT_PATH = os.path.join("output", "analysis_output.json")
+ANALYSIS_QUERIES_OUTPUT_PATH = os.path.join("output", "analysis_queries_output.json")
+
+# Load the classifier while the app is imported; with gunicorn's preload_app
+# (see gunicorn.conf.py) that happens in the master, before workers fork
+PRELOAD_MODEL = os.environ.get("PRELOAD_MODEL", "0") == "1"
+
 # Ensure directories exist
 os.makedirs("input", exist_ok=True)
 os.makedirs("output", exist_ok=True)
 
+# Background executor for asynchronous /analyze jobs
+jobs = JobManager()
+
+# Workers forked after a preload share the weights copy-on-write. A load still
+# running in a thread at fork time would leave its lock held in every worker,
+# so preloading blocks instead. Otherwise load in the background so the first
+# /analyze doesn't pay for it.
+if PRELOAD_MODEL:
+    registry.warm_up(background=False)
+elif os.environ.get("WARM_UP_MODEL", "1") == "1":
+    registry.warm_up(background=True)
+
+# Keep outlines and parsed pages current for PDFs copied straight into input/
+if os.environ.get("WATCH_INPUT", "0") == "1":
+    threading.Thread(target=watch_directory, args=("input", "output"), name="input-watcher", daemon=True).start()
+
+STARTUP_SECONDS = time.perf_counter() - STARTUP_BEGAN
+metrics.set_gauge("startup_seconds", STARTUP_SECONDS)
+app.logger.info(f"App ready in {STARTUP_SECONDS:.2f}s")
+
+@app.before_request
+def _start_request_timer():
+    request.environ["docu.start"] = time.perf_counter()
+
+@app.after_request
+def _record_request_metrics(response):
+    # Label by route pattern, not URL, so job IDs don't create new series
+    endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    start = request.environ.get("docu.start")
+    if start is not None:
+        metrics.observe("http_request_seconds", time.perf_counter() - start, endpoint=endpoint)
+    metrics.inc("http_requests_total", endpoint=endpoint, status=str(response.status_code))
+    return response
+
 @app.route("/")
 def index():
     """Serve the main application page"""
@@ -27,29 +87,51 @@ def upload_pdf():
     """
     Round 1A: Extract structured outline from uploaded PDF
     Analyzes font sizes and styles to identify headings (H1, H2, H3)
+    
+    Accepts a multipart form field "pdf", or a raw application/pdf body
+    with the name in the "filename" query parameter.
     """
     try:
-        if 'pdf' not in request.files:
-            return jsonify({"error": "No PDF file provided"}), 400
+        if request.mimetype == "application/pdf":
+            stream = request.stream
+            filename = request.args.get("filename", "")
+        else:
+            if 'pdf' not in request.files:
+                return jsonify({"error": "No PDF file provided"}), 400
+            
+            file = request.files['pdf']
+            stream = file.stream
+            filename = file.filename
         
-        file = request.files['pdf']
-        if file.filename == '':
+        if not filename:
             return jsonify({"error": "No file selected"}), 400
         
-        if not (file.filename and file.filename.lower().endswith('.pdf')):
+        if not filename.lower().endswith('.pdf'):
             return jsonify({"error": "File must be a PDF"}), 400
         
-        # Save uploaded file
-        filename = file.filename or "unknown.pdf"
-        file_path = os.path.join("input", filename)
-        file.save(file_path)
+        # Stream to disk while hashing; identical content is stored once
+        upload = ingest_upload(stream, filename, "input")
+        
+        # Extract outline using Round 1A logic, straight from the uploaded bytes
+        result = extract_outline(upload.path, digest=upload.digest, data=upload.data)
+        result["upload"] = {
+            "filename": upload.filename,
+            "digest": upload.digest,
+            "size_bytes": upload.size,
+            "duplicate": upload.duplicate
+        }
         
-        # Extract outline using Round 1A logic
-        result = extract_outline(file_path)
+        # Keep the lexical search index in step with the corpus
+        try:
+            index_document("input", upload.filename, upload.digest, upload.data)
+        except Exception as e:
+            app.logger.warning(f"Failed to index {upload.filename}: {str(e)}")
         
-        app.logger.info(f"Successfully processed PDF: {filename}")
-        return jsonify(result)
+        app.logger.info(f"Successfully processed PDF: {upload.filename}")
+        return json_response(result)
         
+    except (UploadTooLarge, RequestEntityTooLarge):
+        return jsonify({"error": f"PDF exceeds the {MAX_UPLOAD_BYTES} byte upload limit"}), 413
     except Exception as e:
         app.logger.error(f"Error processing PDF upload: {str(e)}")
         return jsonify({"error": f"PDF processing failed: {str(e)}"}), 500
@@ -76,31 +158,224 @@ def analyze():
         if not pdf_files:
             return jsonify({"error": "No PDF files found in input directory. Please upload PDFs first."}), 400
         
-        output_path = os.path.join("output", "analysis_output.json")
+        # Include a per-stage timing breakdown in metadata (per request: "timings")
+        timings = bool(data.get("timings", ANALYSIS_TIMINGS))
         
-        # Perform Round 1B analysis
-        analyze_documents("input", persona, job, output_path)
+        try:
+            options = _deadline_options(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        # Stream events as pages are scored when the client asks for it
+        stream_format = _requested_stream_format()
+        if stream_format:
+            return _stream_analysis(persona, job, stream_format, timings, options)
         
-        # Return analysis results
-        with open(output_path, "r") as f:
-            results = json.load(f)
+        save_output = data.get("save_output", SAVE_ANALYSIS_OUTPUT)
+        
+        # Perform Round 1B analysis
+        results = analyze_documents("input", persona, job, ANALYSIS_OUTPUT_PATH if save_output else None,
+                                    timings=timings, **options)
         
         app.logger.info(f"Successfully analyzed {len(pdf_files)} PDFs for persona: {persona}")
-        return jsonify(results)
+        return json_response(results)
         
     except Exception as e:
         app.logger.error(f"Error during document analysis: {str(e)}")
         return jsonify({"error": f"Document analysis failed: {str(e)}"}), 500
 
+def _deadline_options(data):
+    """
+    Read the optional "deadline" (seconds) and "priority" fields of an analysis request
+    
+    Raises:
+        ValueError: If either field is malformed
+    """
+    options = {}
+    deadline = data.get("deadline")
+    if deadline is not None:
+        if isinstance(deadline, bool) or not isinstance(deadline, (int, float)) or deadline <= 0:
+            raise ValueError("deadline must be a positive number of seconds")
+        options["deadline"] = float(deadline)
+    
+    priority = data.get("priority")
+    if priority is not None:
+        if not isinstance(priority, list):
+            raise ValueError("priority must be a list of documents or page ranges")
+        parse_priority(priority)
+        options["priority"] = priority
+    return options
+
+def _requested_stream_format():
+    """
+    Pick a streaming format from ?stream= or the Accept header (None = no streaming)
+    """
+    stream = request.args.get("stream", "").lower()
+    if stream in ("ndjson", "sse"):
+        return stream
+    
+    accept = request.headers.get("Accept", "")
+    if "application/x-ndjson" in accept:
+        return "ndjson"
+    if "text/event-stream" in accept:
+        return "sse"
+    return None
+
+def _stream_analysis(persona, job, stream_format, timings=False, options=None):
+    """
+    Stream analysis events as NDJSON lines or Server-Sent Events
+    
+    Each relevant section is sent as soon as its batch is scored, with
+    progress events in between and a final ranked summary. Nothing is
+    written to the output directory in this mode.
+    """
+    def encode(event):
+        payload = dumps(event).decode("utf-8")
+        if stream_format == "sse":
+            return f"event: {event['event']}\ndata: {payload}\n\n"
+        return payload + "\n"
+    
+    def generate():
+        try:
+            for event in iter_analysis("input", persona, job, timings=StageTimings() if timings else None,
+                                       **(options or {})):
+                yield encode(event)
+            app.logger.info(f"Streamed analysis for persona: {persona}")
+        except Exception as e:
+            app.logger.error(f"Error during streamed analysis: {str(e)}")
+            yield encode({"event": "error", "error": f"Document analysis failed: {str(e)}"})
+    
+    mimetype = "text/event-stream" if stream_format == "sse" else "application/x-ndjson"
+    response = Response(stream_with_context(generate()), mimetype=mimetype)
+    # Stop proxies from buffering the stream
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+@app.route("/analyze/queries", methods=["POST"])
+def analyze_multiple_queries():
+    """
+    Round 1B for several persona/job pairs over the same documents
+    Pages are extracted once and scored against every job in shared batches
+    """
+    try:
+        data = request.get_json(silent=True)
+        if not data:
+            return jsonify({"error": "No JSON data provided"}), 400
+        
+        try:
+            queries = parse_queries(data.get("queries"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        pdf_files = [f for f in os.listdir("input") if f.lower().endswith('.pdf')]
+        if not pdf_files:
+            return jsonify({"error": "No PDF files found in input directory. Please upload PDFs first."}), 400
+        
+        save_output = data.get("save_output", SAVE_ANALYSIS_OUTPUT)
+        results = analyze_queries("input", queries, ANALYSIS_QUERIES_OUTPUT_PATH if save_output else None,
+                                  timings=bool(data.get("timings", ANALYSIS_TIMINGS)))
+        
+        app.logger.info(f"Successfully analyzed {len(pdf_files)} PDFs for {len(queries)} queries")
+        return json_response(results)
+        
+    except Exception as e:
+        app.logger.error(f"Error during multi-query analysis: {str(e)}")
+        return jsonify({"error": f"Multi-query analysis failed: {str(e)}"}), 500
+
+@app.route("/analyze/jobs", methods=["POST"])
+def submit_analysis_job():
+    """
+    Round 1B: Start a background analysis and return its job ID immediately
+    Poll GET /analyze/jobs/<job_id> for progress and fetch the result when done
+    """
+    try:
+        data = request.get_json(silent=True)
+        if not data:
+            return jsonify({"error": "No JSON data provided"}), 400
+        
+        persona = data.get("persona", "").strip()
+        job = data.get("job", "").strip()
+        
+        if not persona or not job:
+            return jsonify({"error": "Both persona and job fields are required"}), 400
+        
+        pdf_files = [f for f in os.listdir("input") if f.lower().endswith('.pdf')]
+        if not pdf_files:
+            return jsonify({"error": "No PDF files found in input directory. Please upload PDFs first."}), 400
+        
+        try:
+            options = _deadline_options(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        save_output = data.get("save_output", SAVE_ANALYSIS_OUTPUT)
+        job_id = jobs.submit(analyze_documents, "input", persona, job, ANALYSIS_OUTPUT_PATH if save_output else None,
+                             timings=bool(data.get("timings", ANALYSIS_TIMINGS)), **options)
+        
+        app.logger.info(f"Queued analysis job {job_id} for persona: {persona}")
+        return jsonify({
+            "job_id": job_id,
+            "status": "queued",
+            "status_url": f"/analyze/jobs/{job_id}",
+            "result_url": f"/analyze/jobs/{job_id}/result"
+        }), 202
+        
+    except JobQueueFull as e:
+        return jsonify({"error": f"Server busy: {str(e)}"}), 503
+    except Exception as e:
+        app.logger.error(f"Error submitting analysis job: {str(e)}")
+        return jsonify({"error": f"Failed to start analysis: {str(e)}"}), 500
+
+@app.route("/analyze/jobs/<job_id>", methods=["GET"])
+def analysis_job_status(job_id):
+    """Return status and progress of a background analysis job"""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job ID"}), 404
+    return jsonify(job)
+
+@app.route("/analyze/jobs/<job_id>/result", methods=["GET"])
+def analysis_job_result(job_id):
+    """Return the result of a completed background analysis job"""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job ID"}), 404
+    if job["status"] == "failed":
+        return jsonify({"error": f"Document analysis failed: {job['error']}"}), 500
+    if job["status"] != "completed":
+        return jsonify({"error": "Analysis not finished yet", "status": job["status"]}), 409
+    # A job's result never changes once it has completed
+    return json_response(jobs.result(job_id), etag=f"job-{job_id}")
+
 @app.route("/health", methods=["GET"])
 def health_check():
     """Health check endpoint"""
     return jsonify({
         "status": "healthy", 
         "service": "Adobe Hackathon 2025 PDF Processor",
-        "rounds": ["1A: Outline Extraction", "1B: Persona Analysis"]
+        "rounds": ["1A: Outline Extraction", "1B: Persona Analysis"],
+        "classifier": registry.status(),
+        "score_cache": get_score_cache().stats(),
+        "process": {
+            "pid": os.getpid(),
+            "startup_seconds": round(STARTUP_SECONDS, 3),
+            "memory_bytes": process_memory()
+        }
     })
 
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """Pipeline stage timings, counters and cache statistics in Prometheus text format"""
+    for name, stats in (("extraction_cache", get_cache().stats()), ("score_cache", get_score_cache().stats())):
+        metrics.set_gauge(f"{name}_hits", stats["hits"])
+        metrics.set_gauge(f"{name}_misses", stats["misses"])
+        metrics.set_gauge(f"{name}_entries", stats["entries"])
+    metrics.set_gauge("classifier_loaded", int(registry.status()["loaded"]))
+    for kind, value in process_memory().items():
+        metrics.set_gauge("process_memory_bytes", value, kind=kind)
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
 @app.route("/clear", methods=["POST"])
 def clear_files():
     """Clear input and output directories"""
@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+"""
+Reproducible performance benchmark for outline extraction and analysis
+
+Generates a synthetic PDF corpus with PyMuPDF (seeded, so every run and
+every commit sees the same documents), then times:
+- extract_outline per file, cold (empty extraction cache) and warm
+- process_pdfs over the whole corpus
+- analyze_documents with the keyword fallback and with a stub classifier
+- the Flask /upload and /analyze endpoints
+- app startup in a fresh interpreter (import time, peak RSS, heavy modules)
+
+Results (pages/sec, p50/p95 latency, peak RSS) are written as JSON and can
+be compared with a previous run via --compare.
+
+Usage:
+    python benchmark.py --documents 20 --pages 30 --output bench.json
+    python benchmark.py --output new.json --compare bench.json
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import zlib
+import random
+import shutil
+import argparse
+import platform
+import resource
+import subprocess
+import tempfile
+from typing import Dict, List, Any, Callable, Optional
+
+import fitz  # PyMuPDF
+
+BENCHMARK_VERSION = 1
+JOB = "Prepare a literature review of research methodology"
+PERSONA = "PhD Researcher"
+
+# Body text is 10pt (below every heading threshold); heading sizes match
+# the H1/H2/H3 rules in pdf_processor._classify_headings
+HEADING_SIZES = {1: 18, 2: 13, 3: 11}
+BODY_SIZE = 10
+BOLD_FONTS = {"helv": "hebo", "tiro": "tibo", "cour": "cobo"}
+
+VOCABULARY = (
+    "system data model result analysis method approach performance study design "
+    "process network signal value sample measure effect change control level "
+    "structure function response factor pattern theory practice evidence review "
+    "literature research methodology experiment survey finding conclusion table "
+    "figure section chapter overview baseline metric dataset training evaluation"
+).split()
+
+def generate_corpus(out_dir: str, documents: int, pages: int, fonts: List[str],
+                    heading_density: float, bookmarks: bool, seed: int) -> List[str]:
+    """
+    Write documents synthetic PDFs of the given page count into out_dir
+
+    Each text line is a heading with probability heading_density (level
+    1-3, rendered at the matching size; level 1 in the bold variant),
+    otherwise a 10pt body line. With bookmarks=True the headings are also
+    stored as the PDF's table of contents.
+
+    Returns:
+        Paths of the generated PDFs
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    rng = random.Random(seed)
+    paths = []
+
+    for doc_num in range(documents):
+        font = fonts[doc_num % len(fonts)]
+        doc = fitz.open()
+        toc = []
+
+        for page_num in range(pages):
+            page = doc.new_page(width=595, height=842)
+            y = 72.0
+            while y < 770:
+                if rng.random() < heading_density:
+                    level = rng.choice([1, 2, 2, 3, 3, 3])
+                    size = HEADING_SIZES[level]
+                    text = " ".join(rng.choice(VOCABULARY) for _ in range(rng.randint(2, 5))).title()
+                    page.insert_text((72, y), text, fontsize=size,
+                                     fontname=BOLD_FONTS[font] if level == 1 else font)
+                    # Bookmark levels may only deepen one step at a time
+                    toc.append([min(level, toc[-1][0] + 1 if toc else 1), text, page_num + 1])
+                else:
+                    size = BODY_SIZE
+                    text = " ".join(rng.choice(VOCABULARY) for _ in range(12))
+                    page.insert_text((72, y), text, fontsize=size, fontname=font)
+                y += size * 1.6
+
+        if bookmarks and toc:
+            doc.set_toc(toc)
+        doc.set_metadata({
+            "title": f"Synthetic Document {doc_num + 1}",
+            "creationDate": "D:20250101000000",
+            "modDate": "D:20250101000000"
+        })
+
+        path = os.path.join(out_dir, f"synthetic_{doc_num + 1:04d}.pdf")
+        doc.save(path, garbage=3, deflate=True, no_new_id=True)
+        doc.close()
+        paths.append(path)
+
+    return paths
+
+class StubClassifier:
+    """
+    Deterministic stand-in for the zero-shot pipeline
+
+    Scores are derived from a hash of the text, and every page can be made
+    to cost a fixed delay, so the analysis pipeline around the model is
+    measured without downloading or running a model.
+    """
+
+    tokenizer = None
+
+    def __init__(self, seconds_per_page: float = 0.0):
+        self.seconds_per_page = seconds_per_page
+        self.pages = 0
+
+    def __call__(self, sequences, candidate_labels, batch_size: int = 8, **kwargs):
+        single = isinstance(sequences, str)
+        texts = [sequences] if single else list(sequences)
+        self.pages += len(texts)
+        if self.seconds_per_page:
+            time.sleep(self.seconds_per_page * len(texts))
+
+        outputs = []
+        for text in texts:
+            score = (zlib.crc32(text.encode("utf-8")) % 1000) / 1000
+            labels = candidate_labels if score >= 0.5 else candidate_labels[::-1]
+            outputs.append({"sequence": text, "labels": labels, "scores": [max(score, 1 - score), min(score, 1 - score)]})
+        return outputs[0] if single else outputs
+
+def percentile(values: List[float], pct: float) -> float:
+    """
+    Nearest-rank percentile of a list of values
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = min(len(ordered), max(1, math.ceil(pct / 100 * len(ordered))))
+    return ordered[rank - 1]
+
+def peak_rss_mb() -> Dict[str, float]:
+    """
+    Peak resident set size of this process and of its finished children
+    """
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "self": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / divisor, 1),
+        "children": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / divisor, 1)
+    }
+
+def summarize(latencies: List[float], pages: int) -> Dict[str, Any]:
+    total = sum(latencies)
+    return {
+        "runs": len(latencies),
+        "total_seconds": round(total, 4),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "pages_per_second": round(pages / total, 2) if total else None,
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+def timed(func: Callable[[], Any], repeat: int) -> List[float]:
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+# Run in a fresh interpreter: how long importing the app takes, its peak RSS,
+# and which heavy libraries the import pulled in
+STARTUP_PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import app
+print(json.dumps({
+    "seconds": time.perf_counter() - start,
+    "peak_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    "heavy_modules": sorted(name for name in ("torch", "transformers", "onnxruntime", "numpy") if name in sys.modules)
+}))
+"""
+
+def measure_startup(app_dir: str, repeat: int, preload: bool = False) -> Dict[str, Any]:
+    """
+    Time importing the app in new processes (with PRELOAD_MODEL when preload)
+    """
+    env = dict(os.environ, WARM_UP_MODEL="0", PRELOAD_MODEL="1" if preload else "0",
+               PYTHONPATH=os.path.dirname(os.path.abspath(__file__)))
+    latencies, peak_rss, heavy_modules = [], 0, []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", STARTUP_PROBE], cwd=app_dir, env=env,
+                                capture_output=True, text=True, check=True).stdout
+        probe = json.loads(output.strip().splitlines()[-1])
+        latencies.append(probe["seconds"])
+        peak_rss = max(peak_rss, probe["peak_rss"])
+        heavy_modules = probe["heavy_modules"]
+
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "runs": len(latencies),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "peak_rss_mb": round(peak_rss / divisor, 1),
+        "heavy_modules": heavy_modules
+    }
+
+def run_benchmarks(args, work_dir: str) -> Dict[str, Any]:
+    corpus_dir = os.path.join(work_dir, "corpus")
+    cache_dir = os.path.join(work_dir, "cache", "extraction")
+
+    # Repository modules read their configuration at import time
+    os.environ["EXTRACTION_CACHE_DIR"] = cache_dir
+    os.environ["SCORE_CACHE_MAX_ENTRIES"] = "0"
+    os.environ["SCORE_CACHE_PATH"] = ""
+    os.environ["WARM_UP_MODEL"] = "0"
+    os.environ.setdefault("ANALYSIS_LEXICAL_SCORER", "keyword")
+    from pdf_processor import extract_outline, process_pdfs
+    from doc_analyzer import analyze_documents
+    from model_registry import registry
+
+    fonts = [font.strip() for font in args.fonts.split(",") if font.strip()]
+    unknown = [font for font in fonts if font not in BOLD_FONTS]
+    if unknown:
+        raise Exception(f"Unsupported fonts: {', '.join(unknown)} (use {', '.join(BOLD_FONTS)})")
+
+    start = time.perf_counter()
+    paths = generate_corpus(corpus_dir, args.documents, args.pages, fonts,
+                            args.heading_density, args.bookmarks, args.seed)
+    total_pages = args.documents * args.pages
+    stages = {"generate_corpus": {"total_seconds": round(time.perf_counter() - start, 4)}}
+
+    def clear_extraction_cache():
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    # Round 1A, one file at a time
+    clear_extraction_cache()
+    cold = [timed(lambda: extract_outline(path), 1)[0] for path in paths]
+    stages["extract_outline_cold"] = summarize(cold, total_pages)
+    warm = [latency for path in paths for latency in timed(lambda: extract_outline(path), args.repeat)]
+    stages["extract_outline_warm"] = summarize(warm, total_pages * args.repeat)
+
+    # Round 1A, whole corpus
+    latencies = []
+    for _ in range(args.repeat):
+        clear_extraction_cache()
+        latencies += timed(lambda: process_pdfs(corpus_dir, os.path.join(work_dir, "outlines"), args.workers,
+                                                incremental=False), 1)
+    stages["process_pdfs"] = summarize(latencies, total_pages * args.repeat)
+
+    # Round 1B: keyword fallback, then the stub model
+    registry.use_classifier(None)
+    latencies = timed(lambda: analyze_documents(corpus_dir, PERSONA, JOB, None, workers=args.workers), args.repeat)
+    stages["analyze_fallback"] = summarize(latencies, total_pages * args.repeat)
+
+    stub = StubClassifier(args.stub_ms_per_page / 1000)
+    registry.use_classifier(stub)
+    latencies = timed(lambda: analyze_documents(corpus_dir, PERSONA, JOB, None, workers=args.workers), args.repeat)
+    stages["analyze_stub_model"] = summarize(latencies, total_pages * args.repeat)
+    stages["analyze_stub_model"]["model_pages"] = stub.pages
+
+    # Flask endpoints, served in-process from a scratch working directory
+    app_dir = os.path.join(work_dir, "app")
+    os.makedirs(app_dir, exist_ok=True)
+    stages["startup_app"] = measure_startup(app_dir, args.repeat)
+    if args.preload:
+        stages["startup_app_preload"] = measure_startup(app_dir, args.repeat, preload=True)
+    cwd = os.getcwd()
+    os.chdir(app_dir)
+    try:
+        import app as flask_app
+        client = flask_app.app.test_client()
+        registry.use_classifier(None)
+
+        clear_extraction_cache()
+        latencies, response_bytes = [], 0
+        for path in paths:
+            with open(path, "rb") as f:
+                data = f.read()
+            start = time.perf_counter()
+            response = client.post(f"/upload?filename={os.path.basename(path)}", data=data,
+                                   content_type="application/pdf")
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                raise Exception(f"/upload returned {response.status_code}: {response.get_data(as_text=True)[:200]}")
+            response_bytes += len(response.data)
+        stages["http_upload"] = summarize(latencies, total_pages)
+        stages["http_upload"]["response_bytes"] = response_bytes
+
+        latencies, response_bytes = [], 0
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            response = client.post("/analyze", json={"persona": PERSONA, "job": JOB},
+                                   headers={"Accept-Encoding": "gzip, br"})
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                raise Exception(f"/analyze returned {response.status_code}: {response.get_data(as_text=True)[:200]}")
+            response_bytes = len(response.data)
+        stages["http_analyze"] = summarize(latencies, total_pages * args.repeat)
+        stages["http_analyze"]["response_bytes"] = response_bytes
+    finally:
+        os.chdir(cwd)
+
+    return stages
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    """
+    Describe per-stage changes against a baseline report
+    """
+    lines = [f"{'stage':<24}{'p50 ms':>28}{'pages/sec':>32}"]
+    for name, stage in current["stages"].items():
+        before = baseline.get("stages", {}).get(name)
+        if not before or "p50_ms" not in stage:
+            continue
+
+        def change(key: str) -> str:
+            old, new = before.get(key), stage.get(key)
+            if not old or new is None:
+                return f"{new}"
+            return f"{old} -> {new} ({(new - old) / old:+.0%})"
+
+        lines.append(f"{name:<24}{change('p50_ms'):>28}{change('pages_per_second'):>32}")
+    return lines
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except Exception:
+        return None
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark outline extraction and document analysis")
+    parser.add_argument("--documents", type=int, default=10, help="PDFs in the synthetic corpus")
+    parser.add_argument("--pages", type=int, default=20, help="Pages per PDF")
+    parser.add_argument("--fonts", default="helv,tiro", help="Base-14 fonts to rotate through: helv, tiro, cour")
+    parser.add_argument("--heading-density", type=float, default=0.08, help="Share of lines that are headings")
+    parser.add_argument("--bookmarks", action="store_true", help="Embed headings as a table of contents")
+    parser.add_argument("--seed", type=int, default=2025)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per timed stage")
+    parser.add_argument("--workers", type=int, default=None, help="Extraction workers (default: PDF_WORKERS)")
+    parser.add_argument("--stub-ms-per-page", type=float, default=0.0,
+                        help="Simulated model latency per page for the stub classifier")
+    parser.add_argument("--preload", action="store_true",
+                        help="Also time startup with PRELOAD_MODEL=1 (loads the real classifier)")
+    parser.add_argument("--work-dir", help="Keep the corpus and caches here (default: a temp dir)")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--compare", help="Previous JSON report to compare against")
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    work_dir = os.path.abspath(args.work_dir) if args.work_dir else tempfile.mkdtemp(prefix="docu-bench-")
+    try:
+        stages = run_benchmarks(args, work_dir)
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "benchmark_version": BENCHMARK_VERSION,
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "pymupdf": fitz.VersionBind,
+        "config": {
+            "documents": args.documents,
+            "pages": args.pages,
+            "fonts": args.fonts,
+            "heading_density": args.heading_density,
+            "bookmarks": args.bookmarks,
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "workers": args.workers,
+            "stub_ms_per_page": args.stub_ms_per_page
+        },
+        "stages": stages,
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+    payload = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding='utf-8') as f:
+            f.write(payload)
+    else:
+        print(payload)
+
+    if args.compare:
+        with open(args.compare, "r", encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get("config") != report["config"]:
+            print("Warning: baseline was run with a different configuration", file=sys.stderr)
+        print("\n".join(compare(report, baseline)), file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
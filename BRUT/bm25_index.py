@@ -0,0 +1,247 @@
+import os
+import re
+import json
+import math
+import logging
+import threading
+from collections import Counter
+from typing import Dict, List, Any, Optional, Tuple
+from shared_files import atomic_write, SharedInstances
+
+BM25_INDEX_FILENAME = ".bm25_index.json"
+
+# Bump when the on-disk layout changes so old indexes are rebuilt
+INDEX_FORMAT_VERSION = 2
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercase word tokens, dropping one- and two-letter noise
+    """
+    return [token for token in _TOKEN_RE.findall(text.lower()) if len(token) > 2]
+
+class BM25Index:
+    """
+    Persistent inverted index over page tokens with BM25 ranking
+
+    Every page of every indexed PDF is a BM25 "document". Postings map a term
+    to {page_id: term frequency}. Each PDF is indexed once per content hash;
+    re-indexing an unchanged file is a no-op, and changed or deleted files
+    have their old postings removed. Queries only touch the postings lists of
+    the query terms, so they never rescan page text. Each page also keeps a
+    small info dict from the caller (e.g. its title and excerpt), so results
+    can be reported without loading the page again.
+    """
+
+    def __init__(self, path: str, k1: float = 1.5, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.lock = threading.RLock()
+        self._reset()
+        self._load()
+
+    def update_document(self, filename: str, digest: str, page_texts: List[str],
+                        page_info: Optional[List[Dict[str, Any]]] = None) -> bool:
+        """
+        Index the pages of a PDF unless this content version is already indexed
+
+        Args:
+            filename: Document name as shown in results
+            digest: Content hash of the PDF
+            page_texts: Plain text of each page, in page order
+            page_info: JSON-serializable info kept for each page (see page_info())
+
+        Returns:
+            True if the index changed
+        """
+        with self.lock:
+            existing = self.documents.get(filename)
+            if existing and existing["digest"] == digest:
+                return False
+            if existing:
+                self.remove_document(filename)
+
+            page_ids = []
+            doc_terms = set()
+            for page_num, text in enumerate(page_texts):
+                counts = Counter(tokenize(text))
+                page_id = str(self.next_page_id)
+                self.next_page_id += 1
+
+                length = sum(counts.values())
+                info = page_info[page_num] if page_info else {}
+                self.pages[page_id] = [filename, page_num + 1, length, info]
+                self.total_length += length
+                page_ids.append(page_id)
+
+                for term, tf in counts.items():
+                    self.postings.setdefault(term, {})[page_id] = tf
+                doc_terms.update(counts)
+
+            self.documents[filename] = {
+                "digest": digest,
+                "pages": page_ids,
+                "terms": sorted(doc_terms)
+            }
+            self._dirty = True
+            return True
+
+    def remove_document(self, filename: str) -> bool:
+        """
+        Drop a PDF and all of its postings
+
+        Returns:
+            True if the document was indexed
+        """
+        with self.lock:
+            entry = self.documents.pop(filename, None)
+            if entry is None:
+                return False
+
+            page_ids = set(entry["pages"])
+            for term in entry["terms"]:
+                postings = self.postings.get(term)
+                if postings is None:
+                    continue
+                for page_id in page_ids:
+                    postings.pop(page_id, None)
+                if not postings:
+                    del self.postings[term]
+
+            for page_id in page_ids:
+                page = self.pages.pop(page_id, None)
+                if page:
+                    self.total_length -= page[2]
+
+            self._dirty = True
+            return True
+
+    def is_current(self, filename: str, digest: Optional[str]) -> bool:
+        """
+        Whether this content version of a PDF is indexed
+        """
+        with self.lock:
+            existing = self.documents.get(filename)
+            return existing is not None and existing["digest"] == digest
+
+    def page_info(self, filename: str) -> List[Dict[str, Any]]:
+        """
+        The info stored for each page of an indexed PDF, in page order
+        """
+        with self.lock:
+            existing = self.documents.get(filename)
+            return [self.pages[page_id][3] for page_id in existing["pages"]] if existing else []
+
+    def retain(self, filenames: List[str]) -> None:
+        """
+        Remove every indexed document not in filenames (e.g. deleted uploads)
+        """
+        keep = set(filenames)
+        with self.lock:
+            for filename in [name for name in self.documents if name not in keep]:
+                self.remove_document(filename)
+
+    def search(self, query: str) -> Dict[Tuple[str, int], float]:
+        """
+        Score pages against a query with BM25
+
+        Args:
+            query: Free-text query (e.g. the job description)
+
+        Returns:
+            {(filename, page_number): score} for pages matching any query term
+        """
+        with self.lock:
+            page_count = len(self.pages)
+            if not page_count:
+                return {}
+
+            avg_length = self.total_length / page_count or 1.0
+            scores = {}
+            for term in set(tokenize(query)):
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+
+                idf = math.log(1 + (page_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for page_id, tf in postings.items():
+                    length = self.pages[page_id][2]
+                    norm = self.k1 * (1 - self.b + self.b * length / avg_length)
+                    scores[page_id] = scores.get(page_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+            return {
+                (self.pages[page_id][0], self.pages[page_id][1]): score
+                for page_id, score in scores.items()
+            }
+
+    def save(self) -> None:
+        """
+        Persist the index if it changed since it was loaded or last saved
+        """
+        with self.lock:
+            if not self._dirty:
+                return
+
+            data = {
+                "version": INDEX_FORMAT_VERSION,
+                "next_page_id": self.next_page_id,
+                "total_length": self.total_length,
+                "documents": self.documents,
+                "pages": self.pages,
+                "postings": self.postings
+            }
+            with atomic_write(self.path) as f:
+                json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+
+            self._dirty = False
+            self.loaded_mtime = os.path.getmtime(self.path)
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "documents": len(self.documents),
+                "pages": len(self.pages),
+                "terms": len(self.postings)
+            }
+
+    def _reset(self) -> None:
+        self.documents = {}
+        self.pages = {}
+        self.postings = {}
+        self.total_length = 0
+        self.next_page_id = 0
+        self.loaded_mtime = None
+        self._dirty = False
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, "r", encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logging.warning(f"Rebuilding unreadable BM25 index {self.path}: {str(e)}")
+            return
+
+        if data.get("version") != INDEX_FORMAT_VERSION:
+            return
+
+        self.documents = data["documents"]
+        self.pages = data["pages"]
+        self.postings = data["postings"]
+        self.total_length = data["total_length"]
+        self.next_page_id = data["next_page_id"]
+        self.loaded_mtime = os.path.getmtime(self.path)
+
+_indexes = SharedInstances()
+
+def get_index(input_dir: str) -> BM25Index:
+    """
+    Return the BM25 index stored alongside a corpus directory
+
+    Shared within the process (see shared_files.SharedInstances).
+    """
+    path = os.path.join(input_dir, BM25_INDEX_FILENAME)
+    return _indexes.get(path, lambda: BM25Index(path))
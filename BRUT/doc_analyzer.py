@@ -1,19 +1,77 @@
 import os
 import json
+import math
+import time
+import heapq
 import logging
+import itertools
 from datetime import datetime
-from typing import Dict, List, Any
-import fitz  # PyMuPDF
+from typing import Callable, Dict, Iterator, List, Any, Optional, Tuple
+from model_registry import get_classifier, registry, entailment_logits, supports_entailment_logits
+from manifest import get_manifest
+from parsed_document import load_document, PageStream
+from parallel import iter_files
+from bm25_index import get_index
+from vector_index import get_vector_index
+from score_cache import get_score_cache, score_key
+from text_prep import prepare_texts, length_buckets, padding_stats, CLASSIFIER_MAX_TOKENS
+from metrics import metrics, StageTimings, ANALYSIS_TIMINGS
+from shared_files import atomic_write
 
-# Import transformers with fallback
-try:
-    from transformers import pipeline
-    TRANSFORMERS_AVAILABLE = True
-except ImportError:
-    TRANSFORMERS_AVAILABLE = False
-    logging.warning("Transformers library not available. Using fallback analysis.")
+# Number of pages sent to the classifier per forward pass
+CLASSIFIER_BATCH_SIZE = int(os.environ.get("CLASSIFIER_BATCH_SIZE", "8"))
 
-def analyze_documents(input_dir: str, persona: str, job: str, output_path: str) -> None:
+# Pages scoring above this are reported as relevant sections
+RELEVANCE_THRESHOLD = 0.7
+
+# Most persona/job pairs accepted by one analyze_queries call
+MAX_ANALYSIS_QUERIES = int(os.environ.get("MAX_ANALYSIS_QUERIES", "16"))
+
+# Scorer used when the classifier is unavailable: "keyword" or "bm25"
+ANALYSIS_LEXICAL_SCORER = os.environ.get("ANALYSIS_LEXICAL_SCORER", "keyword")
+
+LEXICAL_METHODS = {
+    "keyword": "Fallback keyword matching",
+    "bm25": "BM25 lexical ranking"
+}
+
+# "zero-shot" scores every page with the classifier (or lexical fallback);
+# "dense" ranks pages from the embedding index built at ingest
+ANALYSIS_RETRIEVAL = os.environ.get("ANALYSIS_RETRIEVAL", "zero-shot")
+DENSE_TOP_K = int(os.environ.get("DENSE_TOP_K", "10"))
+DENSE_MIN_SIMILARITY = float(os.environ.get("DENSE_MIN_SIMILARITY", "0.0"))
+
+# Cascade: rank pages with the lexical scorer first and send only the
+# CASCADE_TOP_K best (plus any scoring at least CASCADE_MIN_SCORE) to the classifier
+ANALYSIS_CASCADE = os.environ.get("ANALYSIS_CASCADE", "0") == "1"
+CASCADE_TOP_K = int(os.environ.get("CASCADE_TOP_K", "50"))
+CASCADE_MIN_SCORE = float(os.environ.get("CASCADE_MIN_SCORE", "0.6"))
+
+# Keep only the ANALYSIS_TOP_N best sections (0 keeps all), ranked in a bounded heap
+ANALYSIS_TOP_N = int(os.environ.get("ANALYSIS_TOP_N", "0"))
+
+# Streaming: decode and score pages one window at a time instead of loading
+# every document first, so memory does not grow with the corpus
+ANALYSIS_STREAMING = os.environ.get("ANALYSIS_STREAMING", "0") == "1"
+STREAM_WINDOW_PAGES = int(os.environ.get("STREAM_WINDOW_PAGES", "64"))
+
+# Seconds an analysis may run before it stops and ranks what it has (0 = no limit)
+ANALYSIS_DEADLINE_SECONDS = float(os.environ.get("ANALYSIS_DEADLINE_SECONDS", "0"))
+
+def analyze_documents(input_dir: str, persona: str, job: str, output_path: Optional[str],
+                      batch_size: int = CLASSIFIER_BATCH_SIZE,
+                      workers: Optional[int] = None,
+                      progress_callback: Optional[Callable[[Dict[str, int]], None]] = None,
+                      lexical_scorer: str = ANALYSIS_LEXICAL_SCORER,
+                      retrieval: str = ANALYSIS_RETRIEVAL,
+                      cascade: bool = ANALYSIS_CASCADE,
+                      cascade_top_k: int = CASCADE_TOP_K,
+                      cascade_min_score: float = CASCADE_MIN_SCORE,
+                      timings: bool = ANALYSIS_TIMINGS,
+                      streaming: bool = ANALYSIS_STREAMING,
+                      top_n: int = ANALYSIS_TOP_N,
+                      deadline: Optional[float] = ANALYSIS_DEADLINE_SECONDS,
+                      priority: Optional[List[Any]] = None) -> Dict[str, Any]:
     """
     Round 1B: Analyze multiple PDFs for persona-driven insights using DistilBERT
     
@@ -23,126 +81,1158 @@ def analyze_documents(input_dir: str, persona: str, job: str, output_path: str)
         input_dir: Directory containing PDF files
         persona: User persona (e.g., "PhD Researcher")
         job: Job to be done (e.g., "Prepare a literature review")
-        output_path: Path to save analysis results
+        output_path: Path to save analysis results (None to skip writing a file)
+        batch_size: Number of pages scored per classifier call
+        workers: Worker processes for page extraction (None uses PDF_WORKERS, 0 uses all cores)
+        progress_callback: Called with documents/pages done and total as work advances
+        lexical_scorer: Scorer used without the classifier ("keyword" or "bm25")
+        retrieval: "zero-shot" to score every page, "dense" for embedding top-k retrieval
+        cascade: Prefilter pages with lexical_scorer before the classifier
+        cascade_top_k: Pages always kept by the prefilter
+        cascade_min_score: Lexical score that keeps a page regardless of rank
+        timings: Add a per-stage timing breakdown to metadata["timings"]
+        streaming: Decode and score pages in windows (see iter_analysis)
+        top_n: Keep only the top_n best sections (0 keeps all)
+        deadline: Seconds before scoring stops with a partial result (None or 0 = no limit)
+        priority: Documents or page ranges to score first (see parse_priority)
+        
+    Returns:
+        The analysis results (also written to output_path when given)
     """
     try:
-        # Initialize classifier if transformers is available
-        classifier = None
-        if TRANSFORMERS_AVAILABLE:
-            try:
-                classifier = pipeline(
-                    "zero-shot-classification",
-                    model="facebook/bart-large-mnli",
-                    device=-1  # Use CPU for compatibility
-                )
-                logging.info("DistilBERT classifier initialized successfully")
-            except Exception as e:
-                logging.warning(f"Failed to initialize classifier: {str(e)}")
-                classifier = None
-        else:
-            classifier = None
+        # (section, subsection) pairs; only the top_n best are kept
+        best = _TopN(top_n, lambda pair: _rank_key(pair[0]))
+        metadata = {}
+        stage_timings = StageTimings() if timings else None
+        
+        for event in iter_analysis(input_dir, persona, job, batch_size=batch_size, workers=workers,
+                                   lexical_scorer=lexical_scorer, retrieval=retrieval,
+                                   cascade=cascade, cascade_top_k=cascade_top_k,
+                                   cascade_min_score=cascade_min_score, timings=stage_timings,
+                                   streaming=streaming, top_n=top_n, deadline=deadline, priority=priority):
+            if event["event"] == "section":
+                best.push((event["section"], event["subsection"]))
+            elif event["event"] == "progress":
+                if progress_callback:
+                    progress_callback(event["progress"])
+            elif event["event"] == "summary":
+                metadata = event["metadata"]
+        
+        # Sort sections by importance rank (descending)
+        with metrics.stage("rank", stage_timings):
+            ranked = best.items()
+            sections = [section for section, _ in ranked]
+            subsections = [subsection for _, subsection in ranked]
+            subsections.sort(key=lambda x: (-x["relevance_score"], x["document"], x["page_number"]))
+        if stage_timings is not None:
+            metadata["timings"] = stage_timings.to_dict()
         
-        # Initialize results structure
         results = {
-            "metadata": {
-                "documents": [],
-                "persona": persona,
-                "job": job,
-                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "analysis_method": "DistilBERT zero-shot classification" if classifier else "Fallback keyword matching",
-                "relevance_threshold": 0.7
-            },
-            "sections": [],
-            "subsections": []
+            "metadata": metadata,
+            "sections": sections,
+            "subsections": subsections
         }
         
-        # Get PDF files from input directory
-        pdf_files = [f for f in os.listdir(input_dir) if f.lower().endswith('.pdf')]
+        # Save results
+        # Write through a temp file so concurrent jobs never interleave output
+        if output_path:
+            with metrics.stage("write"):
+                os.makedirs(os.path.dirname(output_path), exist_ok=True)
+                with atomic_write(output_path) as f:
+                    json.dump(results, f, indent=2, ensure_ascii=False)
         
-        if not pdf_files:
-            raise Exception("No PDF files found in input directory")
+        logging.info(f"Analysis complete. Found {len(results['sections'])} relevant sections.")
+        return results
         
-        # Process each PDF
-        for filename in pdf_files:
-            try:
-                pdf_path = os.path.join(input_dir, filename)
-                doc = fitz.open(pdf_path)
-                results["metadata"]["documents"].append(filename)
+    except Exception as e:
+        logging.error(f"Document analysis failed: {str(e)}")
+        raise Exception(f"Document analysis failed: {str(e)}")
+
+def iter_analysis(input_dir: str, persona: str, job: str,
+                  batch_size: int = CLASSIFIER_BATCH_SIZE,
+                  workers: Optional[int] = None,
+                  lexical_scorer: str = ANALYSIS_LEXICAL_SCORER,
+                  retrieval: str = ANALYSIS_RETRIEVAL,
+                  cascade: bool = ANALYSIS_CASCADE,
+                  cascade_top_k: int = CASCADE_TOP_K,
+                  cascade_min_score: float = CASCADE_MIN_SCORE,
+                  timings: Optional[StageTimings] = None,
+                  streaming: bool = ANALYSIS_STREAMING,
+                  top_n: int = ANALYSIS_TOP_N,
+                  deadline: Optional[float] = ANALYSIS_DEADLINE_SECONDS,
+                  priority: Optional[List[Any]] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Run the Round 1B analysis incrementally, yielding events as work completes
+    
+    Events are dicts with an "event" key:
+    - "progress": {"progress": documents/pages done and total}
+    - "section": {"section": ..., "subsection": ...} for each page above the
+      threshold, in scoring order (not ranked)
+    - "summary": {"metadata": ..., "ranking": ...} once everything is scored;
+      ranking lists (document, page_number, importance_rank) in rank order
+    
+    Only the lightweight ranking entries are retained between batches, so
+    callers that forward events as they arrive never hold the full result.
+    With top_n > 0 the ranking is a bounded heap of the top_n best entries
+    (section events are still sent for every relevant page) and
+    metadata["top_n"] records how many relevant pages there were in all.
+    
+    With streaming=True, documents are read one page at a time (see
+    parsed_document.PageStream) and scored in windows of STREAM_WINDOW_PAGES
+    pages, so sections arrive while later pages are still undecoded and
+    memory stays flat however long the documents are. Streaming needs a
+    per-page scorer (the classifier or keyword matching); with BM25, dense
+    retrieval or the cascade, which compare every page of the corpus, it is
+    turned off. Pages are decoded in-process and not cached.
+    
+    With a deadline (seconds), no new document or batch is started once it
+    has passed: the pages scored so far are ranked and the summary carries
+    metadata["partial"] and metadata["coverage"] (pages scored vs. total,
+    documents read vs. total). Classifier scores are memoized, so a retry
+    resumes where the last attempt stopped. priority (see parse_priority) names
+    documents or page ranges to read and score first; in streaming mode
+    only the document order follows it.
+    
+    Without the classifier, pages are scored with lexical_scorer: "keyword"
+    (substring matching) or "bm25" (the corpus inverted index, see bm25_index).
+    With retrieval="dense", the classifier is skipped and the DENSE_TOP_K
+    pages closest to the job in the embedding index (see vector_index) are
+    returned, with cosine similarity as the score. BM25 and dense retrieval
+    rank pages from their index alone: only documents it doesn't hold at
+    their current content hash are read, and the titles and excerpts of
+    relevant pages come from the index too (see _iter_index_analysis).
+    
+    With cascade=True and the classifier available, lexical_scorer ranks
+    every page first and only the cascade_top_k best pages, plus any page
+    scoring at least cascade_min_score, are passed to the classifier.
+    Pruned pages count as irrelevant; metadata["cascade"] records how many.
+    
+    Every stage is timed into the process metrics (see metrics); when
+    timings is given it also collects this run's breakdown, which is
+    reported as metadata["timings"].
+    """
+    if lexical_scorer not in LEXICAL_METHODS:
+        raise Exception(f"Unknown lexical scorer: {lexical_scorer}")
+    if retrieval not in ("zero-shot", "dense"):
+        raise Exception(f"Unknown retrieval mode: {retrieval}")
+    priority = parse_priority(priority)
+    stop_at = time.monotonic() + deadline if deadline else None
+    
+    threshold = RELEVANCE_THRESHOLD
+    if retrieval == "dense":
+        classifier = None
+        cascade = False
+        index = get_vector_index(input_dir)
+        threshold = DENSE_MIN_SIMILARITY
+        analysis_method = f"Dense embedding retrieval ({index.embedder.name})"
+    else:
+        # Shared classifier, loaded once per process (None if unavailable)
+        with metrics.stage("model_load", timings):
+            classifier = get_classifier()
+        cascade = cascade and classifier is not None
+        use_bm25 = (not classifier or cascade) and lexical_scorer == "bm25"
+        index = get_index(input_dir) if use_bm25 else None
+        analysis_method = "DistilBERT zero-shot classification" if classifier else LEXICAL_METHODS[lexical_scorer]
+    
+    if streaming and (retrieval == "dense" or index or cascade):
+        logging.warning("Streaming analysis needs a per-page scorer; loading every page first")
+        streaming = False
+    
+    metadata = {
+        "documents": [],
+        "persona": persona,
+        "job": job,
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "analysis_method": analysis_method,
+        "relevance_threshold": threshold
+    }
+    
+    # Get PDF files from the corpus manifest (only new or changed files are hashed)
+    manifest = get_manifest(input_dir)
+    manifest.scan()
+    _save_manifest(manifest)
+    pdf_files = manifest.filenames()
+    
+    if not pdf_files:
+        raise Exception("No PDF files found in input directory")
+    pdf_files = _prioritize_documents(pdf_files, priority)
+    
+    progress = {
+        "documents_done": 0,
+        "documents_total": len(pdf_files),
+        "pages_done": 0,
+        "pages_total": 0
+    }
+    
+    ranking = _TopN(top_n, _rank_key)
+    token_stats = {}
+    
+    if streaming:
+        # Decode, score and release one window of pages at a time
+        for event in _iter_streamed_analysis(input_dir, pdf_files, classifier, job, batch_size, threshold,
+                                             ranking, metadata, progress, token_stats, timings, stop_at):
+            yield event
+    elif retrieval == "dense" or (index and not classifier):
+        # Rank from the index; page text is only read for documents it doesn't hold yet
+        top_k = DENSE_TOP_K if retrieval == "dense" else None
+        for event in _iter_index_analysis(input_dir, pdf_files, index, manifest, job, batch_size, workers,
+                                          threshold, priority, ranking, metadata, progress,
+                                          timings=timings, stop_at=stop_at, top_k=top_k):
+            yield event
+    else:
+        # Extract page texts from every PDF (in parallel when workers > 1) before scoring
+        pdf_paths = [os.path.join(input_dir, filename) for filename in pdf_files]
+        pages = []
+        failed_documents = []
+        digests = [(manifest.digest(filename),) for filename in pdf_files]
+        for pdf_path, loaded, error in metrics.timed_iter(iter_files(_load_pages, pdf_paths, workers, extra_args=digests),
+                                                          "extract", timings):
+            filename = os.path.basename(pdf_path)
+            progress["documents_done"] += 1
+            
+            if error:
+                logging.error(f"Error processing {filename}: {error}")
+                failed_documents.append({"document": filename, "error": error})
+                metrics.inc("errors_total", stage="extract")
+            else:
+                digest, page_texts = loaded
+                metadata["documents"].append(filename)
+                logging.info(f"Analyzing {filename} ({len(page_texts)} pages)")
+                metrics.inc("documents_processed_total")
                 
-                logging.info(f"Analyzing {filename} ({doc.page_count} pages)")
+                if index:
+                    with metrics.stage("index", timings):
+                        _index_pages(index, filename, digest, page_texts)
                 
-                # Process each page
-                for page_num in range(doc.page_count):
-                    page = doc[page_num]
-                    text = page.get_text("text").strip()
-                    
+                skipped = 0
+                for page_num, text in enumerate(page_texts):
                     if len(text) < 50:  # Skip pages with minimal content
+                        skipped += 1
                         continue
                     
-                    # Analyze relevance
-                    relevance_score = 0.0
-                    
-                    if classifier:
-                        # Use DistilBERT for zero-shot classification
-                        try:
-                            scores = classifier(text[:1000], candidate_labels=[job, "irrelevant"])
-                            relevance_score = scores["scores"][0] if scores["labels"][0] == job else 0.0
-                        except Exception as e:
-                            logging.warning(f"Classifier error on page {page_num + 1}: {str(e)}")
-                            relevance_score = _fallback_relevance_score(text, job)
-                    else:
-                        # Fallback to keyword-based relevance
-                        relevance_score = _fallback_relevance_score(text, job)
-                    
-                    # Include sections above threshold
-                    if relevance_score > 0.7:
-                        # Extract section title (first meaningful line)
-                        section_title = _extract_section_title(text)
-                        
-                        results["sections"].append({
-                            "document": filename,
-                            "page_number": page_num + 1,
-                            "section_title": section_title,
-                            "importance_rank": round(relevance_score, 3),
-                            "text_length": len(text)
-                        })
-                        
-                        # Add subsection with refined text
-                        results["subsections"].append({
-                            "document": filename,
-                            "page_number": page_num + 1,
-                            "refined_text": text[:500] + "..." if len(text) > 500 else text,
-                            "relevance_score": round(relevance_score, 3)
-                        })
-                
-                doc.close()
-                
-            except Exception as e:
-                logging.error(f"Error processing {filename}: {str(e)}")
+                    pages.append((filename, page_num, text))
+                if skipped:
+                    metrics.inc("pages_skipped_total", skipped, reason="short")
+            
+            yield {"event": "progress", "progress": dict(progress)}
+            if _expired(stop_at):
+                logging.warning(f"Analysis deadline reached after reading {progress['documents_done']} documents")
+                break
+        
+        if failed_documents:
+            metadata["failed_documents"] = failed_documents
+        
+        # Score all collected pages in batches
+        progress["pages_total"] = len(pages)
+        
+        # Past the deadline nothing is scored, so don't rank every page either
+        if cascade and not _expired(stop_at):
+            with metrics.stage("prefilter", timings):
+                lexical_scores = _lexical_scores(index, pdf_files, pages, job)
+                kept = _cascade_select(lexical_scores, cascade_top_k, cascade_min_score)
+            metrics.inc("pages_skipped_total", len(pages) - len(kept), reason="cascade")
+            metadata["cascade"] = {
+                "lexical_scorer": lexical_scorer,
+                "top_k": cascade_top_k,
+                "min_score": cascade_min_score,
+                "pages_scored": len(kept),
+                "pages_pruned": len(pages) - len(kept)
+            }
+            # Pruned pages are below any useful score; report them as done
+            progress["pages_done"] = len(pages) - len(kept)
+            pages = [pages[i] for i in kept]
+        
+        # Priority pages first; each tier is batched on its own so it is fully scored first
+        pages, tiers = _prioritize_pages(pages, priority)
+        
+        score_batches = _iter_tiered_scores(classifier, pages, tiers, job, batch_size, token_stats)
+        
+        for event in _score_events(pages, score_batches, threshold, ranking, progress, timings, stop_at):
+            yield event
+    
+    if stop_at is not None:
+        metadata["partial"] = (progress["pages_done"] < progress["pages_total"]
+                               or progress["documents_done"] < progress["documents_total"])
+        metadata["coverage"] = {
+            "deadline_seconds": deadline,
+            "pages_scored": progress["pages_done"],
+            "pages_total": progress["pages_total"],
+            "documents_read": progress["documents_done"],
+            "documents_total": progress["documents_total"]
+        }
+    if top_n > 0:
+        metadata["top_n"] = {"limit": top_n, "relevant_pages": ranking.count}
+    with metrics.stage("rank", timings):
+        ranking = ranking.items()
+    
+    if token_stats:
+        metadata["token_usage"] = token_stats
+    
+    # Add summary statistics
+    metadata["total_sections"] = len(ranking)
+    metadata["total_subsections"] = len(ranking)
+    metadata["avg_relevance"] = (
+        sum(s["importance_rank"] for s in ranking) / len(ranking)
+        if ranking else 0.0
+    )
+    
+    if timings is not None:
+        metadata["timings"] = timings.to_dict()
+    
+    yield {"event": "summary", "metadata": metadata, "ranking": ranking}
+
+def analyze_queries(input_dir: str, queries: List[Dict[str, str]], output_path: Optional[str] = None,
+                    batch_size: int = CLASSIFIER_BATCH_SIZE,
+                    workers: Optional[int] = None,
+                    lexical_scorer: str = ANALYSIS_LEXICAL_SCORER,
+                    top_n: int = ANALYSIS_TOP_N,
+                    timings: bool = ANALYSIS_TIMINGS) -> Dict[str, Any]:
+    """
+    Round 1B for several persona/job pairs over the same documents in one pass
+    
+    Every PDF is read and every page prepared once for all queries. With a
+    local classifier, each batch of pages is scored against all distinct
+    jobs in a single forward pass: the shared "irrelevant" hypothesis is
+    computed once per page, and each job's score is the softmax of its
+    entailment logit against it, exactly what analyze_documents would give
+    (and cached under the same keys). Other classifiers score each job in
+    turn over the shared pages. Dense retrieval, the cascade, streaming and
+    deadlines apply to single-query analysis only.
+    
+    Args:
+        input_dir: Directory containing PDF files
+        queries: [{"persona": ..., "job": ...}, ...] (see parse_queries)
+        output_path: Path to save the results (None to skip writing a file)
+        batch_size: Number of pages scored per classifier call
+        workers: Worker processes for page extraction (None uses PDF_WORKERS, 0 uses all cores)
+        lexical_scorer: Scorer used without the classifier ("keyword" or "bm25")
+        top_n: Keep only the top_n best sections per query (0 keeps all)
+        timings: Add a per-stage timing breakdown to metadata["timings"]
+        
+    Returns:
+        {"metadata": ..., "results": [...]}, with one result per query,
+        shaped like analyze_documents output, in query order
+    """
+    try:
+        queries = parse_queries(queries)
+        if lexical_scorer not in LEXICAL_METHODS:
+            raise Exception(f"Unknown lexical scorer: {lexical_scorer}")
+        stage_timings = StageTimings() if timings else None
+        
+        with metrics.stage("model_load", stage_timings):
+            classifier = get_classifier()
+        index = get_index(input_dir) if not classifier and lexical_scorer == "bm25" else None
+        
+        manifest = get_manifest(input_dir)
+        manifest.scan()
+        _save_manifest(manifest)
+        pdf_files = manifest.filenames()
+        if not pdf_files:
+            raise Exception("No PDF files found in input directory")
+        
+        # Extract page texts from every PDF once, for all queries
+        metadata = {
+            "documents": [],
+            "queries": len(queries),
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "analysis_method": "DistilBERT zero-shot classification" if classifier else LEXICAL_METHODS[lexical_scorer],
+            "relevance_threshold": RELEVANCE_THRESHOLD
+        }
+        pages = []
+        failed_documents = []
+        pdf_paths = [os.path.join(input_dir, filename) for filename in pdf_files]
+        digests = [(manifest.digest(filename),) for filename in pdf_files]
+        for pdf_path, loaded, error in metrics.timed_iter(iter_files(_load_pages, pdf_paths, workers, extra_args=digests),
+                                                          "extract", stage_timings):
+            filename = os.path.basename(pdf_path)
+            if error:
+                logging.error(f"Error processing {filename}: {error}")
+                failed_documents.append({"document": filename, "error": error})
+                metrics.inc("errors_total", stage="extract")
                 continue
+            
+            digest, page_texts = loaded
+            metadata["documents"].append(filename)
+            metrics.inc("documents_processed_total")
+            if index:
+                with metrics.stage("index", stage_timings):
+                    _index_pages(index, filename, digest, page_texts)
+            
+            content = [(filename, page_num, text) for page_num, text in enumerate(page_texts) if len(text) >= 50]
+            if len(content) < len(page_texts):
+                metrics.inc("pages_skipped_total", len(page_texts) - len(content), reason="short")
+            pages.extend(content)
+        if failed_documents:
+            metadata["failed_documents"] = failed_documents
         
-        # Sort sections by importance rank (descending)
-        results["sections"].sort(key=lambda x: x["importance_rank"], reverse=True)
-        results["subsections"].sort(key=lambda x: x["relevance_score"], reverse=True)
+        # Queries with the same job share its scores
+        jobs = list(dict.fromkeys(query["job"] for query in queries))
+        best = {job: _TopN(top_n, lambda pair: _rank_key(pair[0])) for job in jobs}
+        token_stats = {}
         
-        # Add summary statistics
-        results["metadata"]["total_sections"] = len(results["sections"])
-        results["metadata"]["total_subsections"] = len(results["subsections"])
-        results["metadata"]["avg_relevance"] = (
-            sum(s["importance_rank"] for s in results["sections"]) / len(results["sections"])
-            if results["sections"] else 0.0
-        )
+        texts = [text for _, _, text in pages]
+        multi = classifier is not None and len(jobs) > 1 and supports_entailment_logits(classifier)
+        if multi:
+            score_batches = _iter_multi_scores(classifier, texts, jobs, batch_size, registry.model_id, token_stats)
+        else:
+            score_batches = _iter_job_scores(classifier, index, pdf_files, pages, jobs,
+                                             batch_size, token_stats)
         
-        # Save results
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        with open(output_path, "w", encoding='utf-8') as f:
-            json.dump(results, f, indent=2, ensure_ascii=False)
+        for job, indices, batch_scores in metrics.timed_iter(score_batches, "score", stage_timings):
+            metrics.inc("pages_processed_total", len(indices))
+            for i, relevance_score in zip(indices, batch_scores):
+                if relevance_score > RELEVANCE_THRESHOLD:
+                    best[job].push(_section_entry(pages[i], relevance_score))
         
-        logging.info(f"Analysis complete. Found {len(results['sections'])} relevant sections.")
+        # One ranked result set per query
+        results = []
+        with metrics.stage("rank", stage_timings):
+            for query in queries:
+                ranked = best[query["job"]].items()
+                sections = [section for section, _ in ranked]
+                subsections = [subsection for _, subsection in ranked]
+                subsections.sort(key=lambda x: (-x["relevance_score"], x["document"], x["page_number"]))
+                query_metadata = {
+                    "persona": query["persona"],
+                    "job": query["job"],
+                    "total_sections": len(sections),
+                    "total_subsections": len(subsections),
+                    "avg_relevance": (
+                        sum(s["importance_rank"] for s in sections) / len(sections)
+                        if sections else 0.0
+                    )
+                }
+                if top_n > 0:
+                    query_metadata["top_n"] = {"limit": top_n, "relevant_pages": best[query["job"]].count}
+                results.append({"metadata": query_metadata, "sections": sections, "subsections": subsections})
+        
+        metadata["pages_scored"] = len(pages)
+        metadata["scoring"] = "shared forward pass" if multi else "per job"
+        if token_stats:
+            metadata["token_usage"] = token_stats
+        if stage_timings is not None:
+            metadata["timings"] = stage_timings.to_dict()
+        
+        output = {"metadata": metadata, "results": results}
+        
+        # Write through a temp file so concurrent calls never interleave output
+        if output_path:
+            with metrics.stage("write"):
+                os.makedirs(os.path.dirname(output_path), exist_ok=True)
+                with atomic_write(output_path) as f:
+                    json.dump(output, f, indent=2, ensure_ascii=False)
+        
+        logging.info(f"Multi-query analysis complete: {len(queries)} queries over {len(pages)} pages.")
+        return output
         
     except Exception as e:
-        logging.error(f"Document analysis failed: {str(e)}")
-        raise Exception(f"Document analysis failed: {str(e)}")
+        logging.error(f"Multi-query analysis failed: {str(e)}")
+        raise Exception(f"Multi-query analysis failed: {str(e)}")
+
+def parse_queries(queries: Any) -> List[Dict[str, str]]:
+    """
+    Validate a list of {"persona", "job"} pairs, stripping whitespace
+    
+    Raises:
+        ValueError: If the list is empty, too long (MAX_ANALYSIS_QUERIES) or
+            an entry lacks a persona or job
+    """
+    if not isinstance(queries, list) or not queries:
+        raise ValueError("queries must be a non-empty list of {\"persona\", \"job\"} objects")
+    if len(queries) > MAX_ANALYSIS_QUERIES:
+        raise ValueError(f"At most {MAX_ANALYSIS_QUERIES} queries are allowed per request")
+    
+    parsed = []
+    for query in queries:
+        persona = query.get("persona") if isinstance(query, dict) else None
+        job = query.get("job") if isinstance(query, dict) else None
+        if not isinstance(persona, str) or not isinstance(job, str) or not persona.strip() or not job.strip():
+            raise ValueError(f"Each query needs a persona and a job: {query!r}")
+        parsed.append({"persona": persona.strip(), "job": job.strip()})
+    return parsed
+
+def _save_manifest(manifest) -> None:
+    try:
+        manifest.save()
+    except Exception as e:
+        logging.warning(f"Failed to save corpus manifest: {str(e)}")
+
+def _rank_key(section: Dict[str, Any]) -> Tuple[float, str, int]:
+    """
+    Sort by importance (descending), then document order and page
+    
+    Batches may be scored out of page order, so ties are broken explicitly
+    to keep the ranking independent of how pages were batched.
+    """
+    return (-section["importance_rank"], section["document"], section["page_number"])
+
+class _TopN:
+    """
+    The n items with the smallest keys, kept in a bounded heap
+    
+    Pushing costs O(log n) and memory stays at n items however many are
+    pushed; n <= 0 keeps everything. count is the number of items pushed.
+    """
+    
+    def __init__(self, n: int, key: Callable[[Any], Any]):
+        self.n = n
+        self.key = key
+        self.count = 0
+        self._heap = []
+        self._order = itertools.count()
+    
+    def push(self, item: Any) -> None:
+        self.count += 1
+        # Max-heap on key, so the root is the worst item kept
+        entry = (_Descending(self.key(item)), next(self._order), item)
+        if self.n <= 0 or len(self._heap) < self.n:
+            heapq.heappush(self._heap, entry)
+        elif entry[0].key < self._heap[0][0].key:
+            heapq.heapreplace(self._heap, entry)
+    
+    def items(self) -> List[Any]:
+        """
+        Kept items, sorted by key
+        """
+        return [item for _, _, item in sorted(self._heap, key=lambda entry: entry[0].key)]
+
+class _Descending:
+    """
+    Heap key wrapper that reverses the order (heapq only has min-heaps)
+    """
+    __slots__ = ("key",)
+    
+    def __init__(self, key: Any):
+        self.key = key
+    
+    def __lt__(self, other: "_Descending") -> bool:
+        return other.key < self.key
+
+def index_document(input_dir: str, filename: str, digest: Optional[str] = None,
+                   data: Optional[bytes] = None) -> None:
+    """
+    Add or refresh one PDF in the corpus indexes (e.g. right after upload)
+    
+    Only the indexes the configured scoring path uses are touched, so the
+    outline-only upload path doesn't pay for indexing it will never use:
+    the BM25 index for ANALYSIS_LEXICAL_SCORER=bm25, the embedding index for
+    ANALYSIS_RETRIEVAL=dense. digest and data let a fresh upload be indexed
+    without reading the stored file back.
+    """
+    indexes = []
+    if ANALYSIS_LEXICAL_SCORER == "bm25":
+        indexes.append(get_index(input_dir))
+    if ANALYSIS_RETRIEVAL == "dense":
+        indexes.append(get_vector_index(input_dir))
+    if not indexes:
+        return
+    
+    digest, page_texts = _load_pages(os.path.join(input_dir, filename), digest, data)
+    for index in indexes:
+        if _index_pages(index, filename, digest, page_texts):
+            index.save()
+
+def _index_pages(index, filename: str, digest: str, page_texts: List[str]) -> bool:
+    """
+    Add a PDF's pages to a corpus index, with the info reported for relevant pages
+    """
+    return index.update_document(filename, digest, page_texts, [_page_info(text) for text in page_texts])
+
+def _iter_index_analysis(input_dir: str, pdf_files: List[str], index, manifest, job: str, batch_size: int,
+                         workers: Optional[int], threshold: float,
+                         priority: List[Tuple[str, int, Optional[int]]], ranking: "_TopN",
+                         metadata: Dict[str, Any], progress: Dict[str, int],
+                         timings: Optional[StageTimings] = None,
+                         stop_at: Optional[float] = None,
+                         top_k: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Score every page from a corpus index without loading page text (iter_analysis index mode)
+    
+    Documents the index already holds at their manifest content hash count
+    as read straight away. The others are loaded and indexed, in parallel
+    as in the default path; past stop_at no more are read. Candidate pages
+    are the long enough pages of every document read, taken from the
+    index's page info, and sections are built from that info, so a query
+    over a warm index touches only its postings lists (BM25) or its
+    vectors (dense, with top_k set).
+    """
+    failed_documents = []
+    stale = [filename for filename in pdf_files if not index.is_current(filename, manifest.digest(filename))]
+    read = set(pdf_files) - set(stale)
+    progress["documents_done"] = len(read)
+    yield {"event": "progress", "progress": dict(progress)}
+    
+    if stale and not _expired(stop_at):
+        pdf_paths = [os.path.join(input_dir, filename) for filename in stale]
+        digests = [(manifest.digest(filename),) for filename in stale]
+        for pdf_path, loaded, error in metrics.timed_iter(iter_files(_load_pages, pdf_paths, workers, extra_args=digests),
+                                                          "extract", timings):
+            filename = os.path.basename(pdf_path)
+            progress["documents_done"] += 1
+            
+            if error:
+                logging.error(f"Error processing {filename}: {error}")
+                failed_documents.append({"document": filename, "error": error})
+                metrics.inc("errors_total", stage="extract")
+            else:
+                digest, page_texts = loaded
+                with metrics.stage("index", timings):
+                    _index_pages(index, filename, digest, page_texts)
+                read.add(filename)
+            
+            yield {"event": "progress", "progress": dict(progress)}
+            if _expired(stop_at):
+                logging.warning(f"Analysis deadline reached after reading {progress['documents_done']} documents")
+                break
+    
+    if failed_documents:
+        metadata["failed_documents"] = failed_documents
+    
+    pages = []
+    skipped = 0
+    for filename in pdf_files:
+        if filename not in read:
+            continue
+        metadata["documents"].append(filename)
+        metrics.inc("documents_processed_total")
+        for page_num, info in enumerate(index.page_info(filename)):
+            if info.get("text_length", 0) < 50:  # Skip pages with minimal content
+                skipped += 1
+                continue
+            pages.append((filename, page_num, info))
+    if skipped:
+        metrics.inc("pages_skipped_total", skipped, reason="short")
+    progress["pages_total"] = len(pages)
+    
+    pages, _ = _prioritize_pages(pages, priority)
+    score_batches = _iter_index_scores(index, pdf_files, pages, job, batch_size, top_k)
+    for event in _score_events(pages, score_batches, threshold, ranking, progress, timings, stop_at):
+        yield event
+
+def _load_pages(pdf_path: str, digest: Optional[str] = None,
+                data: Optional[bytes] = None) -> Tuple[str, List[str]]:
+    """
+    Return the content hash and stripped plain text of every page
+    
+    Text comes from the shared parsed document, so pages already decoded for
+    the outline (or a previous analysis) are not decoded again.
+    """
+    parsed = load_document(pdf_path, digest, data)
+    return parsed.digest, parsed.page_texts()
+
+def _iter_streamed_analysis(input_dir: str, pdf_files: List[str], classifier, job: str, batch_size: int,
+                            threshold: float, ranking: "_TopN", metadata: Dict[str, Any],
+                            progress: Dict[str, int], token_stats: Dict[str, Any],
+                            timings: Optional[StageTimings] = None,
+                            stop_at: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Score documents one window of pages at a time (iter_analysis streaming mode)
+    
+    Each document is opened as a PageStream; pages are decoded in windows of
+    STREAM_WINDOW_PAGES, scored, and dropped before the next window is read.
+    pages_total grows as documents are read. If a document fails midway,
+    sections already sent for it stand and it is listed as failed. Past
+    stop_at nothing more is read; a document cut short is neither counted
+    in documents_done nor listed in metadata["documents"].
+    """
+    failed_documents = []
+    window_stats = {}
+    
+    for filename in pdf_files:
+        if _expired(stop_at):
+            break
+        stopped = False
+        try:
+            with PageStream(os.path.join(input_dir, filename), spans=False) as stream:
+                logging.info(f"Analyzing {filename} ({stream.page_count} pages, streamed)")
+                windows = _page_windows(filename, stream, STREAM_WINDOW_PAGES)
+                for window in metrics.timed_iter(windows, "extract", timings):
+                    progress["pages_total"] += len(window)
+                    score_batches = _iter_scores(classifier, [text for _, _, text in window], job, batch_size,
+                                                 registry.model_id, window_stats)
+                    for event in _score_events(window, score_batches, threshold, ranking, progress,
+                                               timings, stop_at):
+                        yield event
+                    _add_token_stats(token_stats, window_stats)
+                    window_stats.clear()
+                    if _expired(stop_at):
+                        stopped = True
+                        break
+            if not stopped:
+                metadata["documents"].append(filename)
+                metrics.inc("documents_processed_total")
+        except Exception as e:
+            logging.error(f"Error processing {filename}: {str(e)}")
+            failed_documents.append({"document": filename, "error": str(e)})
+            metrics.inc("errors_total", stage="extract")
+        
+        if stopped:
+            logging.warning(f"Analysis deadline reached while reading {filename}")
+            break
+        progress["documents_done"] += 1
+        yield {"event": "progress", "progress": dict(progress)}
+    
+    if failed_documents:
+        metadata["failed_documents"] = failed_documents
+
+def _page_windows(filename: str, stream: PageStream, window_pages: int) -> Iterator[List[Tuple[str, int, str]]]:
+    """
+    Group a document's pages into (filename, page index, text) windows
+    
+    Short pages are skipped as in the non-streaming path, and every window
+    but the last holds window_pages pages.
+    """
+    window = []
+    skipped = 0
+    for page in stream:
+        if len(page.text) < 50:  # Skip pages with minimal content
+            skipped += 1
+            continue
+        
+        window.append((filename, page.page_number - 1, page.text))
+        if len(window) >= max(1, window_pages):
+            yield window
+            window = []
+    if window:
+        yield window
+    if skipped:
+        metrics.inc("pages_skipped_total", skipped, reason="short")
+
+def _add_token_stats(total: Dict[str, Any], window: Dict[str, Any]) -> None:
+    """
+    Accumulate one window's padding_stats into the running totals
+    """
+    if not window:
+        return
+    total["used_tokens"] = total.get("used_tokens", 0) + window["used_tokens"]
+    total["padded_tokens"] = total.get("padded_tokens", 0) + window["padded_tokens"]
+    padded = total["padded_tokens"]
+    total["padding_efficiency"] = round(total["used_tokens"] / padded, 3) if padded else 1.0
+
+def _score_events(pages: List[Tuple[str, int, str]], score_batches: Iterator[Tuple[List[int], List[float]]],
+                  threshold: float, ranking: "_TopN", progress: Dict[str, int],
+                  timings: Optional[StageTimings] = None,
+                  stop_at: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Turn scored batches into section and progress events, filling ranking
+    
+    stop_at (a time.monotonic value) is checked before each batch is
+    requested, so no batch is scored once it has passed; batches are pulled
+    lazily, so the ones not requested are never scored.
+    """
+    batches = metrics.timed_iter(score_batches, "score", timings)
+    while True:
+        if _expired(stop_at):
+            logging.warning(f"Analysis deadline reached after {progress['pages_done']} of {progress['pages_total']} pages")
+            batches.close()
+            return
+        try:
+            indices, batch_scores = next(batches)
+        except StopIteration:
+            return
+        
+        metrics.inc("pages_processed_total", len(indices))
+        for i, relevance_score in zip(indices, batch_scores):
+            # Include sections above threshold
+            if relevance_score > threshold:
+                section, subsection = _section_entry(pages[i], relevance_score)
+                ranking.push({key: section[key] for key in ("document", "page_number", "importance_rank")})
+                yield {"event": "section", "section": section, "subsection": subsection}
+        
+        progress["pages_done"] += len(indices)
+        yield {"event": "progress", "progress": dict(progress)}
+
+def _section_entry(page: Tuple[str, int, Any], relevance_score: float) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Build the section and subsection reported for a relevant page
+    
+    The page's third item is its text, or the _page_info of it for pages
+    ranked straight from a corpus index.
+    """
+    filename, page_num, content = page
+    info = content if isinstance(content, dict) else _page_info(content)
+    importance_rank = round(relevance_score, 3)
+    section = {
+        "document": filename,
+        "page_number": page_num + 1,
+        "section_title": info["section_title"],
+        "importance_rank": importance_rank,
+        "text_length": info["text_length"]
+    }
+    # Subsection with refined text
+    subsection = {
+        "document": filename,
+        "page_number": page_num + 1,
+        "refined_text": info["refined_text"],
+        "relevance_score": importance_rank
+    }
+    return section, subsection
+
+def _page_info(text: str) -> Dict[str, Any]:
+    """
+    What a section reports about a page: title, length and excerpt
+    """
+    return {
+        # Extract section title (first meaningful line)
+        "section_title": _extract_section_title(text),
+        "text_length": len(text),
+        "refined_text": text[:500] + "..." if len(text) > 500 else text
+    }
+
+def _expired(stop_at: Optional[float]) -> bool:
+    return stop_at is not None and time.monotonic() >= stop_at
+
+def parse_priority(priority: Optional[List[Any]]) -> List[Tuple[str, int, Optional[int]]]:
+    """
+    Normalize a scoring priority list into (document, first page, last page)
+    
+    Each entry is a filename (the whole document) or a dict such as
+    {"document": "a.pdf", "pages": [10, 20]} with 1-based inclusive pages
+    ("pages": 7 means page 7 alone). Earlier entries are scored first;
+    pages no entry names come last.
+    
+    Raises:
+        ValueError: If an entry is malformed
+    """
+    entries = []
+    for entry in priority or []:
+        if isinstance(entry, str):
+            entries.append((entry, 1, None))
+            continue
+        if not isinstance(entry, dict) or not isinstance(entry.get("document"), str):
+            raise ValueError(f"Invalid priority entry: {entry!r}")
+        
+        pages = entry.get("pages")
+        if pages is None:
+            first, last = 1, None
+        elif isinstance(pages, int) and not isinstance(pages, bool):
+            first, last = pages, pages
+        elif (isinstance(pages, list) and len(pages) == 2
+              and all(isinstance(page, int) and not isinstance(page, bool) for page in pages)):
+            first, last = pages
+        else:
+            raise ValueError(f"Invalid page range in priority entry: {entry!r}")
+        if first < 1 or (last is not None and last < first):
+            raise ValueError(f"Invalid page range in priority entry: {entry!r}")
+        entries.append((entry["document"], first, last))
+    return entries
+
+def _priority_tier(priority: List[Tuple[str, int, Optional[int]]], filename: str,
+                   page_number: Optional[int] = None) -> int:
+    """
+    Index of the first priority entry matching a page (or, with page_number
+    None, any part of the document); len(priority) if none does
+    """
+    for tier, (document, first, last) in enumerate(priority):
+        if document != filename:
+            continue
+        if page_number is None or (page_number >= first and (last is None or page_number <= last)):
+            return tier
+    return len(priority)
+
+def _prioritize_documents(pdf_files: List[str], priority: List[Tuple[str, int, Optional[int]]]) -> List[str]:
+    """
+    Documents named in priority first (in priority order), the rest as they were
+    """
+    return sorted(pdf_files, key=lambda filename: _priority_tier(priority, filename))
+
+def _prioritize_pages(pages: List[Tuple[str, int, str]],
+                      priority: List[Tuple[str, int, Optional[int]]]) -> Tuple[List[Tuple[str, int, str]], List[List[int]]]:
+    """
+    Reorder pages by priority tier
+    
+    Returns:
+        (reordered pages, indices into them for each non-empty tier in order)
+    """
+    if not priority:
+        return pages, [list(range(len(pages)))]
+    
+    grouped = [[] for _ in range(len(priority) + 1)]
+    for page in pages:
+        grouped[_priority_tier(priority, page[0], page[1] + 1)].append(page)
+    
+    ordered, tiers = [], []
+    for group in grouped:
+        if group:
+            tiers.append(list(range(len(ordered), len(ordered) + len(group))))
+            ordered.extend(group)
+    return ordered, tiers
+
+def _iter_tiered_scores(classifier, pages: List[Tuple[str, int, str]], tiers: List[List[int]], job: str,
+                        batch_size: int, token_stats: Dict[str, Any]) -> Iterator[Tuple[List[int], List[float]]]:
+    """
+    Score pages tier by tier with _iter_scores
+    
+    _iter_scores reorders pages by length, so each tier gets its own call
+    to make sure it is scored completely before the next one starts.
+    """
+    for tier in tiers:
+        tier_stats = {}
+        for indices, scores in _iter_scores(classifier, [pages[i][2] for i in tier], job, batch_size,
+                                            registry.model_id, tier_stats):
+            yield [tier[i] for i in indices], scores
+        _add_token_stats(token_stats, tier_stats)
+
+def _iter_index_scores(index, corpus: List[str], pages: List[Tuple[str, int, Any]],
+                       job: str, batch_size: int, top_k: Optional[int] = None) -> Iterator[Tuple[List[int], List[float]]]:
+    """
+    Score pages from a corpus index (BM25 or dense) instead of per-page scoring
+    
+    Documents that are no longer in the corpus (the manifest's filenames)
+    are dropped from the index first; documents that merely failed or were
+    not read this run stay indexed. Only the given pages are candidates.
+    For the BM25 index (top_k None), raw scores are divided by the best
+    candidate's score, so the 0.7 threshold selects pages within 70% of the
+    strongest match. For the dense index, the top_k candidates keep their
+    cosine similarity and every other page scores 0.
+    """
+    index.retain(corpus)
+    try:
+        index.save()
+    except Exception as e:
+        logging.warning(f"Failed to save corpus index: {str(e)}")
+    
+    candidates = {(filename, page_num + 1) for filename, page_num, _ in pages}
+    if top_k is None:
+        raw_scores = {key: score for key, score in index.search(job).items() if key in candidates}
+        best = max(raw_scores.values(), default=0.0)
+        found = {key: score / best for key, score in raw_scores.items()} if best > 0 else {}
+    else:
+        found = index.search(job, top_k, candidates)
+    
+    scores = [found.get((filename, page_num + 1), 0.0) for filename, page_num, _ in pages]
+    
+    batch_size = max(1, batch_size)
+    for start in range(0, len(scores), batch_size):
+        indices = list(range(start, min(start + batch_size, len(scores))))
+        yield indices, scores[start:start + batch_size]
+
+def _lexical_scores(index, corpus: List[str], pages: List[Tuple[str, int, str]],
+                    job: str) -> List[float]:
+    """
+    Score every page with the cheap lexical scorer (cascade first stage)
+    
+    Uses the BM25 index when one is given, keyword matching otherwise.
+    """
+    if not index:
+        return [_fallback_relevance_score(text, job) for _, _, text in pages]
+    
+    scores = [0.0] * len(pages)
+    for indices, batch_scores in _iter_index_scores(index, corpus, pages, job, len(pages)):
+        for i, score in zip(indices, batch_scores):
+            scores[i] = score
+    return scores
+
+def _cascade_select(scores: List[float], top_k: int, min_score: float) -> List[int]:
+    """
+    Indices of the pages that pass the cascade prefilter, in page order
+    
+    A page passes if it is among the top_k highest scores (ties broken by
+    page order) or scores at least min_score.
+    """
+    order = sorted(range(len(scores)), key=lambda i: -scores[i])
+    kept = set(order[:max(0, top_k)])
+    kept.update(i for i, score in enumerate(scores) if score >= min_score)
+    return sorted(kept)
+
+def _iter_scores(classifier, texts: List[str], job: str, batch_size: int, model_id: str = "",
+                 token_stats: Optional[Dict[str, Any]] = None) -> Iterator[Tuple[List[int], List[float]]]:
+    """
+    Score page texts against the job, batching classifier calls across pages
+    
+    Pages whose (text, job, model) score is already memoized skip the model
+    entirely. The rest are cut to CLASSIFIER_MAX_TOKENS and grouped into
+    batches of similar length, so each forward pass over pages from any
+    document pads as little as possible. When the classifier exposes its
+    model, a batch is one forward pass over exactly its pages' (page, job)
+    and (page, "irrelevant") pairs (see entailment_logits); otherwise the
+    pipeline is called with the batch. If a batch fails, its pages are
+    scored individually so one bad page cannot sink its neighbours.
+    
+    Args:
+        token_stats: Filled with used vs padded token counts for model inputs
+    
+    Yields:
+        (indices into texts, scores) for each batch
+    """
+    batch_size = max(1, batch_size)
+    
+    if not classifier:
+        for start in range(0, len(texts), batch_size):
+            indices = list(range(start, min(start + batch_size, len(texts))))
+            yield indices, [_fallback_relevance_score(texts[i], job) for i in indices]
+        return
+    
+    score_cache = get_score_cache()
+    model_id = f"{model_id}|tokens:{CLASSIFIER_MAX_TOKENS}"
+    keys = [score_key(text, job, model_id) for text in texts]
+    cached = [score_cache.get(key) for key in keys]
+    
+    hits = [i for i, score in enumerate(cached) if score is not None]
+    for start in range(0, len(hits), batch_size):
+        indices = hits[start:start + batch_size]
+        yield indices, [cached[i] for i in indices]
+    
+    missing = [i for i, score in enumerate(cached) if score is None]
+    if not missing:
+        return
+    
+    prepared, lengths = prepare_texts([texts[i] for i in missing], getattr(classifier, "tokenizer", None))
+    buckets = length_buckets(lengths, batch_size)
+    if token_stats is not None:
+        token_stats.update(padding_stats(lengths, buckets))
+    
+    for bucket in buckets:
+        indices = [missing[j] for j in bucket]
+        fresh = {}
+        metrics.inc("classifier_calls_total")
+        metrics.inc("classifier_pages_total", len(bucket))
+        try:
+            if supports_entailment_logits(classifier):
+                logits = entailment_logits(classifier, [prepared[j] for j in bucket], [job, "irrelevant"], len(bucket))
+                scores = [_pair_score(job_logit, irrelevant_logit) for job_logit, irrelevant_logit in logits]
+            else:
+                outputs = classifier(
+                    [prepared[j] for j in bucket],
+                    candidate_labels=[job, "irrelevant"],
+                    batch_size=len(bucket)
+                )
+                if isinstance(outputs, dict):
+                    outputs = [outputs]
+                scores = [_job_score(output, job) for output in outputs]
+            fresh = {keys[i]: score for i, score in zip(indices, scores)}
+        except Exception as e:
+            logging.warning(f"Classifier error on a batch of {len(bucket)} pages: {str(e)}")
+            metrics.inc("errors_total", stage="classifier_batch")
+            scores = []
+            for i, j in zip(indices, bucket):
+                score, from_model = _score_single_page(classifier, prepared[j], texts[i], job)
+                scores.append(score)
+                if from_model:
+                    fresh[keys[i]] = score
+        score_cache.put_many(fresh)
+        
+        yield indices, scores
+
+def _iter_job_scores(classifier, index, corpus: List[str], pages: List[Tuple[str, int, str]],
+                     jobs: List[str], batch_size: int,
+                     token_stats: Dict[str, Any]) -> Iterator[Tuple[str, List[int], List[float]]]:
+    """
+    Score the same pages for each job in turn (analyze_queries without a shared pass)
+    
+    Yields:
+        (job, indices into pages, scores) for each batch
+    """
+    texts = [text for _, _, text in pages]
+    for job in jobs:
+        job_stats = {}
+        if index:
+            score_batches = _iter_index_scores(index, corpus, pages, job, batch_size)
+        else:
+            score_batches = _iter_scores(classifier, texts, job, batch_size, registry.model_id, job_stats)
+        for indices, scores in score_batches:
+            yield job, indices, scores
+        _add_token_stats(token_stats, job_stats)
+
+def _iter_multi_scores(classifier, texts: List[str], jobs: List[str], batch_size: int, model_id: str = "",
+                       token_stats: Optional[Dict[str, Any]] = None) -> Iterator[Tuple[str, List[int], List[float]]]:
+    """
+    Score page texts against several jobs, one forward pass per batch
+    
+    Like _iter_scores, memoized scores are used first and the remaining
+    pages are truncated and length-bucketed once. Each bucket is then run
+    against every job it still needs plus the shared "irrelevant"
+    hypothesis, and each job's score is recovered from the logits (see
+    _pair_score). If a bucket fails, its pages are scored one job at a time.
+    
+    Yields:
+        (job, indices into texts, scores) for each batch
+    """
+    batch_size = max(1, batch_size)
+    score_cache = get_score_cache()
+    model_id = f"{model_id}|tokens:{CLASSIFIER_MAX_TOKENS}"
+    keys = {job: [score_key(text, job, model_id) for text in texts] for job in jobs}
+    cached = {job: [score_cache.get(key) for key in keys[job]] for job in jobs}
+    
+    for job in jobs:
+        hits = [i for i, score in enumerate(cached[job]) if score is not None]
+        for start in range(0, len(hits), batch_size):
+            indices = hits[start:start + batch_size]
+            yield job, indices, [cached[job][i] for i in indices]
+    
+    missing = [i for i in range(len(texts)) if any(cached[job][i] is None for job in jobs)]
+    if not missing:
+        return
+    
+    prepared, lengths = prepare_texts([texts[i] for i in missing], getattr(classifier, "tokenizer", None))
+    buckets = length_buckets(lengths, batch_size)
+    if token_stats is not None:
+        token_stats.update(padding_stats(lengths, buckets))
+    
+    for bucket in buckets:
+        indices = [missing[j] for j in bucket]
+        needed = [job for job in jobs if any(cached[job][i] is None for i in indices)]
+        fresh = {}
+        metrics.inc("classifier_calls_total")
+        metrics.inc("classifier_pages_total", len(bucket))
+        try:
+            logits = entailment_logits(classifier, [prepared[j] for j in bucket], needed + ["irrelevant"], len(bucket))
+            scored = {job: [_pair_score(row[column], row[-1]) for row in logits] for column, job in enumerate(needed)}
+            fresh = {keys[job][i]: score for job in needed for i, score in zip(indices, scored[job])
+                     if cached[job][i] is None}
+        except Exception as e:
+            logging.warning(f"Classifier error on a batch of {len(bucket)} pages: {str(e)}")
+            metrics.inc("errors_total", stage="classifier_batch")
+            scored = {job: [] for job in needed}
+            for job in needed:
+                for i, j in zip(indices, bucket):
+                    if cached[job][i] is not None:
+                        scored[job].append(cached[job][i])
+                        continue
+                    score, from_model = _score_single_page(classifier, prepared[j], texts[i], job)
+                    scored[job].append(score)
+                    if from_model:
+                        fresh[keys[job][i]] = score
+        score_cache.put_many(fresh)
+        
+        for job in needed:
+            # Pages memoized for this job were already yielded
+            pending = [(i, score) for i, score in zip(indices, scored[job]) if cached[job][i] is None]
+            yield job, [i for i, _ in pending], [score for _, score in pending]
+
+def _pair_score(job_logit: float, irrelevant_logit: float) -> float:
+    """
+    Zero-shot score of a job against "irrelevant" from their entailment logits
+    
+    Softmax over the two logits, reported only when the job wins, the same
+    as _job_score on a two-label pipeline output.
+    """
+    margin = irrelevant_logit - job_logit
+    if margin > 0:
+        return 0.0
+    return 1.0 / (1.0 + math.exp(margin))
+
+def _score_single_page(classifier, prepared_text: str, text: str, job: str) -> Tuple[float, bool]:
+    """
+    Score one page, falling back to keyword matching on classifier errors
+    
+    Returns:
+        (score, whether the score came from the classifier)
+    """
+    metrics.inc("classifier_calls_total")
+    metrics.inc("classifier_pages_total")
+    try:
+        return _job_score(classifier(prepared_text, candidate_labels=[job, "irrelevant"]), job), True
+    except Exception as e:
+        logging.warning(f"Classifier error: {str(e)}")
+        metrics.inc("errors_total", stage="classifier")
+        return _fallback_relevance_score(text, job), False
+
+def _job_score(output: Dict[str, Any], job: str) -> float:
+    """
+    Extract the job label probability from a zero-shot pipeline output
+    """
+    return output["scores"][0] if output["labels"][0] == job else 0.0
 
 def _fallback_relevance_score(text: str, job: str) -> float:
     """
@@ -0,0 +1,180 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from typing import Dict, Any, Optional
+from shared_files import atomic_write
+
+EXTRACTION_CACHE_DIR = os.environ.get("EXTRACTION_CACHE_DIR", os.path.join("cache", "extraction"))
+EXTRACTION_CACHE_MAX_BYTES = int(os.environ.get("EXTRACTION_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+EXTRACTION_CACHE_ENABLED = os.environ.get("EXTRACTION_CACHE_ENABLED", "1") == "1"
+
+# Bump when the shape of cached entries changes so stale entries are ignored
+CACHE_FORMAT_VERSION = 4
+
+def file_digest(pdf_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """
+    Compute the SHA-256 content hash of a file without loading it whole
+
+    Args:
+        pdf_path: Path to the file
+        chunk_size: Bytes read per chunk
+
+    Returns:
+        Hex digest of the file content
+    """
+    digest = hashlib.sha256()
+    with open(pdf_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class ExtractionCache:
+    """
+    Persistent, content-addressed cache of PyMuPDF extraction results
+
+    Each named section of a PDF's results (e.g. "document", "outline") is
+    its own JSON file, named after the content hash and the section, so
+    reading the small outline never parses the much larger document, and
+    storing one section never rewrites the others. Files are touched on
+    read so mtimes track recency; when the directory grows past max_bytes
+    the least recently used files are deleted. Writes are atomic (see
+    shared_files.atomic_write).
+    """
+
+    def __init__(self, cache_dir: str = EXTRACTION_CACHE_DIR,
+                 max_bytes: int = EXTRACTION_CACHE_MAX_BYTES,
+                 enabled: bool = EXTRACTION_CACHE_ENABLED):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, digest: str, section: str) -> Optional[Any]:
+        """
+        Look up one section of a cached entry
+
+        Args:
+            digest: Content hash of the PDF
+            section: Name of the cached section
+
+        Returns:
+            The cached value, or None on a miss
+        """
+        if not self.enabled:
+            return None
+
+        entry = self._read_entry(digest, section)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        try:
+            os.utime(self._entry_path(digest, section))
+        except OSError:
+            pass
+        return entry["value"]
+
+    def put(self, digest: str, section: str, value: Any) -> None:
+        """
+        Store one section of an entry; other sections are left untouched
+
+        Args:
+            digest: Content hash of the PDF
+            section: Name of the cached section
+            value: JSON-serializable value to store
+        """
+        if not self.enabled:
+            return
+
+        with self._lock:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                entry = {"version": CACHE_FORMAT_VERSION, "value": value}
+
+                with atomic_write(self._entry_path(digest, section)) as f:
+                    json.dump(entry, f, ensure_ascii=False, separators=(",", ":"))
+
+                self._evict()
+            except Exception as e:
+                logging.warning(f"Failed to write extraction cache entry {digest[:12]}/{section}: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Report cache size and hit/miss counters
+        """
+        entries, total_bytes = 0, 0
+        if os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(".json"):
+                    entries += 1
+                    total_bytes += os.path.getsize(os.path.join(self.cache_dir, name))
+        return {
+            "enabled": self.enabled,
+            "entries": entries,
+            "bytes": total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+    def _entry_path(self, digest: str, section: str) -> str:
+        return os.path.join(self.cache_dir, f"{digest}.{section}.json")
+
+    def _read_entry(self, digest: str, section: str) -> Optional[Dict[str, Any]]:
+        path = self._entry_path(digest, section)
+        try:
+            with open(path, "r", encoding='utf-8') as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logging.warning(f"Discarding unreadable extraction cache entry {digest[:12]}/{section}: {str(e)}")
+            return None
+        if entry.get("version") != CACHE_FORMAT_VERSION or "value" not in entry:
+            return None
+        return entry
+
+    def _evict(self) -> None:
+        """
+        Delete least recently used section files until the cache fits max_bytes
+        """
+        files = []
+        total_bytes = 0
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+            total_bytes += stat.st_size
+
+        if total_bytes <= self.max_bytes:
+            return
+
+        for _, size, path in sorted(files):
+            try:
+                os.remove(path)
+                total_bytes -= size
+            except OSError:
+                continue
+            if total_bytes <= self.max_bytes:
+                break
+
+_cache = None
+
+def get_cache() -> ExtractionCache:
+    """
+    Return the process-wide extraction cache
+    """
+    global _cache
+    if _cache is None:
+        _cache = ExtractionCache()
+    return _cache
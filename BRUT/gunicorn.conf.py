@@ -0,0 +1,28 @@
+"""
+Gunicorn settings: gunicorn -c gunicorn.conf.py main:app
+
+With PRELOAD_MODEL=1 the app, and with it the classifier, is loaded once in
+the master before any worker forks. The model weights then live in pages
+every worker shares copy-on-write, so adding workers adds little memory.
+Compare the pss and shared values of docu_process_memory_bytes in each
+worker's /metrics. Without it, each worker imports the app and loads its own
+model (or connects to the inference worker, see inference_worker.py).
+"""
+
+import gc
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("GUNICORN_WORKERS", "2"))
+threads = int(os.environ.get("GUNICORN_THREADS", "4"))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "300"))
+preload_app = os.environ.get("PRELOAD_MODEL", "0") == "1"
+
+def pre_fork(server, worker):
+    # Move everything loaded so far out of the collector's reach: a collection
+    # in a worker would otherwise write to (and so copy) every shared page
+    if preload_app:
+        gc.freeze()
+
+def post_fork(server, worker):
+    server.log.info(f"Worker {worker.pid} started (model preloaded: {preload_app})")
@@ -0,0 +1,311 @@
+import os
+import sys
+import time
+import queue
+import secrets
+import logging
+import argparse
+import tempfile
+import threading
+from collections import deque
+from multiprocessing.connection import Client, Listener
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+# Requests are pickled, so only holders of the key may connect. Without
+# INFERENCE_WORKER_AUTHKEY the worker generates one into a private directory
+# (also the home of the default socket) that only its user can read.
+INFERENCE_WORKER_AUTHKEY = os.environ.get("INFERENCE_WORKER_AUTHKEY", "")
+INFERENCE_WORKER_DIR = os.environ.get("INFERENCE_WORKER_DIR", "")
+# Largest forward pass, and how long the first queued page waits for company
+INFERENCE_MAX_BATCH = int(os.environ.get("INFERENCE_MAX_BATCH", "32"))
+INFERENCE_MAX_WAIT_MS = float(os.environ.get("INFERENCE_MAX_WAIT_MS", "10"))
+
+def runtime_dir() -> str:
+    """
+    Private directory for the default socket and the generated key
+
+    INFERENCE_WORKER_DIR, or a per-user directory under the system temp
+    directory. It is created with mode 0700 and refused if another user
+    owns it or it is readable by others.
+    """
+    path = INFERENCE_WORKER_DIR or os.path.join(tempfile.gettempdir(), f"docu-inference-{os.getuid()}")
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.lstat(path)
+    if not os.path.isdir(path) or os.path.islink(path) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise Exception(f"Inference worker directory {path} must be owned by this user with mode 0700")
+    return path
+
+def default_address() -> str:
+    return os.path.join(runtime_dir(), "worker.sock")
+
+def load_authkey(create: bool = False) -> bytes:
+    """
+    Key that authenticates connections to the inference worker
+
+    INFERENCE_WORKER_AUTHKEY when set, otherwise the key file in
+    runtime_dir(). With create=True (the worker itself) a missing key file
+    is generated with mode 0600.
+
+    Raises:
+        Exception: If no key is configured and none has been generated
+    """
+    if INFERENCE_WORKER_AUTHKEY:
+        return INFERENCE_WORKER_AUTHKEY.encode("utf-8")
+
+    path = os.path.join(runtime_dir(), "authkey")
+    try:
+        with open(path, "rb") as f:
+            key = f.read().strip()
+        if key:
+            return key
+    except FileNotFoundError:
+        pass
+    if not create:
+        raise Exception(f"No inference worker key: set INFERENCE_WORKER_AUTHKEY or start the worker (key file {path})")
+
+    key = secrets.token_hex(32).encode("utf-8")
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(key)
+    os.replace(tmp_path, path)
+    return key
+
+def parse_address(address: str) -> Union[str, Tuple[str, int]]:
+    """
+    "host:port" for a local TCP socket, anything else is a Unix socket path
+    """
+    host, sep, port = address.rpartition(":")
+    if sep and host and port.isdigit():
+        return host, int(port)
+    return address
+
+class _Pending:
+    """
+    One page waiting to be scored
+    """
+    __slots__ = ("text", "labels", "done", "output", "error")
+
+    def __init__(self, text: str, labels: Tuple[str, ...]):
+        self.text = text
+        self.labels = labels
+        self.done = threading.Event()
+        self.output = None
+        self.error = None
+
+class MicroBatcher:
+    """
+    Combines pages from concurrent requests into shared forward passes
+
+    A single thread owns the classifier. It takes the oldest queued page and
+    keeps collecting pages with the same candidate labels (the same job)
+    until it has max_batch of them or max_wait seconds have passed, then
+    scores them in one call. Pages for other jobs are held back for the
+    next batch in arrival order.
+    """
+
+    def __init__(self, classifier, max_batch: int = INFERENCE_MAX_BATCH,
+                 max_wait: float = INFERENCE_MAX_WAIT_MS / 1000):
+        self.classifier = classifier
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait)
+        self.batches = 0
+        self.pages = 0
+        self._queue = queue.Queue()
+        self._held = deque()
+        threading.Thread(target=self._run, name="micro-batcher", daemon=True).start()
+
+    def score(self, texts: List[str], labels: List[str]) -> List[Dict[str, Any]]:
+        """
+        Score texts against labels, blocking until every page is done
+
+        Returns:
+            {"labels", "scores"} for each text, as the zero-shot pipeline gives
+        """
+        items = [_Pending(text, tuple(labels)) for text in texts]
+        for item in items:
+            self._queue.put(item)
+        for item in items:
+            item.done.wait()
+            if item.error:
+                raise Exception(item.error)
+        return [item.output for item in items]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "pages": self.pages,
+            "mean_batch_size": round(self.pages / self.batches, 2) if self.batches else 0.0,
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000
+        }
+
+    def _run(self) -> None:
+        while True:
+            self._score(self._next_batch())
+
+    def _next_batch(self) -> List[_Pending]:
+        first = self._held.popleft() if self._held else self._queue.get()
+        batch = [first]
+
+        # Held-back pages for the same job go first, keeping the others in order
+        held = deque()
+        while self._held:
+            item = self._held.popleft()
+            if item.labels == first.labels and len(batch) < self.max_batch:
+                batch.append(item)
+            else:
+                held.append(item)
+        self._held = held
+
+        stop_at = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            try:
+                item = self._queue.get(timeout=max(0.0, stop_at - time.monotonic()))
+            except queue.Empty:
+                break
+            if item.labels == first.labels:
+                batch.append(item)
+            else:
+                self._held.append(item)
+        return batch
+
+    def _score(self, batch: List[_Pending]) -> None:
+        try:
+            outputs = self.classifier([item.text for item in batch],
+                                      candidate_labels=list(batch[0].labels),
+                                      batch_size=len(batch))
+            if isinstance(outputs, dict):
+                outputs = [outputs]
+            for item, output in zip(batch, outputs):
+                item.output = {"labels": output["labels"], "scores": output["scores"]}
+        except Exception as e:
+            logging.warning(f"Classifier error on a batch of {len(batch)} pages: {str(e)}")
+            for item in batch:
+                item.error = str(e)
+        self.batches += 1
+        self.pages += len(batch)
+        for item in batch:
+            item.done.set()
+
+def serve(address: str, max_batch: int = INFERENCE_MAX_BATCH,
+          max_wait: float = INFERENCE_MAX_WAIT_MS / 1000) -> None:
+    """
+    Load the classifier once and answer scoring requests until killed
+
+    Every connection is served by its own thread; all of them feed one
+    MicroBatcher, so web workers share both the model and its batches.
+    A Unix socket is created with mode 0600.
+    """
+    authkey = load_authkey(create=True)
+    from model_registry import ModelRegistry
+    local = ModelRegistry(worker_address="")
+    classifier = local.get_classifier()
+    if classifier is None:
+        raise Exception(f"Classifier could not be loaded: {local.status()['error'] or 'transformers unavailable'}")
+    batcher = MicroBatcher(classifier, max_batch, max_wait)
+
+    bind = parse_address(address)
+    if isinstance(bind, str) and os.path.exists(bind):
+        os.remove(bind)  # Stale socket from a previous run
+    umask = os.umask(0o177)
+    try:
+        listener = Listener(bind, authkey=authkey)
+    finally:
+        os.umask(umask)
+    with listener:
+        logging.info(f"Inference worker for {local.model_id} listening on {address}")
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception as e:
+                logging.warning(f"Rejected inference connection: {str(e)}")
+                continue
+            threading.Thread(target=_handle, args=(conn, batcher, local.model_id), daemon=True).start()
+
+def _handle(conn, batcher: MicroBatcher, model_id: str) -> None:
+    with conn:
+        while True:
+            try:
+                request = conn.recv()
+            except (EOFError, OSError):
+                return
+            try:
+                if request.get("op") == "info":
+                    reply = {"model_id": model_id, "stats": batcher.stats()}
+                elif request.get("op") == "score":
+                    reply = {"outputs": batcher.score(request["texts"], request["labels"])}
+                else:
+                    reply = {"error": f"Unknown request: {request.get('op')}"}
+            except Exception as e:
+                reply = {"error": str(e)}
+            conn.send(reply)
+
+class RemoteClassifier:
+    """
+    Zero-shot classifier that scores on a shared inference worker
+
+    Follows the pipeline calling convention used by doc_analyzer, so the
+    model registry can hand it out in place of a local model. Each thread
+    keeps its own connection, opened on first use (so none is inherited
+    across a fork), and reconnects once if the worker was restarted.
+    tokenizer is None, so inputs are truncated by word count (see text_prep).
+    """
+
+    tokenizer = None
+
+    def __init__(self, address: str, authkey: Optional[bytes] = None):
+        self.address = address
+        self._bind = parse_address(address)
+        self._authkey = authkey if authkey is not None else load_authkey()
+        self._local = threading.local()
+        with Client(self._bind, authkey=self._authkey) as conn:
+            conn.send({"op": "info"})
+            self.model_id = conn.recv()["model_id"]
+
+    def __call__(self, sequences: Union[str, List[str]], candidate_labels: List[str],
+                 batch_size: int = 8, **kwargs) -> Union[Dict[str, Any], List[Dict[str, Any]]]:
+        single = isinstance(sequences, str)
+        texts = [sequences] if single else list(sequences)
+        outputs = self._request({"op": "score", "texts": texts, "labels": list(candidate_labels)})["outputs"]
+        for text, output in zip(texts, outputs):
+            output["sequence"] = text
+        return outputs[0] if single else outputs
+
+    def stats(self) -> Dict[str, Any]:
+        return self._request({"op": "info"})["stats"]
+
+    def _request(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        for attempt in range(2):
+            conn = getattr(self._local, "conn", None)
+            try:
+                if conn is None:
+                    conn = self._local.conn = Client(self._bind, authkey=self._authkey)
+                conn.send(message)
+                reply = conn.recv()
+                break
+            except (EOFError, OSError) as e:
+                self._local.conn = None
+                if conn is not None:
+                    conn.close()
+                if attempt:
+                    raise Exception(f"Inference worker at {self.address} unavailable: {str(e)}")
+        if "error" in reply:
+            raise Exception(reply["error"])
+        return reply
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from model_registry import INFERENCE_WORKER_ADDRESS
+    parser = argparse.ArgumentParser(description="Shared zero-shot inference worker with micro-batching")
+    parser.add_argument("--address", default=INFERENCE_WORKER_ADDRESS or None,
+                        help="host:port or Unix socket path to listen on (default: worker.sock in runtime_dir())")
+    parser.add_argument("--max-batch", type=int, default=INFERENCE_MAX_BATCH)
+    parser.add_argument("--max-wait-ms", type=float, default=INFERENCE_MAX_WAIT_MS)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    serve(args.address or default_address(), args.max_batch, args.max_wait_ms / 1000)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
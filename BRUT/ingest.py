@@ -0,0 +1,111 @@
+import os
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass
+from typing import BinaryIO, Optional
+from werkzeug.utils import secure_filename
+from manifest import get_manifest
+
+# Largest accepted upload; Flask's MAX_CONTENT_LENGTH is set from this too
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", str(100 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+# Uploads up to this size are also kept in memory for parsing; larger ones
+# are parsed from the stored file
+UPLOAD_MEMORY_MAX_BYTES = int(os.environ.get("UPLOAD_MEMORY_MAX_BYTES", str(16 * 1024 * 1024)))
+
+class UploadTooLarge(Exception):
+    """
+    Raised when an upload exceeds the configured size limit
+    """
+
+@dataclass
+class IngestedUpload:
+    """
+    A stored upload plus what was learned while streaming it in
+
+    data holds the uploaded bytes so the PDF can be opened from memory
+    (fitz.open(stream=...)) without reading the stored file back; it is None
+    for uploads over UPLOAD_MEMORY_MAX_BYTES, which are opened from path.
+    """
+    filename: str
+    path: str
+    digest: str
+    size: int
+    data: Optional[bytearray]
+    duplicate: bool = False
+
+def ingest_upload(stream: BinaryIO, filename: str, input_dir: str,
+                  max_bytes: int = MAX_UPLOAD_BYTES,
+                  memory_max_bytes: int = UPLOAD_MEMORY_MAX_BYTES) -> IngestedUpload:
+    """
+    Stream an upload into input_dir, hashing it on the way, and dedupe by content
+
+    The body is copied in chunks to a temp file while a SHA-256 digest is
+    updated, so the size limit trips as soon as it is crossed rather than
+    after the whole body has been buffered. If the corpus manifest lists a
+    PDF with the same content, the temp file is dropped and that PDF is
+    returned instead (duplicate=True), whatever name the client sent.
+    Only the first memory_max_bytes are also kept in memory; past that the
+    copy is dropped and the PDF is parsed from the stored file.
+
+    This streams end to end only for a raw application/pdf body. For a
+    multipart upload, Werkzeug has already spooled the whole part to its
+    own temp file before stream is read, so the request is bounded only by
+    Flask's MAX_CONTENT_LENGTH check on Content-Length.
+
+    Args:
+        stream: Readable upload body
+        filename: Client-supplied name; sanitized with secure_filename, and
+            replaced by a digest-based name if nothing usable survives
+        input_dir: Corpus directory the PDF is stored in
+        max_bytes: Upload size limit
+        memory_max_bytes: Largest upload also kept in memory for parsing
+
+    Returns:
+        IngestedUpload describing the stored (or already present) PDF
+    """
+    if not (filename or "").lower().endswith(".pdf"):
+        raise Exception("File must be a PDF")
+
+    digest = hashlib.sha256()
+    data = bytearray()
+    size = 0
+    tmp_path = os.path.join(input_dir, f".upload.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(tmp_path, "wb") as f:
+            for chunk in iter(lambda: stream.read(UPLOAD_CHUNK_BYTES), b""):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(f"Upload exceeds the {max_bytes} byte limit")
+                digest.update(chunk)
+                if data is not None:
+                    data.extend(chunk)
+                    if size > memory_max_bytes:
+                        data = None
+                f.write(chunk)
+
+        if not size:
+            raise Exception("Uploaded file is empty")
+
+        hex_digest = digest.hexdigest()
+        manifest = get_manifest(input_dir)
+        manifest.scan()
+        existing = manifest.find_by_digest(hex_digest)
+        if existing:
+            os.remove(tmp_path)
+            logging.info(f"Upload {filename} is identical to {existing}; keeping the stored copy")
+            return IngestedUpload(existing, os.path.join(input_dir, existing), hex_digest,
+                                  size, data, duplicate=True)
+
+        safe_name = secure_filename(filename)
+        if not safe_name.lower().endswith(".pdf") or safe_name.lower() == ".pdf":
+            safe_name = f"upload-{hex_digest[:12]}.pdf"
+        path = os.path.join(input_dir, safe_name)
+        os.replace(tmp_path, path)
+        manifest.record(safe_name, hex_digest)
+        manifest.save()
+        return IngestedUpload(safe_name, path, hex_digest, size, data)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
@@ -0,0 +1,166 @@
+import os
+import re
+import json
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+from shared_files import atomic_write
+
+ANALYSIS_JOB_WORKERS = int(os.environ.get("ANALYSIS_JOB_WORKERS", "2"))
+ANALYSIS_MAX_PENDING_JOBS = int(os.environ.get("ANALYSIS_MAX_PENDING_JOBS", "16"))
+ANALYSIS_JOB_TTL_SECONDS = int(os.environ.get("ANALYSIS_JOB_TTL_SECONDS", "3600"))
+# Job status and results are kept here, so any worker process can serve a poll
+ANALYSIS_JOB_DIR = os.environ.get("ANALYSIS_JOB_DIR", os.path.join("output", "jobs"))
+
+JOB_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+class JobQueueFull(Exception):
+    """Raised when too many jobs are already queued or running"""
+
+class JobManager:
+    """
+    Registry of background analysis jobs, shared through files
+
+    Jobs run on a bounded thread pool in the process that accepted them; at
+    most max_pending jobs may be queued or running there at once. Each job's
+    status is written to <job_dir>/<job_id>.json and its result to
+    <job_id>.result.json, so a poll that lands on another gunicorn worker
+    finds the job too. Finished jobs are kept for ttl_seconds so clients can
+    fetch their results, then deleted.
+    """
+
+    def __init__(self, max_workers: int = ANALYSIS_JOB_WORKERS,
+                 max_pending: int = ANALYSIS_MAX_PENDING_JOBS,
+                 ttl_seconds: int = ANALYSIS_JOB_TTL_SECONDS,
+                 job_dir: str = ANALYSIS_JOB_DIR):
+        self.max_pending = max_pending
+        self.ttl_seconds = ttl_seconds
+        self.job_dir = job_dir
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="analysis-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, func: Callable[..., Dict[str, Any]], *args, **kwargs) -> str:
+        """
+        Queue func to run in the background
+
+        func is called with the given arguments plus progress_callback, and its
+        return value becomes the job result.
+
+        Returns:
+            The new job ID
+
+        Raises:
+            JobQueueFull: If max_pending jobs are already queued or running
+        """
+        self._expire()
+
+        with self._lock:
+            active = sum(1 for job in self._jobs.values() if job["status"] in ("queued", "running"))
+            if active >= self.max_pending:
+                raise JobQueueFull(f"{active} analysis jobs already pending")
+
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                "job_id": job_id,
+                "status": "queued",
+                "progress": {},
+                "error": None,
+                "created_at": time.time(),
+                "started_at": None,
+                "finished_at": None
+            }
+            os.makedirs(self.job_dir, exist_ok=True)
+            self._write(job_id)
+
+        self._executor.submit(self._run, job_id, func, args, kwargs)
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Return a snapshot of a job's status and progress (without the result)
+
+        Works for jobs accepted by any process sharing job_dir.
+        """
+        self._expire()
+        return self._read(job_id, "json")
+
+    def result(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Return the result of a completed job, or None if there is none
+        """
+        return self._read(job_id, "result.json")
+
+    def _run(self, job_id: str, func: Callable[..., Dict[str, Any]], args, kwargs) -> None:
+        self._update(job_id, status="running", started_at=time.time())
+
+        def progress_callback(progress: Dict[str, Any]) -> None:
+            self._update(job_id, progress=dict(progress))
+
+        try:
+            result = func(*args, progress_callback=progress_callback, **kwargs)
+            # The result is in place before any poll can see the job completed
+            with atomic_write(self._path(job_id, "result.json")) as f:
+                json.dump(result, f, ensure_ascii=False)
+            final = {"status": "completed"}
+        except Exception as e:
+            logging.error(f"Analysis job {job_id} failed: {str(e)}")
+            final = {"status": "failed", "error": str(e)}
+
+        # The job leaves this process's active set as its final status is written
+        with self._lock:
+            self._jobs[job_id].update(final, finished_at=time.time())
+            self._write(job_id)
+            del self._jobs[job_id]
+
+    def _update(self, job_id: str, **fields) -> None:
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields)
+                self._write(job_id)
+
+    def _write(self, job_id: str) -> None:
+        """
+        Save a job's status; must be called with the lock held
+        """
+        with atomic_write(self._path(job_id, "json")) as f:
+            json.dump(self._jobs[job_id], f, ensure_ascii=False)
+
+    def _read(self, job_id: str, suffix: str) -> Optional[Dict[str, Any]]:
+        if not JOB_ID_PATTERN.match(job_id):
+            return None
+        try:
+            with open(self._path(job_id, suffix), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _path(self, job_id: str, suffix: str) -> str:
+        return os.path.join(self.job_dir, f"{job_id}.{suffix}")
+
+    def _expire(self) -> None:
+        """
+        Delete the files of finished jobs older than the TTL
+        """
+        cutoff = time.time() - self.ttl_seconds
+        try:
+            entries = [entry for entry in os.scandir(self.job_dir) if entry.name.endswith(".json")]
+        except FileNotFoundError:
+            return
+        with self._lock:
+            active = set(self._jobs)
+
+        for entry in entries:
+            job_id, suffix = entry.name.split(".", 1)
+            try:
+                if job_id in active or entry.stat().st_mtime >= cutoff:
+                    continue
+                # A status file may belong to a job still running in another process
+                if suffix == "json" and (self._read(job_id, suffix) or {}).get("finished_at") is None:
+                    continue
+                os.remove(entry.path)
+            except (FileNotFoundError, ValueError):
+                continue
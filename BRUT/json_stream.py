@@ -0,0 +1,44 @@
+import json
+from collections.abc import Iterator
+from typing import Any, Dict, TextIO
+
+def write_json_stream(f: TextIO, fields: Dict[str, Any], indent: int = 2) -> Dict[str, int]:
+    """
+    Write a JSON object whose iterator-valued fields are streamed as arrays
+
+    Each array item is serialized and written as soon as the iterator
+    produces it, so the array is never held in memory. The output is the
+    same as json.dump(..., indent=indent, ensure_ascii=False) would give
+    with every iterator materialized as a list.
+
+    Args:
+        f: Text file to write to
+        fields: Object fields in output order; iterator values become arrays
+        indent: Spaces per nesting level
+
+    Returns:
+        Number of items written for each streamed field
+    """
+    counts = {}
+    pad = " " * indent
+    f.write("{")
+    for position, (key, value) in enumerate(fields.items()):
+        f.write(("," if position else "") + f"\n{pad}{json.dumps(key, ensure_ascii=False)}: ")
+        if isinstance(value, Iterator):
+            counts[key] = _write_array(f, value, indent)
+        else:
+            f.write(_nested(json.dumps(value, indent=indent, ensure_ascii=False), pad))
+    f.write("\n}" if fields else "}")
+    return counts
+
+def _write_array(f: TextIO, items: Iterator[Any], indent: int) -> int:
+    pad = " " * indent * 2
+    count = 0
+    for item in items:
+        f.write(("," if count else "[") + f"\n{pad}" + _nested(json.dumps(item, indent=indent, ensure_ascii=False), pad))
+        count += 1
+    f.write(f"\n{' ' * indent}]" if count else "[]")
+    return count
+
+def _nested(serialized: str, pad: str) -> str:
+    return serialized.replace("\n", "\n" + pad)
@@ -0,0 +1,191 @@
+import os
+import json
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Any, Optional
+from extraction_cache import file_digest
+from shared_files import atomic_write, SharedInstances
+
+MANIFEST_FILENAME = ".manifest.json"
+
+# Artifacts that are paths of files derived from a PDF, deleted with it
+FILE_ARTIFACTS = ("outline",)
+
+@dataclass
+class ManifestChanges:
+    """
+    Result of comparing the input directory with the manifest
+    """
+    added: List[str] = field(default_factory=list)
+    modified: List[str] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+    # Former manifest entries of PDFs that are gone, so artifacts can be cleaned up
+    removed: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+
+    @property
+    def changed(self) -> List[str]:
+        return sorted(self.added + self.modified)
+
+class CorpusManifest:
+    """
+    Record of every PDF in a corpus directory, saved next to it
+
+    Each entry holds the file's size, mtime (ns) and SHA-256 content hash,
+    plus the paths of artifacts derived from it (e.g. its outline JSON).
+    A scan only hashes files whose size or mtime moved, so finding what
+    changed in a large, mostly static corpus costs one stat per file.
+    """
+
+    def __init__(self, input_dir: str):
+        self.input_dir = input_dir
+        self.path = os.path.join(input_dir, MANIFEST_FILENAME)
+        self.lock = threading.RLock()
+        self.files = {}
+        self.loaded_mtime = None
+        self._dirty = False
+        self._load()
+
+    def scan(self) -> ManifestChanges:
+        """
+        Bring the manifest in line with the PDFs currently in the directory
+
+        Files derived from a removed PDF (FILE_ARTIFACTS) are deleted here,
+        so they are cleaned up whichever caller scans first.
+
+        Returns:
+            Which PDFs were added, modified (new content hash), unchanged or
+            removed since the last scan
+        """
+        changes = ManifestChanges()
+        with self.lock:
+            present = set()
+            for entry in sorted(os.scandir(self.input_dir), key=lambda e: e.name):
+                if not entry.name.lower().endswith(".pdf") or not entry.is_file():
+                    continue
+                present.add(entry.name)
+                stat = entry.stat()
+                known = self.files.get(entry.name)
+                if known and known["size"] == stat.st_size and known["mtime_ns"] == stat.st_mtime_ns:
+                    changes.unchanged.append(entry.name)
+                    continue
+
+                digest = file_digest(entry.path)
+                if known and known["digest"] == digest:
+                    # Touched but not changed: keep its artifacts
+                    known["size"], known["mtime_ns"] = stat.st_size, stat.st_mtime_ns
+                    changes.unchanged.append(entry.name)
+                else:
+                    self.files[entry.name] = {
+                        "size": stat.st_size,
+                        "mtime_ns": stat.st_mtime_ns,
+                        "digest": digest,
+                        "artifacts": {}
+                    }
+                    (changes.modified if known else changes.added).append(entry.name)
+                self._dirty = True
+
+            for filename in [name for name in self.files if name not in present]:
+                changes.removed[filename] = self.files.pop(filename)
+                self._remove_artifacts(filename, changes.removed[filename])
+                self._dirty = True
+
+        if changes.added or changes.modified or changes.removed:
+            logging.info(f"Corpus scan: {len(changes.added)} added, {len(changes.modified)} modified, "
+                         f"{len(changes.removed)} removed, {len(changes.unchanged)} unchanged")
+        return changes
+
+    def record(self, filename: str, digest: str) -> None:
+        """
+        Register a PDF whose content hash is already known (e.g. a fresh upload)
+        """
+        stat = os.stat(os.path.join(self.input_dir, filename))
+        with self.lock:
+            known = self.files.get(filename)
+            artifacts = known["artifacts"] if known and known["digest"] == digest else {}
+            self.files[filename] = {
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "digest": digest,
+                "artifacts": artifacts
+            }
+            self._dirty = True
+
+    def filenames(self) -> List[str]:
+        with self.lock:
+            return sorted(self.files)
+
+    def digest(self, filename: str) -> Optional[str]:
+        with self.lock:
+            entry = self.files.get(filename)
+            return entry["digest"] if entry else None
+
+    def find_by_digest(self, digest: str) -> Optional[str]:
+        """
+        Name of a recorded PDF with this content, if any
+        """
+        with self.lock:
+            return next((name for name, entry in sorted(self.files.items()) if entry["digest"] == digest), None)
+
+    def artifact(self, filename: str, name: str) -> Optional[str]:
+        with self.lock:
+            entry = self.files.get(filename)
+            return entry["artifacts"].get(name) if entry else None
+
+    def set_artifact(self, filename: str, name: str, value: Optional[str]) -> None:
+        """
+        Record (or with None, forget) something derived from a PDF's current content
+        """
+        with self.lock:
+            entry = self.files.get(filename)
+            if entry is not None:
+                if value is None:
+                    entry["artifacts"].pop(name, None)
+                else:
+                    entry["artifacts"][name] = value
+                self._dirty = True
+
+    def save(self) -> None:
+        """
+        Persist the manifest if it changed since it was loaded or last saved
+        """
+        with self.lock:
+            if not self._dirty:
+                return
+
+            with atomic_write(self.path) as f:
+                json.dump({"files": self.files}, f, ensure_ascii=False, separators=(",", ":"))
+
+            self._dirty = False
+            self.loaded_mtime = os.path.getmtime(self.path)
+
+    def _remove_artifacts(self, filename: str, entry: Dict[str, Any]) -> None:
+        for name in FILE_ARTIFACTS:
+            path = entry["artifacts"].get(name)
+            if path and os.path.exists(path):
+                try:
+                    os.remove(path)
+                    logging.info(f"Removed {name} of deleted {filename}")
+                except OSError as e:
+                    logging.warning(f"Could not remove {name} of deleted {filename}: {str(e)}")
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, "r", encoding='utf-8') as f:
+                self.files = json.load(f)["files"]
+            self.loaded_mtime = os.path.getmtime(self.path)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logging.warning(f"Rebuilding unreadable corpus manifest {self.path}: {str(e)}")
+            self.files = {}
+
+_manifests = SharedInstances()
+
+def get_manifest(input_dir: str) -> CorpusManifest:
+    """
+    Return the manifest of a corpus directory
+
+    Shared within the process (see shared_files.SharedInstances).
+    """
+    return _manifests.get(os.path.join(input_dir, MANIFEST_FILENAME), lambda: CorpusManifest(input_dir))
@@ -0,0 +1,215 @@
+import os
+import sys
+import time
+import bisect
+import resource
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, Optional, Tuple, TypeVar
+
+# Include a per-stage timing breakdown in analysis metadata
+ANALYSIS_TIMINGS = os.environ.get("ANALYSIS_TIMINGS", "0") == "1"
+
+METRIC_PREFIX = "docu_"
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+T = TypeVar("T")
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+class StageTimings:
+    """
+    Per-request accumulator of seconds spent in each pipeline stage
+    """
+
+    def __init__(self):
+        self.seconds = {}
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+
+    def to_dict(self) -> Dict[str, float]:
+        return {stage: round(seconds, 4) for stage, seconds in self.seconds.items()}
+
+class Metrics:
+    """
+    Process-wide counters and stage-latency histograms
+
+    Rendered in the Prometheus text exposition format by render(). Values
+    are per process: under gunicorn each worker reports its own, and work
+    done in PDF_WORKERS extraction processes is only visible through the
+    stage timers of the process that waited for it.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = STAGE_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._help = {}
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+
+    def describe(self, name: str, help_text: str) -> None:
+        self._help[name] = help_text
+
+    def inc(self, name: str, amount: float = 1, **labels: str) -> None:
+        """
+        Add amount to a counter
+        """
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def set_gauge(self, name: str, value: float, **labels: str) -> None:
+        with self._lock:
+            self._gauges[(name, _label_key(labels))] = value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        """
+        Record one observation in a histogram
+        """
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * len(self.buckets), 0, 0.0]
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                histogram[0][index] += 1
+            histogram[1] += 1
+            histogram[2] += value
+
+    @contextmanager
+    def stage(self, stage: str, timings: Optional[StageTimings] = None) -> Iterator[None]:
+        """
+        Time a block as one pipeline stage
+
+        The duration goes to the docu_stage_seconds histogram and, when
+        timings is given, to that request's breakdown. Exceptions escaping
+        the block are counted in docu_errors_total.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.inc("errors_total", stage=stage)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self.observe("stage_seconds", elapsed, stage=stage)
+            if timings is not None:
+                timings.add(stage, elapsed)
+
+    def timed_iter(self, iterable: Iterable[T], stage: str,
+                   timings: Optional[StageTimings] = None) -> Iterator[T]:
+        """
+        Yield from iterable, counting only the time spent producing items
+
+        Suited to lazy pipelines (e.g. batched scoring) where the consumer's
+        own work between items must not be charged to the stage.
+        """
+        iterator = iter(iterable)
+        total = 0.0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    total += time.perf_counter() - start
+                    break
+                total += time.perf_counter() - start
+                yield item
+        finally:
+            self.observe("stage_seconds", total, stage=stage)
+            if timings is not None:
+                timings.add(stage, total)
+
+    def render(self) -> str:
+        """
+        Prometheus text exposition of every metric
+        """
+        with self._lock:
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+            histograms = sorted((key, (list(h[0]), h[1], h[2])) for key, h in self._histograms.items())
+
+        lines = []
+        seen = set()
+
+        def header(name: str, kind: str) -> None:
+            if name not in seen:
+                seen.add(name)
+                if name in self._help:
+                    lines.append(f"# HELP {METRIC_PREFIX}{name} {self._help[name]}")
+                lines.append(f"# TYPE {METRIC_PREFIX}{name} {kind}")
+
+        for (name, labels), value in counters:
+            header(name, "counter")
+            lines.append(f"{METRIC_PREFIX}{name}{_format_labels(labels)} {_format_value(value)}")
+
+        for (name, labels), value in gauges:
+            header(name, "gauge")
+            lines.append(f"{METRIC_PREFIX}{name}{_format_labels(labels)} {_format_value(value)}")
+
+        for (name, labels), (counts, count, total) in histograms:
+            header(name, "histogram")
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{METRIC_PREFIX}{name}_bucket{_format_labels(labels + (('le', repr(bound)),))} {cumulative}")
+            lines.append(f"{METRIC_PREFIX}{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{METRIC_PREFIX}{name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{METRIC_PREFIX}{name}_count{_format_labels(labels)} {count}")
+
+        return "\n".join(lines) + "\n"
+
+def process_memory() -> Dict[str, int]:
+    """
+    Memory of this process in bytes: rss, plus pss and shared where available
+
+    pss (proportional set size) divides shared pages among the processes
+    mapping them, so for gunicorn workers forked after the model was loaded
+    it shows how much of the model each one really costs. Read from
+    /proc/self/smaps_rollup on Linux; elsewhere only the peak RSS is known.
+    """
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            fields = dict(line.split(":", 1) for line in f if line.count(":") == 1)
+        kb = lambda name: int(fields[name].split()[0]) * 1024
+        return {
+            "rss": kb("Rss"),
+            "pss": kb("Pss"),
+            "shared": kb("Shared_Clean") + kb("Shared_Dirty")
+        }
+    except (OSError, KeyError, ValueError):
+        # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return {"rss": peak if sys.platform == "darwin" else peak * 1024}
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+def _format_labels(labels: LabelKey) -> str:
+    if not labels:
+        return ""
+    escaped = [(key, value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")) for key, value in labels]
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+metrics = Metrics()
+metrics.describe("stage_seconds", "Time spent in each pipeline stage")
+metrics.describe("errors_total", "Failures by pipeline stage")
+metrics.describe("documents_processed_total", "PDFs whose pages were extracted for analysis")
+metrics.describe("pages_decoded_total", "PDF pages decoded by PyMuPDF (cache misses only)")
+metrics.describe("pages_processed_total", "Pages scored for relevance")
+metrics.describe("pages_skipped_total", "Pages not scored, by reason")
+metrics.describe("classifier_calls_total", "Zero-shot classifier invocations")
+metrics.describe("classifier_pages_total", "Pages sent to the zero-shot classifier")
+metrics.describe("outlines_extracted_total", "Outlines returned, by extraction method")
+metrics.describe("http_request_seconds", "HTTP request latency by route")
+metrics.describe("http_requests_total", "HTTP responses by route and status")
+metrics.describe("startup_seconds", "Time to import the app (and preload the model) in this process")
+metrics.describe("process_memory_bytes", "Resident memory of this process (rss, pss, shared)")
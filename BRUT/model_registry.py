@@ -0,0 +1,261 @@
+import os
+import time
+import logging
+import threading
+import importlib.util
+from typing import Dict, List, Any, Optional
+
+# Only look for transformers here: importing it pulls in torch, which takes
+# seconds and hundreds of MB, so build_classifier imports it on first use
+TRANSFORMERS_AVAILABLE = importlib.util.find_spec("transformers") is not None
+if not TRANSFORMERS_AVAILABLE:
+    logging.warning("Transformers library not available. Using fallback analysis.")
+
+CLASSIFIER_MODEL = os.environ.get("CLASSIFIER_MODEL", "facebook/bart-large-mnli")
+# "pytorch" (transformers pipeline) or "onnx" (ONNX Runtime, see onnx_backend)
+CLASSIFIER_BACKEND = os.environ.get("CLASSIFIER_BACKEND", "pytorch")
+CLASSIFIER_ONNX_QUANTIZE = os.environ.get("CLASSIFIER_ONNX_QUANTIZE", "0") == "1"
+# Score on a shared inference worker (host:port or socket path, see
+# inference_worker) instead of loading the model in this process
+INFERENCE_WORKER_ADDRESS = os.environ.get("INFERENCE_WORKER_ADDRESS", "")
+# An unreachable worker is retried after 1s, doubling up to this many seconds
+INFERENCE_WORKER_RETRY_MAX_SECONDS = float(os.environ.get("INFERENCE_WORKER_RETRY_MAX_SECONDS", "60"))
+
+class ModelRegistry:
+    """
+    Process-wide holder for the zero-shot classifier
+
+    The model is loaded at most once per process and shared by every caller.
+    Callers that arrive while a load is in progress block on the same lock
+    and receive the instance produced by that single load.
+
+    With a worker_address, "loading" connects to the shared inference
+    worker instead, and the classifier handed out is a RemoteClassifier.
+    A failed connection is not cached: later calls retry it with backoff,
+    returning None (the lexical fallback) until the worker is reachable.
+    """
+
+    def __init__(self, model_name: str = CLASSIFIER_MODEL, backend: str = CLASSIFIER_BACKEND,
+                 quantize: bool = CLASSIFIER_ONNX_QUANTIZE,
+                 worker_address: str = INFERENCE_WORKER_ADDRESS):
+        self.model_name = model_name
+        self.backend = backend
+        self.quantize = quantize
+        self.worker_address = worker_address
+        self._lock = threading.Lock()
+        self._classifier = None
+        self._loaded = False
+        self._loading = False
+        self._load_seconds = None
+        self._error = None
+        self._retry_at = 0.0
+        self._retry_delay = 0.0
+
+    def get_classifier(self):
+        """
+        Return the shared classifier, loading it on first use
+
+        Returns:
+            The zero-shot pipeline, or None when transformers is unavailable
+            or the model failed to load
+        """
+        if self._loaded:
+            return self._classifier
+        if time.monotonic() < self._retry_at:
+            return None
+
+        with self._lock:
+            if not self._loaded and time.monotonic() >= self._retry_at:
+                self._load()
+            return self._classifier
+
+    @property
+    def model_id(self) -> str:
+        """
+        Identifier of the scoring model, including backend and quantization
+        """
+        remote_id = getattr(self._classifier, "model_id", None) if self.worker_address else None
+        if remote_id:
+            return remote_id
+        if self.backend == "onnx":
+            return f"{self.model_name}@onnx{'-int8' if self.quantize else ''}"
+        return self.model_name
+
+    def warm_up(self, background: bool = True) -> None:
+        """
+        Load the classifier ahead of the first request
+
+        Args:
+            background: Load in a daemon thread instead of blocking the caller
+        """
+        if background:
+            threading.Thread(target=self.get_classifier, name="model-warmup", daemon=True).start()
+        else:
+            self.get_classifier()
+
+    def status(self) -> Dict[str, Any]:
+        """
+        Describe the classifier state for health reporting
+        """
+        return {
+            "model": self.model_name,
+            "backend": self.backend,
+            "quantized": self.backend == "onnx" and self.quantize,
+            "transformers_available": TRANSFORMERS_AVAILABLE,
+            "worker": self.worker_address or None,
+            "loaded": self._loaded and self._classifier is not None,
+            "loading": self._loading,
+            "load_seconds": round(self._load_seconds, 3) if self._load_seconds is not None else None,
+            "error": self._error
+        }
+
+    def use_classifier(self, classifier) -> None:
+        """
+        Install a ready-made classifier instead of loading the model
+
+        Used by benchmarks and tools; pass None to force the lexical fallback.
+        """
+        with self._lock:
+            self._classifier = classifier
+            self._loaded = True
+            self._load_seconds = None
+            self._error = None
+
+    def reset(self) -> None:
+        """
+        Drop the cached classifier so the next call loads it again
+        """
+        with self._lock:
+            self._classifier = None
+            self._loaded = False
+            self._load_seconds = None
+            self._error = None
+            self._retry_at = 0.0
+            self._retry_delay = 0.0
+
+    def _load(self) -> None:
+        """
+        Build the pipeline; must be called with the lock held
+        """
+        if self.worker_address:
+            self._connect_worker()
+            return
+        if not TRANSFORMERS_AVAILABLE:
+            self._loaded = True
+            return
+
+        self._loading = True
+        start = time.perf_counter()
+        try:
+            self._classifier = build_classifier(self.model_name, self.backend, self.quantize)
+            logging.info(f"Classifier {self.model_name} loaded in {time.perf_counter() - start:.2f}s")
+        except Exception as e:
+            logging.warning(f"Failed to initialize classifier: {str(e)}")
+            self._classifier = None
+            self._error = str(e)
+        finally:
+            self._load_seconds = time.perf_counter() - start
+            self._loading = False
+            self._loaded = True
+
+    def _connect_worker(self) -> None:
+        """
+        Attach to the shared inference worker; must be called with the lock held
+
+        On failure the registry stays unloaded and the next attempt is
+        scheduled with exponential backoff, so a web process started before
+        the worker picks it up once it is running.
+        """
+        from inference_worker import RemoteClassifier
+        start = time.perf_counter()
+        try:
+            self._classifier = RemoteClassifier(self.worker_address)
+            self._loaded = True
+            self._error = None
+            self._retry_delay = 0.0
+            logging.info(f"Using inference worker at {self.worker_address} ({self._classifier.model_id})")
+        except Exception as e:
+            self._classifier = None
+            self._error = str(e)
+            self._retry_delay = min(max(1.0, 2 * self._retry_delay), INFERENCE_WORKER_RETRY_MAX_SECONDS)
+            self._retry_at = time.monotonic() + self._retry_delay
+            logging.warning(f"Failed to reach inference worker at {self.worker_address}: {str(e)} "
+                            f"(retrying in {self._retry_delay:.0f}s)")
+        finally:
+            self._load_seconds = time.perf_counter() - start
+
+def build_classifier(model_name: str, backend: str = "pytorch", quantize: bool = False):
+    """
+    Construct a zero-shot classifier for the given backend
+
+    Both backends share the pipeline calling convention used by doc_analyzer:
+    classifier(texts, candidate_labels=[...], batch_size=n). Their heavy
+    dependencies are imported here, not when this module is loaded.
+    """
+    if backend == "onnx":
+        from onnx_backend import ONNXZeroShotClassifier
+        return ONNXZeroShotClassifier(model_name, quantize=quantize)
+    if backend != "pytorch":
+        raise Exception(f"Unknown classifier backend: {backend}")
+
+    from transformers import pipeline
+    return pipeline(
+        "zero-shot-classification",
+        model=model_name,
+        device=-1  # Use CPU for compatibility
+    )
+
+def entailment_logits(classifier, premises: List[str], labels: List[str],
+                      batch_size: int = 8) -> Optional[List[List[float]]]:
+    """
+    Entailment logit of every (premise, label hypothesis) pair
+
+    A zero-shot score for one label against another is the softmax of these
+    two logits, so a page can be scored against several jobs in one pass.
+    Supports the ONNX backend and the transformers pipeline; returns None
+    for classifiers that don't expose logits (e.g. a RemoteClassifier).
+
+    Returns:
+        Rows of len(labels) logits, one row per premise
+    """
+    template = getattr(classifier, "hypothesis_template", "This example is {}.")
+    hypotheses = [template.format(label) for label in labels]
+
+    if hasattr(classifier, "entailment_logits"):
+        return classifier.entailment_logits(premises, hypotheses, batch_size).tolist()
+    if not supports_entailment_logits(classifier):
+        return None
+
+    model = classifier.model
+    tokenizer = classifier.tokenizer
+    entailment_id = classifier.entailment_id
+
+    import torch
+    pairs = [(premise, hypothesis) for premise in premises for hypothesis in hypotheses]
+    logits = []
+    step = max(1, batch_size) * max(1, len(hypotheses))
+    with torch.no_grad():
+        for start in range(0, len(pairs), step):
+            chunk = pairs[start:start + step]
+            encoded = tokenizer([premise for premise, _ in chunk], [hypothesis for _, hypothesis in chunk],
+                                padding=True, truncation="only_first", return_tensors="pt")
+            logits.extend(model(**encoded).logits[:, entailment_id].tolist())
+    return [logits[row:row + len(hypotheses)] for row in range(0, len(logits), len(hypotheses))]
+
+def supports_entailment_logits(classifier) -> bool:
+    """
+    Whether entailment_logits can score pairs with this classifier
+    """
+    if hasattr(classifier, "entailment_logits"):
+        return True
+    return (getattr(classifier, "model", None) is not None
+            and getattr(classifier, "tokenizer", None) is not None
+            and getattr(classifier, "entailment_id", -1) >= 0)
+
+registry = ModelRegistry()
+
+def get_classifier():
+    """
+    Return the process-wide zero-shot classifier (None if unavailable)
+    """
+    return registry.get_classifier()
@@ -0,0 +1,122 @@
+import os
+import logging
+from typing import Dict, List, Any, Union
+import numpy as np
+import onnxruntime
+from transformers import AutoConfig, AutoTokenizer
+
+ONNX_MODEL_DIR = os.environ.get("ONNX_MODEL_DIR", os.path.join("cache", "onnx"))
+
+class ONNXZeroShotClassifier:
+    """
+    Zero-shot NLI classifier running on ONNX Runtime
+
+    Imported only when CLASSIFIER_BACKEND=onnx, so numpy, onnxruntime and
+    optimum are needed only for this backend.
+
+    Drop-in replacement for the transformers zero-shot pipeline as used by
+    doc_analyzer: called with one text or a list of texts plus
+    candidate_labels, it returns {"sequence", "labels", "scores"} dicts with
+    labels sorted by score. Scores follow the pipeline's single-label rule:
+    a softmax over each label's entailment logit.
+
+    The model is exported to ONNX on first use and kept under ONNX_MODEL_DIR;
+    with quantize=True a dynamically int8-quantized copy is built next to it
+    and used instead.
+    """
+
+    def __init__(self, model_name: str, quantize: bool = False, model_dir: str = ONNX_MODEL_DIR,
+                 hypothesis_template: str = "This example is {}."):
+        self.model_name = model_name
+        self.quantize = quantize
+        self.hypothesis_template = hypothesis_template
+
+        export_dir = os.path.join(model_dir, model_name.replace("/", "--"))
+        model_path = _export_model(model_name, export_dir)
+        if quantize:
+            model_path = _quantize_model(model_path)
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {node.name for node in self.session.get_inputs()}
+
+        self.tokenizer = AutoTokenizer.from_pretrained(export_dir)
+        config = AutoConfig.from_pretrained(export_dir)
+        self.entailment_id = _label_id(config.label2id, "entail")
+        logging.info(f"ONNX classifier ready: {model_path}")
+
+    def __call__(self, sequences: Union[str, List[str]], candidate_labels: List[str],
+                 batch_size: int = 8, **kwargs) -> Union[Dict[str, Any], List[Dict[str, Any]]]:
+        single = isinstance(sequences, str)
+        texts = [sequences] if single else list(sequences)
+
+        hypotheses = [self.hypothesis_template.format(label) for label in candidate_labels]
+        logits = self.entailment_logits(texts, hypotheses, batch_size)
+
+        results = []
+        for text, row in zip(texts, logits):
+            exp = np.exp(row - row.max())
+            scores = exp / exp.sum()
+            order = np.argsort(-scores)
+            results.append({
+                "sequence": text,
+                "labels": [candidate_labels[i] for i in order],
+                "scores": [float(scores[i]) for i in order]
+            })
+        return results[0] if single else results
+
+    def entailment_logits(self, premises: List[str], hypotheses: List[str],
+                          batch_size: int = 8) -> np.ndarray:
+        """
+        Entailment logit of every (premise, hypothesis) pair
+
+        Returns:
+            Array of shape (len(premises), len(hypotheses))
+        """
+        pairs = [(premise, hypothesis) for premise in premises for hypothesis in hypotheses]
+        logits = np.zeros(len(pairs), dtype=np.float32)
+
+        step = max(1, batch_size) * max(1, len(hypotheses))
+        for start in range(0, len(pairs), step):
+            chunk = pairs[start:start + step]
+            encoded = self.tokenizer(
+                [premise for premise, _ in chunk],
+                [hypothesis for _, hypothesis in chunk],
+                padding=True, truncation="only_first", return_tensors="np"
+            )
+            feeds = {name: encoded[name].astype(np.int64) for name in encoded if name in self.input_names}
+            output = self.session.run(None, feeds)[0]
+            logits[start:start + len(chunk)] = output[:, self.entailment_id]
+
+        return logits.reshape(len(premises), len(hypotheses))
+
+def _export_model(model_name: str, export_dir: str) -> str:
+    """
+    Export a sequence-classification model to ONNX once and reuse it
+    """
+    model_path = os.path.join(export_dir, "model.onnx")
+    if os.path.exists(model_path):
+        return model_path
+
+    logging.info(f"Exporting {model_name} to ONNX in {export_dir}")
+    from optimum.exporters.onnx import main_export
+    main_export(model_name, output=export_dir, task="text-classification")
+    return model_path
+
+def _quantize_model(model_path: str) -> str:
+    """
+    Build (once) a dynamically int8-quantized copy of an ONNX model
+    """
+    quantized_path = model_path.replace(".onnx", ".int8.onnx")
+    if not os.path.exists(quantized_path):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        logging.info(f"Quantizing {model_path} to int8")
+        quantize_dynamic(model_path, quantized_path, weight_type=QuantType.QInt8)
+    return quantized_path
+
+def _label_id(label2id: Dict[str, int], prefix: str) -> int:
+    for label, index in label2id.items():
+        if label.lower().startswith(prefix):
+            return index
+    raise Exception(f"Model config has no {prefix}* label: {sorted(label2id)}")
@@ -0,0 +1,115 @@
+import os
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Iterator, List, Optional, Sequence, Tuple
+
+# Worker processes used for PDF extraction (1 = run in the calling process)
+PDF_WORKERS = int(os.environ.get("PDF_WORKERS", "1"))
+
+def resolve_workers(workers: Optional[int]) -> int:
+    """
+    Normalize a worker count: None uses PDF_WORKERS, 0 means one per CPU core
+    """
+    if workers is None:
+        workers = PDF_WORKERS
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return workers
+
+def map_files(func: Callable[..., Any], paths: List[str],
+              workers: Optional[int] = None,
+              on_result: Optional[Callable[[str, Any, Optional[str]], None]] = None,
+              extra_args: Optional[List[Sequence[Any]]] = None) -> List[Tuple[str, Any, Optional[str]]]:
+    """
+    Apply func to every path, optionally across a process pool
+
+    Args:
+        func: Function taking a file path
+        paths: File paths to process
+        workers: Number of worker processes (see resolve_workers)
+        on_result: Called with (path, result, error) as each file finishes, in order
+        extra_args: Per-path extra positional arguments, aligned with paths
+
+    Returns:
+        (path, result, error) tuples in the same order as paths. A failure in
+        one file sets its error message and leaves the others untouched.
+    """
+    results = []
+    for item in iter_files(func, paths, workers, extra_args):
+        results.append(item)
+        if on_result:
+            on_result(*item)
+    return results
+
+def iter_files(func: Callable[..., Any], paths: List[str],
+               workers: Optional[int] = None,
+               extra_args: Optional[List[Sequence[Any]]] = None) -> Iterator[Tuple[str, Any, Optional[str]]]:
+    """
+    Yield (path, result, error) for every path, in order, as results arrive
+
+    func is called as func(path, *extra_args[i]) when extra_args is given
+    (e.g. to pass a content hash that is already known).
+
+    PyMuPDF extraction is CPU-bound and holds the GIL, so separate processes
+    are the only way to use more than one core. func must be a module-level
+    function so it can be pickled. Closing the iterator early cancels files
+    that have not started yet.
+
+    A worker that dies outright (e.g. a segfault in a malformed PDF) breaks
+    the whole pool and fails every unfinished file with it. The first of
+    those files is then rerun alone in a fresh process, so only the file
+    that really kills its worker is reported as failed, and the rest go to
+    a new pool.
+    """
+    workers = min(resolve_workers(workers), len(paths))
+    if extra_args is None:
+        extra_args = [()] * len(paths)
+
+    if workers <= 1:
+        for path, args in zip(paths, extra_args):
+            yield _call(func, path, *args)
+        return
+
+    logging.info(f"Processing {len(paths)} files with {workers} worker processes")
+    pending = list(range(len(paths)))
+    while pending:
+        broken = False
+        executor = ProcessPoolExecutor(max_workers=min(workers, len(pending)))
+        try:
+            futures = [executor.submit(_call, func, paths[i], *extra_args[i]) for i in pending]
+            for position, (i, future) in enumerate(zip(pending, futures)):
+                try:
+                    yield future.result()
+                except BrokenProcessPool:
+                    pending = pending[position:]
+                    broken = True
+                    break
+                except Exception as e:
+                    # Submitting or unpickling failed for this file alone
+                    yield paths[i], None, str(e)
+        finally:
+            # A consumer that stops early (e.g. at a deadline) doesn't wait for queued files
+            executor.shutdown(wait=True, cancel_futures=True)
+        if not broken:
+            return
+
+        i = pending.pop(0)
+        logging.warning(f"A worker process died; retrying {os.path.basename(paths[i])} on its own")
+        yield _call_isolated(func, paths[i], *extra_args[i])
+
+def _call_isolated(func: Callable[..., Any], path: str, *args) -> Tuple[str, Any, Optional[str]]:
+    """
+    Run one file in a fresh single-worker pool, reporting a crash as its error
+    """
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        try:
+            return executor.submit(_call, func, path, *args).result()
+        except BrokenProcessPool as e:
+            return path, None, f"Worker process died: {str(e)}"
+
+def _call(func: Callable[..., Any], path: str, *args) -> Tuple[str, Any, Optional[str]]:
+    try:
+        return path, func(path, *args), None
+    except Exception as e:
+        return path, None, str(e)
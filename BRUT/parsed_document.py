@@ -0,0 +1,214 @@
+import os
+import logging
+from dataclasses import dataclass, field, asdict
+from typing import Dict, Iterator, List, Any, Optional
+import fitz  # PyMuPDF
+from extraction_cache import get_cache, file_digest
+from metrics import metrics
+from span_table import SpanTable
+
+# Documents with more pages than this are decoded one page at a time and
+# never held (or cached) whole; see PageStream
+STREAM_PAGE_THRESHOLD = int(os.environ.get("STREAM_PAGE_THRESHOLD", "1000"))
+
+@dataclass
+class ParsedPage:
+    """
+    One decoded page: plain text and page geometry
+
+    spans holds the first span of every text line when the page comes from
+    a PageStream; a ParsedDocument keeps them in one document-wide table.
+    """
+    page_number: int
+    text: str
+    width: float = 0.0
+    height: float = 0.0
+    rotation: int = 0
+    spans: Optional[SpanTable] = None
+
+@dataclass
+class ParsedDocument:
+    """
+    Result of decoding a PDF once, shared by outline extraction and analysis
+    """
+    digest: str
+    page_count: int
+    metadata_title: str = ""
+    pages: List[ParsedPage] = field(default_factory=list)
+    spans: SpanTable = field(default_factory=SpanTable)
+
+    def page_texts(self) -> List[str]:
+        return [page.text for page in self.pages]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "digest": self.digest,
+            "page_count": self.page_count,
+            "metadata_title": self.metadata_title,
+            "pages": [{key: value for key, value in asdict(page).items() if key != "spans"}
+                      for page in self.pages],
+            "spans": self.spans.to_dict()
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ParsedDocument":
+        pages = [ParsedPage(**page) for page in data.get("pages", [])]
+        return cls(
+            digest=data["digest"],
+            page_count=data["page_count"],
+            metadata_title=data.get("metadata_title", ""),
+            pages=pages,
+            spans=SpanTable.from_dict(data["spans"])
+        )
+
+class PageStream:
+    """
+    A PDF opened for page-by-page decoding
+
+    Iterating yields one ParsedPage at a time; nothing is kept once the
+    caller drops it, so memory does not grow with the page count. With
+    spans=False only the plain text is decoded and page.spans stays None.
+    Use as a context manager (or call close()) to release the document.
+    """
+
+    def __init__(self, pdf_path: str, data: Optional[bytes] = None, spans: bool = True):
+        with metrics.stage("pdf_open"):
+            self.doc = open_pdf(pdf_path, data)
+        self.page_count = self.doc.page_count
+        self.metadata_title = (self.doc.metadata or {}).get("title", "") or ""
+        self.spans = spans
+
+    def __iter__(self) -> Iterator[ParsedPage]:
+        for page_num in range(self.page_count):
+            page = _parse_page(self.doc[page_num], page_num, self.spans)
+            metrics.inc("pages_decoded_total")
+            yield page
+
+    def close(self) -> None:
+        self.doc.close()
+
+    def __enter__(self) -> "PageStream":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+def parse_document(pdf_path: str, digest: Optional[str] = None,
+                   data: Optional[bytes] = None) -> ParsedDocument:
+    """
+    Decode every page of a PDF exactly once
+
+    Each page's text layer is built into a single TextPage, and both the
+    span dictionary and the plain text are read from it, so the outline and
+    the relevance analysis see the same decode. Line spans of all pages are
+    gathered into one columnar SpanTable.
+
+    Args:
+        pdf_path: Path to the PDF file
+        digest: Content hash of the file, if already known
+        data: File content already in memory; opened instead of pdf_path
+
+    Returns:
+        ParsedDocument with per-page text and geometry, and the line spans
+    """
+    if digest is None:
+        digest = file_digest(pdf_path)
+
+    with PageStream(pdf_path, data) as stream:
+        with metrics.stage("text_decode"):
+            pages = list(stream)
+            spans = SpanTable.concat(page.spans for page in pages)
+            for page in pages:
+                page.spans = None
+            return ParsedDocument(
+                digest=digest,
+                page_count=stream.page_count,
+                metadata_title=stream.metadata_title,
+                pages=pages,
+                spans=spans
+            )
+
+def count_pages(pdf_path: str, data: Optional[bytes] = None) -> int:
+    """
+    Page count of a PDF, read from its page tree without decoding any page
+    """
+    doc = open_pdf(pdf_path, data)
+    try:
+        return doc.page_count
+    finally:
+        doc.close()
+
+def is_large_document(pdf_path: str, data: Optional[bytes] = None) -> bool:
+    """
+    Whether a PDF should be streamed page by page (see STREAM_PAGE_THRESHOLD)
+    """
+    return STREAM_PAGE_THRESHOLD > 0 and count_pages(pdf_path, data) > STREAM_PAGE_THRESHOLD
+
+def load_document(pdf_path: str, digest: Optional[str] = None,
+                  data: Optional[bytes] = None) -> ParsedDocument:
+    """
+    Return the parsed form of a PDF, decoding it only if its content is new
+
+    Parsed documents are stored in the extraction cache under the file's
+    content hash, so each page is decoded once per document version no
+    matter how many times it is uploaded or analyzed. A large document (see
+    is_large_document) is the exception: only its page texts are decoded,
+    its spans table is left empty and nothing is cached. Callers that need
+    its spans read them page by page from a PageStream.
+
+    Args:
+        pdf_path: Path to the PDF file
+        digest: Content hash of the file, if already known
+        data: File content already in memory (e.g. a fresh upload)
+    """
+    cache = get_cache()
+    if digest is None:
+        digest = file_digest(pdf_path)
+
+    cached = cache.get(digest, "document")
+    if cached is not None:
+        return ParsedDocument.from_dict(cached)
+
+    if is_large_document(pdf_path, data):
+        with PageStream(pdf_path, data, spans=False) as stream:
+            with metrics.stage("text_decode"):
+                parsed = ParsedDocument(digest=digest, page_count=stream.page_count,
+                                        metadata_title=stream.metadata_title, pages=list(stream))
+        logging.info(f"Read the text of {os.path.basename(pdf_path)} ({parsed.page_count} pages, not cached)")
+        return parsed
+
+    parsed = parse_document(pdf_path, digest, data)
+    cache.put(digest, "document", parsed.to_dict())
+    logging.info(f"Parsed {os.path.basename(pdf_path)} ({parsed.page_count} pages)")
+    return parsed
+
+def open_pdf(pdf_path: str, data: Optional[bytes] = None) -> fitz.Document:
+    """
+    Open a PDF from in-memory bytes when available, otherwise from disk
+    """
+    if data is not None:
+        return fitz.open(stream=data, filetype="pdf")
+    return fitz.open(pdf_path)
+
+def _parse_page(page: fitz.Page, page_num: int, with_spans: bool = True) -> ParsedPage:
+    """
+    Decode one page through a single TextPage
+
+    The TextPage is built with the flags get_text("text") uses by default.
+    get_text("dict") defaults to the same flags plus image extraction, and
+    image blocks carry no text lines, so both reads match a plain
+    page.get_text() decode.
+    """
+    textpage = page.get_textpage(flags=fitz.TEXTFLAGS_TEXT)
+    spans = None
+    if with_spans:
+        spans = SpanTable()
+        spans.add_blocks(page_num, page.get_text("dict", textpage=textpage)["blocks"])
+    return ParsedPage(
+        page_number=page_num + 1,
+        text=page.get_text("text", textpage=textpage).strip(),
+        width=page.rect.width,
+        height=page.rect.height,
+        rotation=page.rotation,
+        spans=spans
+    )
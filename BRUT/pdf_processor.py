@@ -1,142 +1,449 @@
-import fitz  # PyMuPDF
 import json
 import os
+import sys
 import logging
-from typing import Dict, List, Any
+import threading
+from typing import Dict, Iterable, Iterator, List, Any, Optional, Tuple
+from extraction_cache import get_cache, file_digest
+from parsed_document import load_document, open_pdf, PageStream, is_large_document
+from span_table import SpanTable
+from json_stream import write_json_stream
+from parallel import map_files, iter_files
+from manifest import get_manifest
+from metrics import metrics
+from shared_files import atomic_write
 
-def extract_outline(pdf_path: str) -> Dict[str, Any]:
+# Import numpy with fallback
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# Prefer the PDF's own bookmark tree over font heuristics when it is well-formed
+OUTLINE_USE_BOOKMARKS = os.environ.get("OUTLINE_USE_BOOKMARKS", "1") == "1"
+
+def extract_outline(pdf_path: str, use_bookmarks: bool = OUTLINE_USE_BOOKMARKS,
+                    digest: Optional[str] = None, data: Optional[bytes] = None) -> Dict[str, Any]:
     """
-    Round 1A: Extract structured outline from PDF using font-based heuristics
+    Round 1A: Extract structured outline from PDF
     
-    Font size analysis:
+    Uses the embedded bookmark tree when the PDF has a well-formed one,
+    otherwise falls back to font-based heuristics:
     - >14pt + bold = H1
     - >12pt = H2  
     - >10pt = H3
     
+    The strategy used is recorded in metadata.extraction_method. Documents
+    over STREAM_PAGE_THRESHOLD pages are decoded one page at a time rather
+    than parsed (and cached) whole.
+    
     Args:
         pdf_path: Path to the PDF file
+        use_bookmarks: Try the embedded bookmarks before scanning fonts
+        digest: Content hash of the file, if already known
+        data: File content already in memory; parsed instead of re-reading pdf_path
         
     Returns:
         Dictionary with title and outline structure
     """
     try:
-        doc = fitz.open(pdf_path)
+        cache = get_cache()
+        if digest is None:
+            digest = file_digest(pdf_path)
         
-        # Extract title from metadata or use filename
-        title = doc.metadata.get("title", "")
-        if not title:
-            title = os.path.basename(pdf_path).replace(".pdf", "")
+        if use_bookmarks:
+            bookmarks = _bookmark_outline(pdf_path, digest, data)
+            if bookmarks["valid"]:
+                logging.info(f"Using {len(bookmarks['outline'])} embedded bookmarks from {os.path.basename(pdf_path)}")
+                metrics.inc("outlines_extracted_total", method="embedded_bookmarks")
+                return _build_outline_result(pdf_path, bookmarks["metadata_title"], bookmarks["outline"],
+                                             bookmarks["total_pages"], "embedded_bookmarks")
         
-        outline = []
+        cached = cache.get(digest, "outline")
+        if cached is not None:
+            logging.info(f"Outline cache hit for {os.path.basename(pdf_path)}")
+            metrics.inc("outlines_extracted_total", method="font_based_heuristics")
+            return _build_outline_result(pdf_path, cached["metadata_title"], cached["outline"],
+                                         cached["total_pages"], "font_based_heuristics")
         
-        # Process each page
-        for page_num in range(doc.page_count):
-            page = doc[page_num]
-            blocks = page.get_text("dict")["blocks"]
+        if is_large_document(pdf_path, data):
+            # Decode page by page; only the headings are kept
+            with PageStream(pdf_path, data) as stream:
+                metadata_title = stream.metadata_title
+                total_pages = stream.page_count
+                with metrics.stage("outline_headings"):
+                    unique_outline = list(_classify_headings(page.spans for page in stream))
+        else:
+            parsed = load_document(pdf_path, digest, data)
+            metadata_title = parsed.metadata_title
+            total_pages = parsed.page_count
             
-            for block in blocks:
-                if "lines" not in block:
-                    continue
-                
-                for line in block["lines"]:
-                    if not line["spans"]:
-                        continue
-                    
-                    # Get text and font properties from first span
-                    span = line["spans"][0]
-                    text = span["text"].strip()
-                    font_size = span["size"]
-                    flags = span["flags"]
-                    
-                    # Skip empty text or very short text
-                    if len(text) < 3:
-                        continue
-                    
-                    # Determine heading level based on font size and style
-                    level = None
-                    is_bold = flags & 16  # Bold flag
-                    
-                    if font_size > 14 and is_bold:
-                        level = "H1"
-                    elif font_size > 12:
-                        level = "H2"
-                    elif font_size > 10:
-                        level = "H3"
-                    
-                    if level:
-                        outline.append({
-                            "level": level,
-                            "text": text,
-                            "page": page_num + 1,
-                            "font_size": round(font_size, 2),
-                            "is_bold": bool(is_bold)
-                        })
+            with metrics.stage("outline_headings"):
+                unique_outline = list(_classify_headings([parsed.spans]))
         
-        doc.close()
+        cache.put(digest, "outline", {
+            "metadata_title": metadata_title,
+            "outline": unique_outline,
+            "total_pages": total_pages
+        })
         
-        # Remove duplicates while preserving order
+        result = _build_outline_result(pdf_path, metadata_title, unique_outline,
+                                       total_pages, "font_based_heuristics")
+        
+        logging.info(f"Extracted {len(unique_outline)} headings from {total_pages} pages")
+        metrics.inc("outlines_extracted_total", method="font_based_heuristics")
+        return result
+        
+    except Exception as e:
+        logging.error(f"Error extracting outline from {pdf_path}: {str(e)}")
+        metrics.inc("errors_total", stage="outline")
+        raise Exception(f"PDF outline extraction failed: {str(e)}")
+
+def write_outline(pdf_path: str, output_path: str, use_bookmarks: bool = OUTLINE_USE_BOOKMARKS,
+                  digest: Optional[str] = None) -> int:
+    """
+    Extract a PDF's outline straight into a JSON file
+    
+    A large document (over STREAM_PAGE_THRESHOLD pages) without usable
+    bookmarks or a cached outline is streamed: each heading is written as
+    soon as its page is decoded, so neither the pages nor the outline are
+    held in memory, and the outline is not cached. Everything else goes
+    through extract_outline. The file content is the same either way.
+    
+    Args:
+        pdf_path: Path to the PDF file
+        output_path: JSON file to write (replaced atomically)
+        use_bookmarks: Try the embedded bookmarks before scanning fonts
+        digest: Content hash of the file, if already known
+        
+    Returns:
+        Number of headings written
+    """
+    if digest is None:
+        digest = file_digest(pdf_path)
+    
+    streamed = (is_large_document(pdf_path)
+                and get_cache().get(digest, "outline") is None
+                and not (use_bookmarks and _bookmark_outline(pdf_path, digest)["valid"]))
+    
+    with atomic_write(output_path) as f:
+        if streamed:
+            try:
+                with PageStream(pdf_path) as stream:
+                    result = _build_outline_result(pdf_path, stream.metadata_title,
+                                                   _classify_headings(page.spans for page in stream),
+                                                   stream.page_count, "font_based_heuristics")
+                    headings = write_json_stream(f, result)["outline"]
+            except Exception as e:
+                logging.error(f"Error extracting outline from {pdf_path}: {str(e)}")
+                metrics.inc("errors_total", stage="outline")
+                raise Exception(f"PDF outline extraction failed: {str(e)}")
+            logging.info(f"Streamed {headings} headings from {result['total_pages']} pages")
+            metrics.inc("outlines_extracted_total", method="font_based_heuristics")
+        else:
+            result = extract_outline(pdf_path, use_bookmarks, digest)
+            json.dump(result, f, indent=2, ensure_ascii=False)
+            headings = len(result["outline"])
+    
+    return headings
+
+def _bookmark_outline(pdf_path: str, digest: str, data: Optional[bytes] = None) -> Dict[str, Any]:
+    """
+    Bookmark outline of a PDF, read through the extraction cache
+    """
+    cache = get_cache()
+    bookmarks = cache.get(digest, "outline_bookmarks")
+    if bookmarks is None:
+        with metrics.stage("outline_bookmarks"):
+            bookmarks = _read_bookmark_outline(pdf_path, data)
+        cache.put(digest, "outline_bookmarks", bookmarks)
+    return bookmarks
+
+def _read_bookmark_outline(pdf_path: str, data: Optional[bytes] = None) -> Dict[str, Any]:
+    """
+    Read the embedded bookmark tree without decoding any page content
+    
+    Returns:
+        Dict with "valid" (whether the bookmarks are usable), the metadata
+        title, page count and the bookmark-derived outline
+    """
+    doc = open_pdf(pdf_path, data)
+    try:
+        toc = doc.get_toc(simple=True)
+        total_pages = doc.page_count
+        metadata_title = (doc.metadata or {}).get("title", "") or ""
+    finally:
+        doc.close()
+    
+    valid = _is_well_formed_toc(toc, total_pages)
+    outline = []
+    if valid:
         seen = set()
-        unique_outline = []
-        for item in outline:
+        for level, text, page in toc:
+            item = {
+                "level": f"H{min(level, 3)}",
+                "text": text.strip(),
+                "page": page
+            }
             key = (item["level"], item["text"], item["page"])
             if key not in seen:
                 seen.add(key)
-                unique_outline.append(item)
-        
-        result = {
-            "title": title,
-            "outline": unique_outline,
-            "total_pages": doc.page_count,
-            "metadata": {
-                "extraction_method": "font_based_heuristics",
-                "font_thresholds": {
-                    "H1": ">14pt + bold",
-                    "H2": ">12pt",
-                    "H3": ">10pt"
-                }
+                outline.append(item)
+    
+    return {
+        "valid": valid,
+        "metadata_title": metadata_title,
+        "outline": outline,
+        "total_pages": total_pages
+    }
+
+def _is_well_formed_toc(toc: List[List[Any]], total_pages: int) -> bool:
+    """
+    Check that a bookmark tree is usable as an outline
+    
+    It must be non-empty, start at level 1, never skip a level going
+    deeper, have non-empty titles, and point at pages that exist.
+    """
+    if not toc:
+        return False
+    
+    previous_level = 0
+    for entry in toc:
+        level, text, page = entry[0], entry[1], entry[2]
+        if level < 1 or level > previous_level + 1:
+            return False
+        if not text or not text.strip():
+            return False
+        if page < 1 or page > total_pages:
+            return False
+        previous_level = level
+    
+    return True
+
+HEADING_LEVELS = ("H1", "H2", "H3")
+
+def _classify_headings(tables: Iterable[SpanTable]) -> Iterator[Dict[str, Any]]:
+    """
+    Turn line spans into de-duplicated H1/H2/H3 headings, table by table
+    
+    Tables are consumed lazily (one per page when streaming, one for the
+    whole document otherwise) and each table's headings are yielded in
+    line order as soon as it is classified. Duplicates can only occur
+    within a page (the page is part of the key), so nothing is remembered
+    across tables.
+    """
+    for table in tables:
+        if not len(table):
+            continue
+
+        rows = _heading_rows_numpy(table) if NUMPY_AVAILABLE else _heading_rows(table)
+        for row, level in rows:
+            yield {
+                "level": HEADING_LEVELS[level],
+                "text": table.text(row),
+                "page": table.page[row] + 1,
+                "font_size": round(table.size[row], 2),
+                "is_bold": bool(table.flags[row] & 16)
             }
-        }
+
+def _heading_rows_numpy(table: SpanTable) -> Iterable[Tuple[int, int]]:
+    """
+    (row, level index) of each first occurrence of a heading, vectorized
+    
+    The columns are viewed in place; the level rules are applied weakest
+    first so stronger ones overwrite them, and duplicates of (page, level,
+    text) are dropped by keeping each key's first row.
+    """
+    size = np.frombuffer(table.size, dtype=np.float64)
+    bold = (np.frombuffer(table.flags, dtype=np.intc) & 16) != 0  # Bold flag
+    text_id = np.frombuffer(table.text_id, dtype=np.intc)
+    
+    level = np.full(len(size), -1, dtype=np.int64)
+    level[size > 10] = 2
+    level[size > 12] = 1
+    level[(size > 14) & bold] = 0
+    # Skip empty text or very short text
+    level[np.frombuffer(table.string_lengths, dtype=np.intc)[text_id] < 3] = -1
+    
+    rows = np.flatnonzero(level >= 0)
+    page = np.frombuffer(table.page, dtype=np.intc)[rows].astype(np.int64)
+    keys = (page * len(HEADING_LEVELS) + level[rows]) * len(table.strings) + text_id[rows]
+    _, first = np.unique(keys, return_index=True)
+    rows = rows[np.sort(first)]
+    return zip(rows.tolist(), level[rows].tolist())
+
+def _heading_rows(table: SpanTable) -> Iterator[Tuple[int, int]]:
+    """
+    Row-by-row equivalent of _heading_rows_numpy for when numpy is missing
+    """
+    seen = set()
+    for row in range(len(table)):
+        text_id = table.text_id[row]
+        font_size = table.size[row]
         
-        logging.info(f"Extracted {len(unique_outline)} headings from {doc.page_count} pages")
-        return result
+        # Skip empty text or very short text
+        if table.string_lengths[text_id] < 3:
+            continue
         
-    except Exception as e:
-        logging.error(f"Error extracting outline from {pdf_path}: {str(e)}")
-        raise Exception(f"PDF outline extraction failed: {str(e)}")
+        # Determine heading level based on font size and style
+        if font_size > 14 and table.flags[row] & 16:
+            level = 0
+        elif font_size > 12:
+            level = 1
+        elif font_size > 10:
+            level = 2
+        else:
+            continue
+        
+        # Remove duplicates while preserving order
+        key = (table.page[row], level, text_id)
+        if key not in seen:
+            seen.add(key)
+            yield row, level
+
+def _build_outline_result(pdf_path: str, metadata_title: str, outline: List[Dict[str, Any]],
+                          total_pages: int, extraction_method: str) -> Dict[str, Any]:
+    """
+    Assemble the Round 1A response structure
+    """
+    # Use the metadata title or fall back to the filename
+    title = metadata_title
+    if not title:
+        title = os.path.basename(pdf_path).replace(".pdf", "")
+    
+    metadata = {"extraction_method": extraction_method}
+    if extraction_method == "font_based_heuristics":
+        metadata["font_thresholds"] = {
+            "H1": ">14pt + bold",
+            "H2": ">12pt",
+            "H3": ">10pt"
+        }
+    else:
+        metadata["bookmark_levels"] = {
+            "H1": "level 1",
+            "H2": "level 2",
+            "H3": "level 3 and deeper"
+        }
+    
+    return {
+        "title": title,
+        "outline": outline,
+        "total_pages": total_pages,
+        "metadata": metadata
+    }
 
-def process_pdfs(input_dir: str, output_dir: str) -> None:
+def process_pdfs(input_dir: str, output_dir: str, workers: Optional[int] = None,
+                 incremental: bool = True) -> Dict[str, Optional[str]]:
     """
     Process multiple PDFs in a directory and save outlines as JSON files
     
+    The corpus manifest (see manifest) tracks which outline file each PDF
+    produced. In incremental mode only PDFs that were added or modified
+    since the last run, or whose outline file is missing, are processed;
+    outline files of deleted PDFs are removed. A PDF that failed is not
+    retried until its content changes (or incremental=False).
+    
     Args:
         input_dir: Directory containing PDF files
         output_dir: Directory to save JSON outline files
+        workers: Worker processes for extraction (None uses PDF_WORKERS, 0 uses all cores)
+        incremental: Skip PDFs whose outline is already current
+        
+    Returns:
+        Mapping of filename to error message (None for files that succeeded)
+        for the PDFs processed in this call
     """
     os.makedirs(output_dir, exist_ok=True)
     
-    pdf_files = [f for f in os.listdir(input_dir) if f.lower().endswith('.pdf')]
+    manifest = get_manifest(input_dir)
+    # Also removes the outlines of deleted PDFs
+    manifest.scan()
+    
+    pdf_files = manifest.filenames()
     
     if not pdf_files:
         logging.warning(f"No PDF files found in {input_dir}")
-        return
+        manifest.save()
+        return {}
+    
+    if incremental:
+        pdf_files = [f for f in pdf_files if not _outline_is_current(manifest, f, output_dir)]
+        if not pdf_files:
+            logging.debug(f"All outlines in {output_dir} are up to date")
+            manifest.save()
+            return {}
+    
+    pdf_paths = [os.path.join(input_dir, filename) for filename in pdf_files]
+    output_paths = [os.path.join(output_dir, filename.replace(".pdf", "_outline.json")) for filename in pdf_files]
+    extra_args = [(output_path, OUTLINE_USE_BOOKMARKS, manifest.digest(filename))
+                  for filename, output_path in zip(pdf_files, output_paths)]
+    report = {}
+    
+    # Outlines are written by the workers, so large ones are never passed back whole
+    results = map_files(write_outline, pdf_paths, workers, extra_args=extra_args)
+    for filename, output_path, (_, headings, error) in zip(pdf_files, output_paths, results):
+        if error:
+            logging.error(f"Failed to process {filename}: {error}")
+            manifest.set_artifact(filename, "outline_error", error)
+            report[filename] = error
+            continue
+        
+        logging.info(f"Processed {filename} -> {os.path.basename(output_path)} ({headings} headings)")
+        manifest.set_artifact(filename, "outline", output_path)
+        manifest.set_artifact(filename, "outline_error", None)
+        report[filename] = None
+    
+    manifest.save()
+    return report
+
+def watch_directory(input_dir: str, output_dir: str, interval: float = 2.0,
+                    workers: Optional[int] = None,
+                    stop_event: Optional[threading.Event] = None) -> None:
+    """
+    Keep outlines and parsed page data current as PDFs arrive or change
+    
+    Polls the corpus manifest every interval seconds (a stat per file, so
+    idle polling is cheap). New or modified PDFs get their outline written
+    and their pages parsed into the extraction cache, so the next analysis
+    finds them ready; outlines of deleted PDFs are removed.
     
-    for filename in pdf_files:
+    Args:
+        stop_event: Set to end the loop (runs until interrupted otherwise)
+    """
+    stop_event = stop_event or threading.Event()
+    logging.info(f"Watching {input_dir} for PDFs (every {interval}s)")
+    while not stop_event.is_set():
         try:
-            pdf_path = os.path.join(input_dir, filename)
-            result = extract_outline(pdf_path)
-            
-            # Save outline as JSON
-            output_filename = filename.replace(".pdf", "_outline.json")
-            output_path = os.path.join(output_dir, output_filename)
-            
-            with open(output_path, "w", encoding='utf-8') as f:
-                json.dump(result, f, indent=2, ensure_ascii=False)
-            
-            logging.info(f"Processed {filename} -> {output_filename}")
-            
+            report = process_pdfs(input_dir, output_dir, workers)
+            ready = [filename for filename, error in report.items() if error is None]
+            if ready:
+                manifest = get_manifest(input_dir)
+                paths = [os.path.join(input_dir, filename) for filename in ready]
+                extra_args = [(manifest.digest(filename),) for filename in ready]
+                for path, _, error in iter_files(_parse_pages, paths, workers, extra_args):
+                    if error:
+                        logging.error(f"Failed to parse pages of {os.path.basename(path)}: {error}")
         except Exception as e:
-            logging.error(f"Failed to process {filename}: {str(e)}")
-            continue
+            logging.error(f"Watch pass over {input_dir} failed: {str(e)}")
+        stop_event.wait(interval)
+
+def _outline_is_current(manifest, filename: str, output_dir: str) -> bool:
+    if manifest.artifact(filename, "outline_error"):
+        return True
+    outline_path = manifest.artifact(filename, "outline")
+    expected = os.path.join(output_dir, filename.replace(".pdf", "_outline.json"))
+    return outline_path == expected and os.path.exists(outline_path)
+
+def _parse_pages(pdf_path: str, digest: Optional[str] = None) -> int:
+    """
+    Make sure a PDF's pages are in the extraction cache; returns the pages cached
+    
+    Large documents are left out: they are streamed page by page when used.
+    """
+    if is_large_document(pdf_path):
+        return 0
+    return load_document(pdf_path, digest).page_count
 
 if __name__ == "__main__":
     # Test the extraction function
@@ -144,6 +451,9 @@ if __name__ == "__main__":
     test_output = "output"
     
     if os.path.exists(test_input):
-        process_pdfs(test_input, test_output)
+        if "--watch" in sys.argv:
+            watch_directory(test_input, test_output)
+        else:
+            process_pdfs(test_input, test_output)
     else:
         print(f"Input directory {test_input} does not exist")
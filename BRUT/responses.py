@@ -0,0 +1,93 @@
+import os
+import gzip
+import json
+import hashlib
+import logging
+from typing import Any, Optional
+from flask import Response, request
+
+# Import fast JSON / brotli encoders with fallback
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+# Bodies smaller than this are sent uncompressed
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.environ.get("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.environ.get("BROTLI_QUALITY", "5"))
+
+def dumps(payload: Any) -> bytes:
+    """
+    Serialize a payload to compact UTF-8 JSON, with orjson when installed
+    """
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def json_response(payload: Any, etag: Optional[str] = None, status: int = 200) -> Response:
+    """
+    Build a JSON response that is serialized once, compressed and cacheable
+
+    The body is encoded a single time, then gzip- or brotli-compressed when
+    the client accepts it and it is at least COMPRESS_MIN_BYTES. Responses
+    to GET and HEAD carry a weak ETag (the given one, or a hash of the
+    body) and answer a matching If-None-Match with 304. Other methods get
+    neither: a 304 is only defined for GET and HEAD (RFC 9110 13.1.2), and
+    clients never revalidate the response to a POST.
+
+    Args:
+        payload: JSON-serializable result
+        etag: Validator derived from the inputs; defaults to a hash of the body
+        status: HTTP status code
+    """
+    body = dumps(payload)
+    cacheable = request.method in ("GET", "HEAD")
+    if cacheable and etag is None:
+        etag = hashlib.sha256(body).hexdigest()[:32]
+
+    if cacheable and status == 200 and is_not_modified(etag):
+        return not_modified(etag)
+
+    response = Response(body, status=status, mimetype="application/json")
+    if cacheable:
+        response.set_etag(etag, weak=True)
+    response.vary.add("Accept-Encoding")
+
+    encoding = _negotiate_encoding(len(body))
+    if encoding == "br":
+        response.set_data(brotli.compress(body, quality=BROTLI_QUALITY))
+    elif encoding == "gzip":
+        response.set_data(gzip.compress(body, compresslevel=GZIP_LEVEL))
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+        logging.debug(f"Compressed response {len(body)} -> {response.content_length} bytes ({encoding})")
+    return response
+
+def is_not_modified(etag: str) -> bool:
+    """
+    Whether the request is a GET or HEAD whose If-None-Match already names this ETag
+    """
+    return request.method in ("GET", "HEAD") and request.if_none_match.contains_weak(etag)
+
+def not_modified(etag: str) -> Response:
+    """
+    Empty 304 response confirming the client's copy is current
+    """
+    response = Response(status=304)
+    response.set_etag(etag, weak=True)
+    response.vary.add("Accept-Encoding")
+    return response
+
+def _negotiate_encoding(size: int) -> Optional[str]:
+    if size < COMPRESS_MIN_BYTES:
+        return None
+    offered = ["br", "gzip"] if BROTLI_AVAILABLE else ["gzip"]
+    return request.accept_encodings.best_match(offered)
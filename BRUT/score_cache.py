@@ -0,0 +1,125 @@
+import os
+import re
+import hashlib
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+SCORE_CACHE_MAX_ENTRIES = int(os.environ.get("SCORE_CACHE_MAX_ENTRIES", "100000"))
+# SQLite file for persistence across restarts; unset keeps scores in memory only
+SCORE_CACHE_PATH = os.environ.get("SCORE_CACHE_PATH", "")
+
+def score_key(text: str, job: str, model_id: str) -> str:
+    """
+    Build the cache key for a (page content, job, model) triple
+
+    The job is lowercased and its whitespace collapsed, so trivial edits to
+    the job string still hit the cache.
+    """
+    normalized_job = re.sub(r"\s+", " ", job.strip().lower())
+    digest = hashlib.sha256()
+    for part in (model_id, normalized_job, text):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+class ScoreCache:
+    """
+    Memoized relevance scores with a bounded in-memory LRU
+
+    When a path is configured, every stored score is also written to a
+    SQLite table and memory misses fall through to it, so scores survive
+    restarts and are shared by processes on the same host.
+    """
+
+    def __init__(self, max_entries: int = SCORE_CACHE_MAX_ENTRIES, path: str = SCORE_CACHE_PATH):
+        self.max_entries = max_entries
+        self.path = path or None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self.hits = 0
+        self.misses = 0
+
+        if self.path:
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                self._db = sqlite3.connect(self.path, check_same_thread=False)
+                self._db.execute("CREATE TABLE IF NOT EXISTS scores (key TEXT PRIMARY KEY, score REAL NOT NULL)")
+                self._db.commit()
+            except Exception as e:
+                logging.warning(f"Score cache persistence disabled: {str(e)}")
+                self._db = None
+
+    def get(self, key: str) -> Optional[float]:
+        """
+        Return the cached score for key, or None on a miss
+        """
+        with self._lock:
+            score = self._entries.get(key)
+            if score is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return score
+
+            if self._db is not None:
+                row = self._db.execute("SELECT score FROM scores WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self._remember(key, row[0])
+                    self.hits += 1
+                    return row[0]
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, score: float) -> None:
+        """
+        Store a score in memory and, if configured, on disk
+        """
+        self.put_many({key: score})
+
+    def put_many(self, scores: Dict[str, float]) -> None:
+        """
+        Store several scores with a single disk commit
+        """
+        if not scores:
+            return
+
+        with self._lock:
+            for key, score in scores.items():
+                self._remember(key, score)
+            if self._db is not None:
+                try:
+                    self._db.executemany("INSERT OR REPLACE INTO scores (key, score) VALUES (?, ?)", scores.items())
+                    self._db.commit()
+                except Exception as e:
+                    logging.warning(f"Failed to persist scores: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "persistent": self._db is not None,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+    def _remember(self, key: str, score: float) -> None:
+        self._entries[key] = score
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+_cache = None
+
+def get_score_cache() -> ScoreCache:
+    """
+    Return the process-wide score cache
+    """
+    global _cache
+    if _cache is None:
+        _cache = ScoreCache()
+    return _cache
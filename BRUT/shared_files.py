@@ -0,0 +1,52 @@
+import os
+import threading
+from contextlib import contextmanager
+from typing import IO, Any, Callable, Dict, Hashable, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+@contextmanager
+def atomic_write(path: str, mode: str = "w") -> Iterator[IO]:
+    """
+    Open a file that replaces path only once it has been written completely
+
+    Data goes to a temp file next to path, named per process and thread so
+    concurrent writers never share one. It is moved over path with
+    os.replace when the block succeeds and removed when it fails, so
+    readers never see a partial file.
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, mode, encoding=None if "b" in mode else "utf-8") as f:
+            yield f
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+class SharedInstances:
+    """
+    Process-wide objects loaded from files, one per key
+
+    Objects must have loaded_mtime (mtime of the file as last loaded or
+    saved, None if there was none) and _dirty (unsaved changes). An object
+    is replaced by a fresh load once another process has rewritten its
+    file, unless it has unsaved changes of its own.
+    """
+
+    def __init__(self):
+        self._instances: Dict[Hashable, Any] = {}
+        self._lock = threading.Lock()
+
+    def get(self, path: str, load: Callable[[], T], key: Optional[Hashable] = None) -> T:
+        """
+        Return the shared object for key (default: path), calling load if needed
+        """
+        key = path if key is None else key
+        with self._lock:
+            instance = self._instances.get(key)
+            mtime = os.path.getmtime(path) if os.path.exists(path) else None
+            if instance is None or (mtime != instance.loaded_mtime and not instance._dirty):
+                instance = load()
+                self._instances[key] = instance
+            return instance
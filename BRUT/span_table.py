@@ -0,0 +1,115 @@
+from array import array
+from typing import Any, Dict, Iterable, List
+
+# Typecodes of the per-row columns; bbox holds four floats per row
+COLUMNS = (("page", "i"), ("size", "d"), ("flags", "i"), ("bbox", "f"),
+           ("text_id", "i"), ("font_id", "i"))
+
+class SpanTable:
+    """
+    Columnar store of the first span of every text line
+
+    One row per line, held in typed arrays (0-based page index, font size,
+    flags, bbox, text and font ids) instead of one dict per span. Texts
+    (stripped) and font names are interned into string pools, and the
+    length of each pooled text is kept alongside. The arrays support the
+    buffer protocol, so numpy can view them without a copy, and the table
+    caches as a handful of flat lists that other font statistics can reuse.
+    """
+
+    def __init__(self):
+        self.page = array("i")
+        self.size = array("d")
+        self.flags = array("i")
+        self.bbox = array("f")
+        self.text_id = array("i")
+        self.font_id = array("i")
+        self.strings: List[str] = []
+        self.string_lengths = array("i")
+        self.fonts: List[str] = []
+        self._string_ids: Dict[str, int] = {}
+        self._font_ids: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.page)
+
+    def append(self, page_index: int, text: str, size: float, flags: int,
+               font: str = "", bbox: Iterable[float] = ()) -> None:
+        bbox = tuple(bbox)
+        self.page.append(page_index)
+        self.size.append(size)
+        self.flags.append(flags)
+        self.bbox.extend(bbox if len(bbox) == 4 else (0.0, 0.0, 0.0, 0.0))
+        self.text_id.append(self._intern_text(text.strip()))
+        self.font_id.append(self._intern_font(font))
+
+    def add_blocks(self, page_index: int, blocks: List[Dict[str, Any]]) -> None:
+        """
+        Add the first span of every text line in a page's "dict" blocks
+
+        Only the first span of a line decides its heading level, so that is
+        all we keep.
+        """
+        for block in blocks:
+            if "lines" not in block:
+                continue
+
+            for line in block["lines"]:
+                if not line["spans"]:
+                    continue
+
+                span = line["spans"][0]
+                self.append(page_index, span["text"], span["size"], span["flags"],
+                            span.get("font", ""), span.get("bbox", ()))
+
+    def text(self, row: int) -> str:
+        return self.strings[self.text_id[row]]
+
+    @classmethod
+    def concat(cls, tables: Iterable["SpanTable"]) -> "SpanTable":
+        """
+        Join tables (e.g. one per page) into one, merging their string pools
+        """
+        result = cls()
+        for table in tables:
+            text_ids = [result._intern_text(text) for text in table.strings]
+            font_ids = [result._intern_font(font) for font in table.fonts]
+            result.page.extend(table.page)
+            result.size.extend(table.size)
+            result.flags.extend(table.flags)
+            result.bbox.extend(table.bbox)
+            result.text_id.extend(text_ids[i] for i in table.text_id)
+            result.font_id.extend(font_ids[i] for i in table.font_id)
+        return result
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {name: getattr(self, name).tolist() for name, _ in COLUMNS}
+        data["strings"] = self.strings
+        data["fonts"] = self.fonts
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SpanTable":
+        table = cls()
+        for name, typecode in COLUMNS:
+            setattr(table, name, array(typecode, data[name]))
+        for text in data["strings"]:
+            table._intern_text(text)
+        for font in data["fonts"]:
+            table._intern_font(font)
+        return table
+
+    def _intern_text(self, text: str) -> int:
+        text_id = self._string_ids.get(text)
+        if text_id is None:
+            text_id = self._string_ids[text] = len(self.strings)
+            self.strings.append(text)
+            self.string_lengths.append(len(text))
+        return text_id
+
+    def _intern_font(self, font: str) -> int:
+        font_id = self._font_ids.get(font)
+        if font_id is None:
+            font_id = self._font_ids[font] = len(self.fonts)
+            self.fonts.append(font)
+        return font_id
@@ -144,7 +144,7 @@ class PDFProcessor {
         this.hideAnalysisResults();
 
         try {
-            const response = await fetch(`${this.baseURL}/analyze`, {
+            const response = await fetch(`${this.baseURL}/analyze/jobs`, {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json'
@@ -152,12 +152,14 @@ class PDFProcessor {
                 body: JSON.stringify({ persona, job })
             });
 
-            const result = await response.json();
+            const submitted = await response.json();
 
             if (!response.ok) {
-                throw new Error(result.error || 'Analysis failed');
+                throw new Error(submitted.error || 'Analysis failed');
             }
 
+            const result = await this.pollAnalysisJob(submitted.job_id);
+
             this.displayAnalysisResults(result);
             this.showStatus('Document analysis completed!', 'success');
 
@@ -169,6 +171,34 @@ class PDFProcessor {
         }
     }
 
+    async pollAnalysisJob(jobId) {
+        // Poll the job until it finishes instead of holding one long request open
+        while (true) {
+            const response = await fetch(`${this.baseURL}/analyze/jobs/${jobId}`);
+            const job = await response.json();
+
+            if (!response.ok) {
+                throw new Error(job.error || 'Analysis failed');
+            }
+
+            if (job.status === 'failed') {
+                throw new Error(job.error || 'Analysis failed');
+            }
+
+            if (job.status === 'completed') {
+                const resultResponse = await fetch(`${this.baseURL}/analyze/jobs/${jobId}/result`);
+                const result = await resultResponse.json();
+                if (!resultResponse.ok) {
+                    throw new Error(result.error || 'Analysis failed');
+                }
+                return result;
+            }
+
+            this.showProgress(job.progress);
+            await new Promise(resolve => setTimeout(resolve, 1000));
+        }
+    }
+
     async handleMultiUpload() {
         const fileInput = document.getElementById('multiPdfFiles');
         const files = Array.from(fileInput.files);
@@ -288,7 +318,9 @@ class PDFProcessor {
                 <div class="mt-3 p-3 bg-body-secondary rounded">
                     <small class="text-muted">
                         <strong>Extraction Method:</strong> ${data.metadata.extraction_method || 'Font-based heuristics'}<br>
-                        <strong>Font Thresholds:</strong> H1 (>14pt + bold), H2 (>12pt), H3 (>10pt)
+                        ${data.metadata.font_thresholds
+                            ? '<strong>Font Thresholds:</strong> H1 (>14pt + bold), H2 (>12pt), H3 (>10pt)'
+                            : '<strong>Source:</strong> Embedded PDF bookmarks'}
                     </small>
                 </div>
             `;
@@ -438,9 +470,23 @@ class PDFProcessor {
         statusDiv.classList.remove('d-none');
     }
 
+    showProgress(progress) {
+        const message = document.querySelector('#loadingSpinner p');
+        if (!progress || progress.documents_total === undefined) {
+            message.textContent = 'Processing your request...';
+            return;
+        }
+        let text = `Documents: ${progress.documents_done}/${progress.documents_total}`;
+        if (progress.pages_total) {
+            text += ` · Pages scored: ${progress.pages_done}/${progress.pages_total}`;
+        }
+        message.textContent = text;
+    }
+
     showLoading(show) {
         const spinner = document.getElementById('loadingSpinner');
         if (show) {
+            this.showProgress(null);
             spinner.classList.remove('d-none');
         } else {
             spinner.classList.add('d-none');
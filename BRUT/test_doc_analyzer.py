@@ -0,0 +1,440 @@
+"""
+Offline unit tests for doc_analyzer scoring helpers (no model, no server)
+"""
+
+import os
+import math
+import time
+
+import pytest
+
+pytest.importorskip("fitz")
+
+import doc_analyzer
+from bm25_index import BM25Index
+
+
+CONTENT = ("Day one of the trip itinerary covers the old town walking tour, lunch at the market "
+           "and an evening boat ride. Plan the trip around the museum opening hours.")
+
+
+def test_index_scores_normalize_over_candidate_pages(tmp_path):
+    index = BM25Index(str(tmp_path / "bm25.json"))
+    # The short title page outscores the content page but is never a candidate
+    index.update_document("guide.pdf", "d1", ["Trip itinerary: plan trip itinerary", CONTENT,
+                                              "Appendix with unrelated contact details and opening times."])
+    pages = [("guide.pdf", 1, CONTENT)]
+
+    batches = list(doc_analyzer._iter_index_scores(index, ["guide.pdf"], pages, "plan a trip itinerary", 8))
+
+    assert batches == [([0], [1.0])]
+    assert doc_analyzer._lexical_scores(index, ["guide.pdf"], pages, "plan a trip itinerary") == [1.0]
+
+
+def test_index_keeps_corpus_documents_not_read_this_run(tmp_path):
+    index = BM25Index(str(tmp_path / "bm25.json"))
+    index.update_document("failed.pdf", "d1", [CONTENT])
+    index.update_document("removed.pdf", "d2", [CONTENT])
+    index.update_document("guide.pdf", "d3", [CONTENT])
+
+    list(doc_analyzer._iter_index_scores(index, ["guide.pdf", "failed.pdf"],
+                                         [("guide.pdf", 0, CONTENT)], "trip itinerary", 8))
+
+    assert sorted(index.documents) == ["failed.pdf", "guide.pdf"]
+    assert os.path.exists(str(tmp_path / "bm25.json"))
+
+
+def test_dense_search_only_ranks_candidate_pages(tmp_path):
+    pytest.importorskip("numpy")
+    from vector_index import VectorIndex, HashingEmbedder
+
+    index = VectorIndex(str(tmp_path / "vectors.npz"), HashingEmbedder(256))
+    index.update_document("unread.pdf", "d1", [CONTENT])
+    index.update_document("guide.pdf", "d2", [CONTENT + " Bring a rain jacket."])
+
+    found = index.search("trip itinerary", 1, {("guide.pdf", 1)})
+
+    assert list(found) == [("guide.pdf", 1)]
+    assert index.search("trip itinerary", 1, set()) == {}
+
+
+PAGE_TEXT = ("Section {n}: planning notes for the group trip with enough words on the page to be scored "
+             "by the analysis, including budget, transport and accommodation details.")
+
+
+def _write_corpus(input_dir, documents=1, pages=6):
+    import fitz
+    os.makedirs(input_dir, exist_ok=True)
+    for d in range(documents):
+        doc = fitz.open()
+        for n in range(pages):
+            page = doc.new_page()
+            page.insert_textbox(fitz.Rect(72, 72, 540, 720), PAGE_TEXT.format(n=n + 1), fontsize=10)
+        doc.save(os.path.join(input_dir, f"doc{d + 1}.pdf"))
+        doc.close()
+
+
+class StubClassifier:
+    """
+    Zero-shot pipeline stand-in: every page is relevant, each call takes delay seconds
+    """
+    tokenizer = None
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = []
+
+    def __call__(self, texts, candidate_labels, batch_size=8, **kwargs):
+        self.calls.append((time.monotonic(), len(texts)))
+        time.sleep(self.delay)
+        return [{"labels": list(candidate_labels), "scores": [0.9, 0.1]} for _ in texts]
+
+
+@pytest.fixture
+def isolated_caches(tmp_path, monkeypatch):
+    import extraction_cache
+    import score_cache
+    monkeypatch.setattr(extraction_cache, "_cache", extraction_cache.ExtractionCache(str(tmp_path / "cache")))
+    monkeypatch.setattr(score_cache, "_cache", score_cache.ScoreCache(path=""))
+
+
+def _summary(events):
+    return [event for event in events if event["event"] == "summary"][-1]
+
+
+def test_deadline_stops_before_the_next_batch(tmp_path, monkeypatch, isolated_caches):
+    input_dir = str(tmp_path / "input")
+    _write_corpus(input_dir)
+    classifier = StubClassifier(delay=0.3)
+    monkeypatch.setattr(doc_analyzer, "get_classifier", lambda: classifier)
+
+    started = time.monotonic()
+    summary = _summary(doc_analyzer.iter_analysis(input_dir, "Planner", "plan a trip", batch_size=1,
+                                                  workers=1, deadline=0.5))
+
+    metadata = summary["metadata"]
+    assert metadata["partial"] is True
+    assert 1 <= len(classifier.calls) < 6
+    assert metadata["coverage"]["pages_scored"] == len(classifier.calls)
+    assert metadata["coverage"]["pages_total"] == 6
+    assert metadata["coverage"]["documents_read"] == metadata["coverage"]["documents_total"] == 1
+    # Every batch was requested before the deadline passed
+    assert all(call_started - started < 0.5 + 0.05 for call_started, _ in classifier.calls)
+
+
+def test_deadline_during_extraction_scores_nothing(tmp_path, monkeypatch, isolated_caches):
+    input_dir = str(tmp_path / "input")
+    _write_corpus(input_dir, documents=2)
+    classifier = StubClassifier()
+    monkeypatch.setattr(doc_analyzer, "get_classifier", lambda: classifier)
+    monkeypatch.setattr(doc_analyzer, "_lexical_scores",
+                        lambda *args: pytest.fail("cascade prefilter ran past the deadline"))
+
+    summary = _summary(doc_analyzer.iter_analysis(input_dir, "Planner", "plan a trip", workers=1,
+                                                  cascade=True, deadline=1e-6))
+
+    metadata = summary["metadata"]
+    assert classifier.calls == []
+    assert metadata["partial"] is True
+    assert metadata["coverage"]["pages_scored"] == 0
+    assert metadata["coverage"]["documents_read"] == 1
+    assert "cascade" not in metadata
+    assert summary["ranking"] == []
+
+
+def test_top_n_keeps_best_items_in_rank_order():
+    import random
+    rnd = random.Random(7)
+    sections = [{"document": rnd.choice(["a.pdf", "b.pdf", "c.pdf"]), "page_number": rnd.randint(1, 30),
+                 "importance_rank": rnd.choice([0.71, 0.8, 0.9, 0.95])} for _ in range(200)]
+
+    for n in (0, 1, 5, 50, 500):
+        top = doc_analyzer._TopN(n, doc_analyzer._rank_key)
+        for section in sections:
+            top.push(section)
+
+        expected = sorted(sections, key=doc_analyzer._rank_key)
+        assert top.count == len(sections)
+        assert top.items() == (expected[:n] if n > 0 else expected)
+
+
+def test_streamed_document_cut_short_is_not_listed(tmp_path, monkeypatch, isolated_caches):
+    input_dir = str(tmp_path / "input")
+    _write_corpus(input_dir, documents=2)
+    classifier = StubClassifier(delay=0.2)
+    monkeypatch.setattr(doc_analyzer, "get_classifier", lambda: classifier)
+    monkeypatch.setattr(doc_analyzer, "STREAM_WINDOW_PAGES", 2)
+
+    summary = _summary(doc_analyzer.iter_analysis(input_dir, "Planner", "plan a trip", batch_size=2,
+                                                  streaming=True, deadline=0.3))
+
+    metadata = summary["metadata"]
+    assert metadata["partial"] is True
+    assert metadata["documents"] == []
+    assert metadata["coverage"]["documents_read"] == 0
+    assert 0 < metadata["coverage"]["pages_scored"] < 12
+    assert len(summary["ranking"]) == metadata["coverage"]["pages_scored"]
+
+
+TOPIC_PAGES = [
+    "Hotel booking checklist: compare rooms, read reviews and confirm the hotel reservation early.",
+    "Budget overview for the group: daily budget per person, shared costs and a reserve for surprises.",
+    "Museum tickets sell out quickly, so reserve museum entry online and check the free days.",
+    "Packing list with clothes, chargers, documents and medicine for a week away from home.",
+    "Budget hotel options near the station keep the budget low while the hotel stays central.",
+]
+
+
+class LogitStub:
+    """
+    Classifier stand-in exposing entailment logits
+
+    The entailment logit of a label is twice the number of its words found
+    in the page; "irrelevant" always scores 1. The pipeline-style __call__
+    derives its scores from the same logits, as the real pipeline does.
+    """
+    tokenizer = None
+    hypothesis_template = "This example is {}."
+
+    def __init__(self):
+        self.pipeline_calls = 0
+        self.logit_calls = []
+
+    def _logit(self, premise, hypothesis):
+        label = hypothesis[len("This example is "):-1]
+        if label == "irrelevant":
+            return 1.0
+        words = set(premise.lower().replace(",", " ").replace(".", " ").replace(":", " ").split())
+        return 2.0 * sum(word in words for word in label.lower().split())
+
+    def entailment_logits(self, premises, hypotheses, batch_size):
+        self.logit_calls.append([h[len("This example is "):-1] for h in hypotheses])
+        return _Rows([[self._logit(p, h) for h in hypotheses] for p in premises])
+
+    def __call__(self, texts, candidate_labels, batch_size=8, **kwargs):
+        single = isinstance(texts, str)
+        outputs = []
+        for text in [texts] if single else texts:
+            self.pipeline_calls += 1
+            logits = [self._logit(text, self.hypothesis_template.format(label)) for label in candidate_labels]
+            exps = [math.exp(logit - max(logits)) for logit in logits]
+            scores = [e / sum(exps) for e in exps]
+            ranked = sorted(zip(candidate_labels, scores), key=lambda pair: -pair[1])
+            outputs.append({"labels": [label for label, _ in ranked], "scores": [score for _, score in ranked]})
+        return outputs[0] if single else outputs
+
+
+class _Rows(list):
+    def tolist(self):
+        return list(self)
+
+
+def _write_topic_corpus(input_dir):
+    import fitz
+    os.makedirs(input_dir, exist_ok=True)
+    doc = fitz.open()
+    for text in TOPIC_PAGES:
+        doc.new_page().insert_textbox(fitz.Rect(72, 72, 540, 720), text, fontsize=10)
+    doc.save(os.path.join(input_dir, "trip.pdf"))
+    doc.close()
+
+
+def _ranked(result):
+    return [(s["document"], s["page_number"], s["importance_rank"]) for s in result["sections"]]
+
+
+def test_shared_pass_matches_per_job_analysis(tmp_path, monkeypatch):
+    import extraction_cache
+    import score_cache
+    input_dir = str(tmp_path / "input")
+    _write_topic_corpus(input_dir)
+    monkeypatch.setattr(extraction_cache, "_cache", extraction_cache.ExtractionCache(str(tmp_path / "cache")))
+    monkeypatch.setattr(doc_analyzer, "get_classifier", lambda: classifier)
+    monkeypatch.setattr(doc_analyzer.registry, "model_name", "stub")
+    jobs = ["book a hotel", "plan the budget", "reserve museum tickets"]
+    queries = [{"persona": "Planner", "job": job} for job in jobs]
+
+    def fresh_cache():
+        monkeypatch.setattr(score_cache, "_cache", score_cache.ScoreCache(path=""))
+
+    # Reference: each job on its own through the pipeline
+    fresh_cache()
+    classifier = LogitStub()
+    with monkeypatch.context() as patch:
+        patch.setattr(doc_analyzer, "supports_entailment_logits", lambda classifier: False)
+        expected = {job: _ranked(doc_analyzer.analyze_documents(input_dir, "Planner", job, None, workers=1))
+                    for job in jobs}
+    assert classifier.logit_calls == []
+    assert all(expected.values())
+    assert expected["book a hotel"] != expected["plan the budget"]
+
+    # A single job is scored from the same logits, one pass per batch
+    fresh_cache()
+    classifier = LogitStub()
+    assert _ranked(doc_analyzer.analyze_documents(input_dir, "Planner", jobs[0], None, workers=1)) == expected[jobs[0]]
+    assert classifier.pipeline_calls == 0
+    assert classifier.logit_calls == [[jobs[0], "irrelevant"]]
+
+    # Nothing cached: one shared pass per batch for all jobs
+    fresh_cache()
+    classifier = LogitStub()
+    output = doc_analyzer.analyze_queries(input_dir, queries, batch_size=8, workers=1)
+    assert output["metadata"]["scoring"] == "shared forward pass"
+    assert {job: _ranked(result) for job, result in zip(jobs, output["results"])} == expected
+    assert classifier.pipeline_calls == 0
+    assert classifier.logit_calls == [jobs + ["irrelevant"]]
+
+    # Scores are memoized under analyze_documents' keys
+    for job in jobs:
+        assert _ranked(doc_analyzer.analyze_documents(input_dir, "Planner", job, None, workers=1)) == expected[job]
+    assert classifier.pipeline_calls == 0
+
+    # Mixed: one job already cached, the others scored in the shared pass
+    fresh_cache()
+    classifier = LogitStub()
+    doc_analyzer.analyze_documents(input_dir, "Planner", jobs[0], None, workers=1)
+    classifier.logit_calls.clear()
+    output = doc_analyzer.analyze_queries(input_dir, queries, batch_size=8, workers=1)
+    assert {job: _ranked(result) for job, result in zip(jobs, output["results"])} == expected
+    assert classifier.logit_calls == [jobs[1:] + ["irrelevant"]]
+
+
+def test_cascade_keeps_top_k_and_pages_above_the_cutoff():
+    scores = [0.2, 0.9, 0.4, 0.7, 0.4]
+
+    assert doc_analyzer._cascade_select(scores, top_k=1, min_score=0.6) == [1, 3]
+    assert doc_analyzer._cascade_select(scores, top_k=3, min_score=1.0) == [1, 2, 3]
+    # Ties at the top_k boundary go to the earlier page
+    assert doc_analyzer._cascade_select(scores, top_k=2, min_score=1.0) == [1, 3]
+    assert doc_analyzer._cascade_select(scores, top_k=3, min_score=0.95) == [1, 2, 3]
+    assert doc_analyzer._cascade_select(scores, top_k=0, min_score=0.5) == [1, 3]
+    assert doc_analyzer._cascade_select([], top_k=5, min_score=0.5) == []
+
+
+class RecordingStub(LogitStub):
+    def __init__(self):
+        super().__init__()
+        self.premises = []
+
+    def entailment_logits(self, premises, hypotheses, batch_size):
+        self.premises.extend(premises)
+        return super().entailment_logits(premises, hypotheses, batch_size)
+
+
+def test_cascade_sends_only_kept_pages_to_the_classifier(tmp_path, monkeypatch, isolated_caches):
+    input_dir = str(tmp_path / "input")
+    _write_topic_corpus(input_dir)
+    classifier = RecordingStub()
+    monkeypatch.setattr(doc_analyzer, "get_classifier", lambda: classifier)
+
+    # Keyword scores: pages 1 (0.58) and 5 (0.53) lead, then page 2 (0.27)
+    result = doc_analyzer.analyze_documents(input_dir, "Planner", "book a budget hotel", None, workers=1,
+                                            lexical_scorer="keyword", cascade=True,
+                                            cascade_top_k=1, cascade_min_score=0.5)
+
+    assert sorted(premise.split()[0] for premise in classifier.premises) == ["Budget", "Hotel"]
+    assert result["metadata"]["cascade"] == {"lexical_scorer": "keyword", "top_k": 1, "min_score": 0.5,
+                                             "pages_scored": 2, "pages_pruned": 3}
+    assert {s["page_number"] for s in result["sections"]} == {1, 5}
+
+
+def test_warm_bm25_analysis_reads_no_page_text(tmp_path, monkeypatch, isolated_caches):
+    input_dir = str(tmp_path / "input")
+    _write_topic_corpus(input_dir)
+    monkeypatch.setattr(doc_analyzer, "get_classifier", lambda: None)
+    loaded = []
+    load_pages = doc_analyzer._load_pages
+    monkeypatch.setattr(doc_analyzer, "_load_pages",
+                        lambda path, *args: loaded.append(os.path.basename(path)) or load_pages(path, *args))
+
+    def analyze():
+        return doc_analyzer.analyze_documents(input_dir, "Planner", "book a budget hotel", None, workers=1,
+                                              lexical_scorer="bm25")
+
+    cold = analyze()
+    assert loaded == ["trip.pdf"]
+    assert [s["page_number"] for s in cold["sections"]] == [5]
+    assert cold["sections"][0]["section_title"].startswith("Budget hotel options")
+    assert cold["subsections"][0]["refined_text"].split() == TOPIC_PAGES[4].split()
+
+    # The index holds this version of the PDF: no page text is loaded again
+    loaded.clear()
+    warm = analyze()
+    assert loaded == []
+    assert (warm["sections"], warm["subsections"]) == (cold["sections"], cold["subsections"])
+    assert warm["metadata"]["documents"] == ["trip.pdf"]
+
+
+def test_warm_dense_analysis_reads_no_page_text(tmp_path, monkeypatch, isolated_caches):
+    pytest.importorskip("numpy")
+    input_dir = str(tmp_path / "input")
+    _write_topic_corpus(input_dir)
+    loaded = []
+    load_pages = doc_analyzer._load_pages
+    monkeypatch.setattr(doc_analyzer, "_load_pages",
+                        lambda path, *args: loaded.append(os.path.basename(path)) or load_pages(path, *args))
+    monkeypatch.setattr(doc_analyzer, "DENSE_TOP_K", 2)
+
+    def analyze():
+        return doc_analyzer.analyze_documents(input_dir, "Planner", "museum tickets", None, workers=1,
+                                              retrieval="dense")
+
+    cold = analyze()
+    assert loaded == ["trip.pdf"]
+    assert cold["sections"][0]["page_number"] == 3
+    assert cold["subsections"][0]["refined_text"].split() == TOPIC_PAGES[2].split()
+
+    loaded.clear()
+    warm = analyze()
+    assert loaded == []
+    assert (warm["sections"], warm["subsections"]) == (cold["sections"], cold["subsections"])
+
+
+def test_dense_page_mask_matches_candidate_pages(tmp_path):
+    np = pytest.importorskip("numpy")
+    from vector_index import VectorIndex, HashingEmbedder
+
+    index = VectorIndex(str(tmp_path / "vectors.npz"), HashingEmbedder(64))
+    long_page = " ".join(["word"] * 450)  # three chunks
+    index.update_document("a.pdf", "d1", [CONTENT, long_page, CONTENT])
+    index.update_document("b.pdf", "d2", [long_page, CONTENT])
+    pages = {("a.pdf", 2), ("b.pdf", 1), ("b.pdf", 2), ("gone.pdf", 1), ("a.pdf", 99)}
+
+    mask = index._page_mask(pages)
+
+    filenames = [entry["filename"] for entry in index.documents]
+    expected = [(filenames[doc_id], int(page)) in pages for doc_id, page in zip(index.doc_ids, index.page_numbers)]
+    assert mask.tolist() == expected
+    assert mask.sum() == 7
+
+
+def test_parse_priority_normalizes_entries():
+    assert doc_analyzer.parse_priority(None) == []
+    assert doc_analyzer.parse_priority(["a.pdf", {"document": "b.pdf", "pages": [2, 4]},
+                                        {"document": "c.pdf", "pages": 7}, {"document": "d.pdf"}]) == [
+        ("a.pdf", 1, None), ("b.pdf", 2, 4), ("c.pdf", 7, 7), ("d.pdf", 1, None)]
+
+
+@pytest.mark.parametrize("entry", [
+    3, {"pages": [1, 2]}, {"document": "a.pdf", "pages": [0, 2]}, {"document": "a.pdf", "pages": [5, 2]},
+    {"document": "a.pdf", "pages": [1, 2, 3]}, {"document": "a.pdf", "pages": True},
+    {"document": "a.pdf", "pages": "1-2"},
+])
+def test_parse_priority_rejects_malformed_entries(entry):
+    with pytest.raises(ValueError):
+        doc_analyzer.parse_priority([entry])
+
+
+def test_prioritize_pages_orders_tiers():
+    priority = doc_analyzer.parse_priority([{"document": "b.pdf", "pages": [2, 3]}, "a.pdf"])
+    pages = [(filename, page_num, "") for filename in ("a.pdf", "b.pdf", "c.pdf") for page_num in range(4)]
+
+    ordered, tiers = doc_analyzer._prioritize_pages(pages, priority)
+
+    assert [(f, p + 1) for f, p, _ in ordered] == [
+        ("b.pdf", 2), ("b.pdf", 3),
+        ("a.pdf", 1), ("a.pdf", 2), ("a.pdf", 3), ("a.pdf", 4),
+        ("b.pdf", 1), ("b.pdf", 4), ("c.pdf", 1), ("c.pdf", 2), ("c.pdf", 3), ("c.pdf", 4)]
+    assert tiers == [[0, 1], [2, 3, 4, 5], list(range(6, 12))]
+    assert doc_analyzer._prioritize_documents(["a.pdf", "b.pdf", "c.pdf"], priority) == ["b.pdf", "a.pdf", "c.pdf"]
+    assert doc_analyzer._prioritize_pages(pages, []) == (pages, [list(range(12))])
@@ -0,0 +1,50 @@
+"""
+Offline tests for the content-addressed extraction cache
+"""
+
+import os
+
+import extraction_cache
+from extraction_cache import ExtractionCache
+
+
+def test_entries_persist_across_restarts_one_file_per_section(tmp_path):
+    cache_dir = str(tmp_path)
+    cache = ExtractionCache(cache_dir)
+    cache.put("a" * 64, "document", {"pages": ["text"]})
+    cache.put("a" * 64, "outline", {"title": "T", "outline": []})
+
+    assert sorted(os.listdir(cache_dir)) == ["a" * 64 + ".document.json", "a" * 64 + ".outline.json"]
+
+    restarted = ExtractionCache(cache_dir)
+    assert restarted.get("a" * 64, "outline") == {"title": "T", "outline": []}
+    assert restarted.get("a" * 64, "document") == {"pages": ["text"]}
+    assert restarted.get("a" * 64, "outline_bookmarks") is None
+    assert (restarted.hits, restarted.misses) == (2, 1)
+
+
+def test_entries_of_another_format_version_are_ignored(tmp_path, monkeypatch):
+    cache = ExtractionCache(str(tmp_path))
+    cache.put("b" * 64, "outline", [1])
+
+    monkeypatch.setattr(extraction_cache, "CACHE_FORMAT_VERSION", extraction_cache.CACHE_FORMAT_VERSION + 1)
+    assert ExtractionCache(str(tmp_path)).get("b" * 64, "outline") is None
+
+
+def test_least_recently_used_files_are_evicted_past_max_bytes(tmp_path):
+    cache_dir = str(tmp_path)
+    value = "x" * 1000
+    cache = ExtractionCache(cache_dir, max_bytes=2500)
+
+    for n, digest in enumerate(("1" * 64, "2" * 64)):
+        cache.put(digest, "outline", value)
+        os.utime(os.path.join(cache_dir, f"{digest}.outline.json"), (n, n))
+    # Reading the oldest entry makes it the most recently used
+    assert cache.get("1" * 64, "outline") == value
+
+    cache.put("3" * 64, "outline", value)
+
+    assert cache.get("2" * 64, "outline") is None
+    assert cache.get("1" * 64, "outline") == value
+    assert cache.get("3" * 64, "outline") == value
+    assert cache.stats()["entries"] == 2 and cache.stats()["bytes"] <= 2500
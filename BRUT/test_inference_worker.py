@@ -0,0 +1,170 @@
+"""
+Offline tests for inference_worker (no model is loaded)
+"""
+
+import os
+import stat
+import time
+import threading
+from multiprocessing.connection import Listener
+
+import pytest
+
+import inference_worker
+
+
+@pytest.fixture
+def private_dir(tmp_path, monkeypatch):
+    path = str(tmp_path / "run")
+    monkeypatch.setattr(inference_worker, "INFERENCE_WORKER_DIR", path)
+    monkeypatch.setattr(inference_worker, "INFERENCE_WORKER_AUTHKEY", "")
+    return path
+
+
+def test_generated_authkey_is_private_and_stable(private_dir):
+    with pytest.raises(Exception, match="No inference worker key"):
+        inference_worker.load_authkey()
+
+    key = inference_worker.load_authkey(create=True)
+
+    assert len(key) == 64
+    assert inference_worker.load_authkey() == key
+    assert inference_worker.load_authkey(create=True) == key
+    assert stat.S_IMODE(os.stat(os.path.join(private_dir, "authkey")).st_mode) == 0o600
+    assert stat.S_IMODE(os.stat(private_dir).st_mode) == 0o700
+    assert inference_worker.default_address() == os.path.join(private_dir, "worker.sock")
+
+
+def test_configured_authkey_wins(private_dir, monkeypatch):
+    monkeypatch.setattr(inference_worker, "INFERENCE_WORKER_AUTHKEY", "secret")
+
+    assert inference_worker.load_authkey(create=True) == b"secret"
+    assert not os.path.exists(os.path.join(private_dir, "authkey"))
+
+
+def test_shared_runtime_dir_is_refused(private_dir):
+    os.makedirs(private_dir, mode=0o755)
+    os.chmod(private_dir, 0o755)
+
+    with pytest.raises(Exception, match="mode 0700"):
+        inference_worker.runtime_dir()
+
+
+class GatedClassifier:
+    """
+    Pipeline stand-in that records each batch; the first call waits for gate
+    """
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.batches = []
+
+    def __call__(self, texts, candidate_labels, batch_size=8):
+        self.batches.append(list(texts))
+        self.gate.wait(5)
+        if "boom" in texts:
+            raise RuntimeError("model failed")
+        return [{"labels": list(candidate_labels), "scores": [len(text) / 10, 0.0]} for text in texts]
+
+
+def _score_in_thread(batcher, text, labels, results):
+    thread = threading.Thread(target=lambda: results.__setitem__(text, batcher.score([text], labels)[0]))
+    thread.start()
+    return thread
+
+
+def _wait_for(condition):
+    deadline = time.monotonic() + 5
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.001)
+
+
+def test_batches_group_by_labels_and_keep_order():
+    classifier = GatedClassifier()
+    batcher = inference_worker.MicroBatcher(classifier, max_batch=2, max_wait=0.05)
+    results = {}
+    job_a, job_b = ["job a", "irrelevant"], ["job b", "irrelevant"]
+
+    threads = [_score_in_thread(batcher, "first", job_a, results)]
+    _wait_for(lambda: classifier.batches)
+    # Queued while the first batch is being scored
+    for text, labels in (("b1", job_b), ("a2", job_a), ("a3", job_a), ("a4", job_a)):
+        queued = batcher._queue.qsize()
+        threads.append(_score_in_thread(batcher, text, labels, results))
+        _wait_for(lambda: batcher._queue.qsize() > queued)
+    classifier.gate.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert classifier.batches == [["first"], ["b1"], ["a2", "a3"], ["a4"]]
+    assert results["a3"] == {"labels": job_a, "scores": [0.2, 0.0]}
+    assert results["b1"]["labels"] == job_b
+    stats = batcher.stats()
+    assert (stats["batches"], stats["pages"], stats["mean_batch_size"]) == (4, 5, 1.25)
+
+
+def test_batch_error_reaches_every_caller():
+    classifier = GatedClassifier()
+    classifier.gate.set()
+    batcher = inference_worker.MicroBatcher(classifier, max_batch=8, max_wait=0.0)
+
+    with pytest.raises(Exception, match="model failed"):
+        batcher.score(["fine", "boom"], ["job", "irrelevant"])
+    assert batcher.score(["fine"], ["job", "irrelevant"])[0]["scores"] == [0.4, 0.0]
+
+
+def test_remote_classifier_round_trip(private_dir):
+    classifier = GatedClassifier()
+    classifier.gate.set()
+    batcher = inference_worker.MicroBatcher(classifier, max_batch=8, max_wait=0.0)
+    authkey = inference_worker.load_authkey(create=True)
+    address = inference_worker.default_address()
+    listener = Listener(address, authkey=authkey)
+
+    def accept():
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception:
+                continue
+            threading.Thread(target=inference_worker._handle, args=(conn, batcher, "stub-model"), daemon=True).start()
+
+    threading.Thread(target=accept, daemon=True).start()
+    remote = inference_worker.RemoteClassifier(address)
+
+    output = remote(["page one", "page"], candidate_labels=["job", "irrelevant"])
+
+    assert remote.model_id == "stub-model"
+    assert [o["scores"][0] for o in output] == [0.8, 0.4]
+    assert output[0]["sequence"] == "page one"
+    with pytest.raises(Exception):
+        inference_worker.RemoteClassifier(address, authkey=b"wrong key")
+
+
+def test_registry_retries_an_unreachable_worker(monkeypatch):
+    import model_registry
+
+    class FakeRemote:
+        reachable = False
+        model_id = "remote-model"
+
+        def __init__(self, address):
+            if not FakeRemote.reachable:
+                raise ConnectionRefusedError("worker not running")
+
+    clock = [100.0]
+    monkeypatch.setattr(inference_worker, "RemoteClassifier", FakeRemote)
+    monkeypatch.setattr(model_registry.time, "monotonic", lambda: clock[0])
+    registry = model_registry.ModelRegistry(worker_address="/tmp/no-worker.sock")
+
+    # Started before the worker: falls back, and does not retry within the backoff
+    assert registry.get_classifier() is None
+    assert registry.status()["error"] == "worker not running"
+    FakeRemote.reachable = True
+    clock[0] += 0.5
+    assert registry.get_classifier() is None
+
+    clock[0] += 1.0
+    assert isinstance(registry.get_classifier(), FakeRemote)
+    assert registry.status()["loaded"] is True
+    assert registry.status()["error"] is None
@@ -0,0 +1,55 @@
+"""
+Offline tests for streaming uploads into the corpus
+"""
+
+import io
+import os
+
+import pytest
+
+from ingest import ingest_upload, UploadTooLarge
+from manifest import get_manifest
+
+
+def test_upload_over_the_limit_is_rejected_and_leaves_nothing_behind(tmp_path):
+    input_dir = str(tmp_path)
+
+    with pytest.raises(UploadTooLarge):
+        ingest_upload(io.BytesIO(b"%PDF" + b"x" * 100), "big.pdf", input_dir, max_bytes=64)
+
+    assert os.listdir(input_dir) == []
+
+
+def test_identical_content_is_stored_once(tmp_path):
+    input_dir = str(tmp_path)
+    content = b"%PDF-1.4 same bytes"
+
+    first = ingest_upload(io.BytesIO(content), "report.pdf", input_dir)
+    second = ingest_upload(io.BytesIO(content), "copy of report.pdf", input_dir)
+
+    assert not first.duplicate and second.duplicate
+    assert second.filename == first.filename == "report.pdf"
+    assert second.digest == first.digest
+    assert sorted(name for name in os.listdir(input_dir) if name.endswith(".pdf")) == ["report.pdf"]
+    assert get_manifest(input_dir).find_by_digest(first.digest) == "report.pdf"
+
+
+def test_unusable_filename_falls_back_to_digest_name(tmp_path):
+    input_dir = str(tmp_path)
+
+    for n, name in enumerate(["../.pdf", "報告.pdf"]):
+        upload = ingest_upload(io.BytesIO(b"%PDF-1.4 " + bytes([n])), name, input_dir)
+        assert upload.filename == f"upload-{upload.digest[:12]}.pdf"
+        assert os.path.dirname(upload.path) == input_dir and os.path.exists(upload.path)
+
+
+def test_only_small_uploads_are_kept_in_memory(tmp_path):
+    input_dir = str(tmp_path)
+
+    small = ingest_upload(io.BytesIO(b"%PDF small"), "small.pdf", input_dir, memory_max_bytes=16)
+    large = ingest_upload(io.BytesIO(b"%PDF" + b"x" * 32), "large.pdf", input_dir, memory_max_bytes=16)
+
+    assert small.data == b"%PDF small"
+    assert large.data is None and large.size == 36
+    with open(large.path, "rb") as f:
+        assert f.read() == b"%PDF" + b"x" * 32
@@ -0,0 +1,78 @@
+"""
+Offline tests for background analysis jobs shared between worker processes
+"""
+
+import os
+import time
+import threading
+
+import pytest
+
+from job_manager import JobManager, JobQueueFull
+
+
+def _wait_for(manager, job_id, status, condition=lambda job: True, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = manager.get(job_id)
+        if job and job["status"] == status and condition(job):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} never reached {status}")
+
+
+def test_job_is_visible_to_another_manager(tmp_path):
+    job_dir = str(tmp_path / "jobs")
+    accepting, polling = JobManager(job_dir=job_dir), JobManager(job_dir=job_dir)
+    release = threading.Event()
+
+    def analysis(persona, progress_callback):
+        progress_callback({"pages_done": 1, "pages_total": 2})
+        release.wait(5)
+        return {"metadata": {"persona": persona}, "sections": [], "subsections": []}
+
+    job_id = accepting.submit(analysis, "Planner")
+
+    running = _wait_for(polling, job_id, "running", lambda job: job["progress"])
+    assert running["progress"] == {"pages_done": 1, "pages_total": 2}
+    assert polling.result(job_id) is None
+
+    release.set()
+    _wait_for(polling, job_id, "completed")
+    assert polling.result(job_id) == {"metadata": {"persona": "Planner"}, "sections": [], "subsections": []}
+
+
+def test_failed_job_and_unknown_ids(tmp_path):
+    manager = JobManager(job_dir=str(tmp_path / "jobs"))
+
+    def failing(progress_callback):
+        raise Exception("no pages")
+
+    job_id = manager.submit(failing)
+
+    assert _wait_for(manager, job_id, "failed")["error"] == "no pages"
+    assert manager.get("0" * 32) is None
+    assert manager.get("../" + job_id) is None
+
+
+def test_pending_limit_and_expiry(tmp_path):
+    job_dir = str(tmp_path / "jobs")
+    manager = JobManager(max_workers=1, max_pending=1, ttl_seconds=60, job_dir=job_dir)
+    release = threading.Event()
+
+    job_id = manager.submit(lambda progress_callback: release.wait(5) and {})
+    with pytest.raises(JobQueueFull):
+        manager.submit(lambda progress_callback: {})
+    release.set()
+    _wait_for(manager, job_id, "completed")
+
+    # Finished an hour ago: expired on the next lookup, while a job still
+    # running elsewhere is kept however old its status file is
+    running_elsewhere = os.path.join(job_dir, "f" * 32 + ".json")
+    with open(running_elsewhere, "w") as f:
+        f.write('{"status": "running", "finished_at": null}')
+    for name in os.listdir(job_dir):
+        os.utime(os.path.join(job_dir, name), (time.time() - 3600, time.time() - 3600))
+
+    assert manager.get(job_id) is None
+    assert os.listdir(job_dir) == [os.path.basename(running_elsewhere)]
@@ -0,0 +1,84 @@
+"""
+Offline tests for the corpus manifest scan
+"""
+
+import os
+
+import manifest as manifest_module
+from manifest import CorpusManifest, get_manifest
+
+
+def _write(path, content):
+    with open(path, "wb") as f:
+        f.write(content)
+
+
+def _scan(input_dir):
+    m = CorpusManifest(input_dir)
+    return m, m.scan()
+
+
+def test_scan_reports_added_modified_unchanged_and_removed(tmp_path, monkeypatch):
+    input_dir = str(tmp_path)
+    _write(os.path.join(input_dir, "a.pdf"), b"%PDF a")
+    _write(os.path.join(input_dir, "b.pdf"), b"%PDF b")
+    _write(os.path.join(input_dir, "notes.txt"), b"not a pdf")
+
+    m, changes = _scan(input_dir)
+    assert changes.added == ["a.pdf", "b.pdf"] and not changes.modified and not changes.removed
+    m.set_artifact("a.pdf", "outline", "output/a.json")
+    m.save()
+
+    hashed = []
+    real_digest = manifest_module.file_digest
+    monkeypatch.setattr(manifest_module, "file_digest", lambda path: hashed.append(os.path.basename(path)) or real_digest(path))
+
+    # Touched without a content change, modified, removed and added
+    os.utime(os.path.join(input_dir, "a.pdf"), ns=(1, 1))
+    _write(os.path.join(input_dir, "b.pdf"), b"%PDF b, edited")
+    _write(os.path.join(input_dir, "c.pdf"), b"%PDF c")
+    m, changes = _scan(input_dir)
+
+    assert changes.unchanged == ["a.pdf"]
+    assert changes.modified == ["b.pdf"]
+    assert changes.added == ["c.pdf"]
+    assert changes.changed == ["b.pdf", "c.pdf"]
+    assert m.artifact("a.pdf", "outline") == "output/a.json"
+    m.save()
+
+    # A file whose size and mtime are unchanged is not hashed again
+    hashed.clear()
+    os.remove(os.path.join(input_dir, "c.pdf"))
+    m, changes = _scan(input_dir)
+    assert hashed == []
+    assert changes.unchanged == ["a.pdf", "b.pdf"]
+    assert list(changes.removed) == ["c.pdf"]
+    assert m.filenames() == ["a.pdf", "b.pdf"]
+
+
+def test_record_and_lookup_by_digest(tmp_path):
+    input_dir = str(tmp_path)
+    _write(os.path.join(input_dir, "a.pdf"), b"%PDF a")
+    m = CorpusManifest(input_dir)
+
+    m.record("a.pdf", "digest-a")
+
+    assert m.digest("a.pdf") == "digest-a"
+    assert m.find_by_digest("digest-a") == "a.pdf"
+    assert m.find_by_digest("other") is None
+
+
+def test_shared_manifest_reloads_after_another_writer(tmp_path):
+    input_dir = str(tmp_path)
+    _write(os.path.join(input_dir, "a.pdf"), b"%PDF a")
+    shared = get_manifest(input_dir)
+    assert get_manifest(input_dir) is shared
+
+    other = CorpusManifest(input_dir)
+    other.scan()
+    other.save()
+    os.utime(other.path, ns=(10 ** 18, 10 ** 18))
+
+    reloaded = get_manifest(input_dir)
+    assert reloaded is not shared
+    assert reloaded.filenames() == ["a.pdf"]
@@ -0,0 +1,38 @@
+"""
+Offline tests for parallel.iter_files / map_files
+"""
+
+import os
+
+from parallel import iter_files, map_files
+
+
+def _length_or_crash(path):
+    if path == "crash.pdf":
+        os._exit(1)  # Simulates a segfault in the worker
+    if path == "error.pdf":
+        raise ValueError("bad file")
+    return len(path)
+
+
+def test_worker_crash_fails_only_its_file():
+    paths = ["a.pdf", "bb.pdf", "crash.pdf", "ccc.pdf", "error.pdf", "dddd.pdf", "eeeee.pdf"]
+
+    results = list(iter_files(_length_or_crash, paths, workers=3))
+
+    assert [path for path, _, _ in results] == paths
+    by_path = {path: (result, error) for path, result, error in results}
+    assert by_path["crash.pdf"][0] is None and "died" in by_path["crash.pdf"][1]
+    assert by_path["error.pdf"] == (None, "bad file")
+    for path in ("a.pdf", "bb.pdf", "ccc.pdf", "dddd.pdf", "eeeee.pdf"):
+        assert by_path[path] == (len(path), None)
+
+
+def test_map_files_in_process_passes_extra_args():
+    seen = []
+    results = map_files(_length_or_crash, ["a.pdf", "error.pdf"], workers=1,
+                        on_result=lambda path, result, error: seen.append(path),
+                        extra_args=[(), ()])
+
+    assert results == [("a.pdf", 5, None), ("error.pdf", None, "bad file")]
+    assert seen == ["a.pdf", "error.pdf"]
@@ -0,0 +1,69 @@
+"""
+Offline tests for parsed_document: the shared decode must match PyMuPDF's
+own get_text() output for both the plain text and the line spans.
+"""
+
+import pytest
+
+fitz = pytest.importorskip("fitz")
+
+from parsed_document import parse_document
+
+
+def _write_pdf(path):
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((72, 72), "Trip Planning Guide", fontsize=18, fontname="hebo")
+    page.insert_text((72, 110), "Body\twith\ttabs and ligatures: office, flow", fontsize=10)
+    page.insert_text((72, 140), "Second Section", fontsize=13, fontname="helv")
+    page = doc.new_page()
+    page.insert_text((72, 72), "Appendix", fontsize=11)
+    page.insert_text((72, 100), "Plain body text on the last page.", fontsize=9)
+    doc.save(path)
+    doc.close()
+
+
+def _expected_spans(doc):
+    rows = []
+    for page_num, page in enumerate(doc):
+        for block in page.get_text("dict")["blocks"]:
+            for line in block.get("lines", []):
+                if line["spans"]:
+                    span = line["spans"][0]
+                    rows.append((page_num, span["text"].strip(), span["size"], span["flags"], span["font"]))
+    return rows
+
+
+def test_parse_document_matches_plain_get_text(tmp_path):
+    pdf_path = str(tmp_path / "sample.pdf")
+    _write_pdf(pdf_path)
+
+    parsed = parse_document(pdf_path)
+
+    with fitz.open(pdf_path) as doc:
+        assert parsed.page_texts() == [page.get_text().strip() for page in doc]
+        expected = _expected_spans(doc)
+
+    spans = parsed.spans
+    rows = [(spans.page[i], spans.text(i), spans.size[i], spans.flags[i], spans.fonts[spans.font_id[i]])
+            for i in range(len(spans))]
+    assert rows == expected
+    assert "�" not in "".join(parsed.page_texts())
+
+
+def test_large_document_is_read_as_text_and_not_cached(tmp_path, monkeypatch):
+    import extraction_cache
+    import parsed_document
+    cache = extraction_cache.ExtractionCache(str(tmp_path / "cache"))
+    monkeypatch.setattr(extraction_cache, "_cache", cache)
+    pdf_path = str(tmp_path / "sample.pdf")
+    _write_pdf(pdf_path)
+    expected = parse_document(pdf_path).page_texts()
+
+    monkeypatch.setattr(parsed_document, "STREAM_PAGE_THRESHOLD", 1)
+    loaded = parsed_document.load_document(pdf_path)
+
+    assert loaded.page_texts() == expected
+    assert len(loaded.spans) == 0
+    assert cache.get(loaded.digest, "document") is None
+    assert cache.stats()["entries"] == 0
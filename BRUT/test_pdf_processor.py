@@ -0,0 +1,160 @@
+"""
+Offline tests for outline extraction and streamed JSON output
+"""
+
+import io
+import json
+
+import pytest
+
+from json_stream import write_json_stream
+
+fitz = pytest.importorskip("fitz")
+
+import pdf_processor
+
+
+def test_json_stream_matches_json_dump():
+    outline = [{"level": "H1", "text": "Überblick \"quoted\"", "page": 1, "font_size": 18.0, "is_bold": True},
+               {"level": "H2", "text": "Nested", "page": 2, "font_size": 13.0, "is_bold": False,
+                "extra": {"list": [1, 2, {"x": None}], "empty": {}}}]
+    fields = {"title": "Doc — 1", "outline": outline, "empty": [], "metadata": {"a": [1, 2], "b": {}}}
+
+    for indent in (2, 4):
+        f = io.StringIO()
+        streamed = {key: iter(value) if isinstance(value, list) else value for key, value in fields.items()}
+        counts = write_json_stream(f, streamed, indent=indent)
+
+        assert f.getvalue() == json.dumps(fields, indent=indent, ensure_ascii=False)
+        assert counts == {"outline": 2, "empty": 0}
+
+    f = io.StringIO()
+    write_json_stream(f, {})
+    assert f.getvalue() == json.dumps({}, indent=2)
+
+
+def _write_pdf(path):
+    doc = fitz.open()
+    for n in range(3):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Chapter {n + 1}", fontsize=18, fontname="hebo")
+        page.insert_text((72, 110), "Background and Motivation", fontsize=13)
+        page.insert_text((72, 140), "Details", fontsize=11)
+        page.insert_text((72, 170), "Body text that is not a heading at all.", fontsize=9)
+        page.insert_text((72, 200), "Details", fontsize=11)
+    doc.save(path)
+    doc.close()
+
+
+def test_streamed_outline_file_matches_json_dump(tmp_path, monkeypatch):
+    import extraction_cache
+    pdf_path = str(tmp_path / "sample.pdf")
+    _write_pdf(pdf_path)
+
+    for large in (False, True):
+        # A fresh cache each time, so the large document is really streamed
+        monkeypatch.setattr(extraction_cache, "_cache", extraction_cache.ExtractionCache(str(tmp_path / f"cache-{large}")))
+        monkeypatch.setattr(pdf_processor, "is_large_document", lambda *args: large)
+        output_path = str(tmp_path / f"outline-{large}.json")
+
+        headings = pdf_processor.write_outline(pdf_path, output_path, use_bookmarks=False)
+
+        expected = pdf_processor.extract_outline(pdf_path, use_bookmarks=False)
+        with open(output_path, encoding="utf-8") as f:
+            assert f.read() == json.dumps(expected, indent=2, ensure_ascii=False)
+        assert headings == len(expected["outline"]) == 9
+
+
+def test_outline_of_deleted_pdf_is_removed_whoever_scans_first(tmp_path, monkeypatch):
+    import os
+    import doc_analyzer
+    import extraction_cache
+    monkeypatch.setattr(extraction_cache, "_cache", extraction_cache.ExtractionCache(str(tmp_path / "cache")))
+    monkeypatch.setattr(doc_analyzer, "get_classifier", lambda: None)
+    input_dir, output_dir = str(tmp_path / "input"), str(tmp_path / "output")
+    os.makedirs(input_dir)
+    for name in ("doc1.pdf", "doc2.pdf"):
+        _write_pdf(os.path.join(input_dir, name))
+
+    assert pdf_processor.process_pdfs(input_dir, output_dir, workers=1) == {"doc1.pdf": None, "doc2.pdf": None}
+    os.remove(os.path.join(input_dir, "doc1.pdf"))
+
+    # Analysis scans the corpus first and sees the deletion
+    doc_analyzer.analyze_documents(input_dir, "Student", "learn the background", None, workers=1)
+    assert pdf_processor.process_pdfs(input_dir, output_dir, workers=1) == {}
+
+    assert sorted(os.listdir(output_dir)) == ["doc2_outline.json"]
+
+
+def _write_bookmarked_pdf(path, toc):
+    _write_pdf(path)
+    doc = fitz.open(path)
+    doc.set_toc(toc)
+    doc.save(path, incremental=True, encryption=fitz.PDF_ENCRYPT_KEEP)
+    doc.close()
+
+
+def test_well_formed_bookmarks_become_the_outline(tmp_path, monkeypatch):
+    import extraction_cache
+    monkeypatch.setattr(extraction_cache, "_cache", extraction_cache.ExtractionCache(str(tmp_path / "cache")))
+    pdf_path = str(tmp_path / "bookmarked.pdf")
+    _write_bookmarked_pdf(pdf_path, [[1, "Introduction", 1], [2, " Scope ", 1], [3, "Terms", 2],
+                                     [4, "Deep detail", 2], [1, "Conclusion", 3]])
+
+    result = pdf_processor.extract_outline(pdf_path, use_bookmarks=True)
+
+    assert result["metadata"]["extraction_method"] == "embedded_bookmarks"
+    assert result["outline"] == [{"level": "H1", "text": "Introduction", "page": 1},
+                                 {"level": "H2", "text": "Scope", "page": 1},
+                                 {"level": "H3", "text": "Terms", "page": 2},
+                                 {"level": "H3", "text": "Deep detail", "page": 2},
+                                 {"level": "H1", "text": "Conclusion", "page": 3}]
+
+
+def test_malformed_bookmark_trees_are_rejected():
+    well_formed = [[1, "One", 1], [2, "One.A", 2], [1, "Two", 3]]
+    assert pdf_processor._is_well_formed_toc(well_formed, total_pages=3)
+
+    assert not pdf_processor._is_well_formed_toc([], total_pages=3)
+    # Skips from level 1 to level 3, or starts below level 1
+    assert not pdf_processor._is_well_formed_toc([[1, "One", 1], [3, "One.A.i", 2]], total_pages=3)
+    assert not pdf_processor._is_well_formed_toc([[2, "One.A", 1]], total_pages=3)
+    # Points at no page, or past the last one
+    assert not pdf_processor._is_well_formed_toc([[1, "One", -1]], total_pages=3)
+    assert not pdf_processor._is_well_formed_toc([[1, "One", 4]], total_pages=3)
+    assert not pdf_processor._is_well_formed_toc([[1, "One", 1], [1, "  ", 2]], total_pages=3)
+
+
+def test_bookmarks_with_empty_titles_fall_back_to_fonts(tmp_path, monkeypatch):
+    import extraction_cache
+    monkeypatch.setattr(extraction_cache, "_cache", extraction_cache.ExtractionCache(str(tmp_path / "cache")))
+    pdf_path = str(tmp_path / "untitled.pdf")
+    _write_bookmarked_pdf(pdf_path, [[1, "Chapter 1", 1], [1, "", 2]])
+
+    assert not pdf_processor._read_bookmark_outline(pdf_path)["valid"]
+    result = pdf_processor.extract_outline(pdf_path, use_bookmarks=True)
+
+    assert result["metadata"]["extraction_method"] == "font_based_heuristics"
+    assert result == pdf_processor.extract_outline(pdf_path, use_bookmarks=False)
+
+
+def test_numpy_heading_rows_match_the_row_by_row_rules(tmp_path):
+    import random
+    pytest.importorskip("numpy")
+    from parsed_document import parse_document
+    from span_table import SpanTable
+
+    rng = random.Random(7)
+    table = SpanTable()
+    # Sizes on and around each threshold, bold and non-bold flags, short
+    # texts and texts repeated within and across pages
+    for _ in range(2000):
+        table.append(rng.randrange(6), rng.choice(["Intro", "Methods", "ab", " x ", "", "Results", "Intro "]),
+                     rng.choice([9.0, 10.0, 10.01, 12.0, 12.5, 14.0, 14.01, 18.0]), rng.choice([0, 4, 16, 20]))
+    pdf_path = str(tmp_path / "sample.pdf")
+    _write_pdf(pdf_path)
+
+    for spans in (table, parse_document(pdf_path).spans, SpanTable()):
+        expected = list(pdf_processor._heading_rows(spans))
+        assert [tuple(row) for row in pdf_processor._heading_rows_numpy(spans)] == expected
+    assert expected == [] and len(list(pdf_processor._heading_rows(table))) > 20
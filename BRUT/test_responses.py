@@ -0,0 +1,38 @@
+"""
+Offline tests for JSON responses: ETags and 304s only for GET and HEAD
+"""
+
+import pytest
+
+flask = pytest.importorskip("flask")
+
+from responses import json_response
+
+
+@pytest.fixture
+def client():
+    app = flask.Flask(__name__)
+
+    @app.route("/result", methods=["GET", "POST"])
+    def result():
+        return json_response({"sections": [1, 2, 3]}, etag="result-1")
+
+    return app.test_client()
+
+
+def test_get_revalidates_with_etag(client):
+    first = client.get("/result")
+    assert first.status_code == 200
+    assert first.headers["ETag"] == 'W/"result-1"'
+
+    again = client.get("/result", headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304
+    assert again.data == b""
+
+
+def test_post_is_never_conditional(client):
+    response = client.post("/result", headers={"If-None-Match": 'W/"result-1"'})
+
+    assert response.status_code == 200
+    assert response.get_json() == {"sections": [1, 2, 3]}
+    assert "ETag" not in response.headers
@@ -0,0 +1,49 @@
+"""
+Offline tests for the classifier score cache
+"""
+
+from score_cache import ScoreCache, score_key
+
+
+def test_score_key_normalizes_job_only():
+    key = score_key("page text", "Plan a  Trip ", "model-a")
+
+    assert key == score_key("page text", "plan a trip", "model-a")
+    assert key != score_key("page text ", "plan a trip", "model-a")
+    assert key != score_key("page text", "plan a trip", "model-b")
+    # Parts are separated, so moving text between them changes the key
+    assert score_key("ab", "c", "m") != score_key("a", "bc", "m")
+
+
+def test_lru_evicts_least_recently_used():
+    cache = ScoreCache(max_entries=2, path="")
+    cache.put("a", 0.1)
+    cache.put("b", 0.2)
+    assert cache.get("a") == 0.1  # "b" is now the oldest
+    cache.put("c", 0.3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 0.1 and cache.get("c") == 0.3
+    assert cache.stats()["entries"] == 2
+    assert (cache.stats()["hits"], cache.stats()["misses"]) == (3, 1)
+
+
+def test_zero_score_is_a_hit():
+    cache = ScoreCache(path="")
+    cache.put_many({"irrelevant": 0.0})
+
+    assert cache.get("irrelevant") == 0.0
+    assert cache.stats()["hits"] == 1
+
+
+def test_scores_persist_across_instances(tmp_path):
+    path = str(tmp_path / "scores" / "scores.sqlite")
+    ScoreCache(path=path).put_many({"a": 0.25, "b": 0.75})
+
+    reopened = ScoreCache(max_entries=1, path=path)
+
+    assert reopened.stats()["persistent"] is True
+    assert reopened.get("a") == 0.25
+    assert reopened.get("b") == 0.75  # Evicts "a" from memory, still on disk
+    assert reopened.get("a") == 0.25
+    assert reopened.get("missing") is None
@@ -0,0 +1,48 @@
+"""
+Offline tests for atomic writes and shared file-backed instances
+"""
+
+import os
+
+import pytest
+
+from shared_files import atomic_write, SharedInstances
+
+
+def test_atomic_write_replaces_only_on_success(tmp_path):
+    path = str(tmp_path / "data.json")
+    with atomic_write(path) as f:
+        f.write("first")
+
+    with pytest.raises(RuntimeError):
+        with atomic_write(path) as f:
+            f.write("partial")
+            raise RuntimeError("interrupted")
+
+    with open(path, encoding="utf-8") as f:
+        assert f.read() == "first"
+    assert os.listdir(str(tmp_path)) == ["data.json"]
+
+
+class _Loaded:
+    def __init__(self, path):
+        self.loaded_mtime = os.path.getmtime(path) if os.path.exists(path) else None
+        self._dirty = False
+
+
+def test_shared_instances_reload_when_the_file_changes(tmp_path):
+    path = str(tmp_path / "index.json")
+    shared = SharedInstances()
+    first = shared.get(path, lambda: _Loaded(path))
+    assert shared.get(path, lambda: _Loaded(path)) is first
+
+    with atomic_write(path) as f:
+        f.write("{}")
+    second = shared.get(path, lambda: _Loaded(path))
+    assert second is not first
+
+    # Unsaved changes are never thrown away
+    second._dirty = True
+    os.utime(path, ns=(10 ** 18, 10 ** 18))
+    assert shared.get(path, lambda: _Loaded(path)) is second
+    assert shared.get(path, lambda: _Loaded(path), key=(path, "other")) is not second
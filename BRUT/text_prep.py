@@ -0,0 +1,95 @@
+import os
+import re
+import logging
+from typing import Dict, List, Any, Tuple
+
+# Premise tokens sent to the classifier per page
+CLASSIFIER_MAX_TOKENS = int(os.environ.get("CLASSIFIER_MAX_TOKENS", "256"))
+
+_WORD_RE = re.compile(r"\S+")
+
+def prepare_texts(texts: List[str], tokenizer=None,
+                  max_tokens: int = CLASSIFIER_MAX_TOKENS) -> Tuple[List[str], List[int]]:
+    """
+    Cut each text to a token budget and measure its token length
+
+    With a fast Hugging Face tokenizer the cut lands exactly on the end of
+    the last kept token (via offset mappings), so the original text is
+    preserved and no token is split. Slow tokenizers decode the kept ids.
+    Without a tokenizer, whitespace-separated words stand in for tokens.
+
+    This pass only truncates and sizes the premises for length bucketing;
+    the model input is still encoded from text, as (premise, hypothesis)
+    pairs, when the batch is scored. Re-encoding a premise already cut to
+    max_tokens is cheap next to the forward pass, and encoding the pair
+    lets the tokenizer place the separator tokens.
+
+    Args:
+        texts: Page texts
+        tokenizer: Tokenizer of the model that will score the texts
+        max_tokens: Maximum tokens kept per text
+
+    Returns:
+        (truncated texts, token count of each truncated text)
+    """
+    if tokenizer is None:
+        return _prepare_by_words(texts, max_tokens)
+
+    try:
+        if getattr(tokenizer, "is_fast", False):
+            encoded = tokenizer(texts, add_special_tokens=False, truncation=True,
+                                max_length=max_tokens, return_offsets_mapping=True)
+            prepared, lengths = [], []
+            for text, ids, offsets in zip(texts, encoded["input_ids"], encoded["offset_mapping"]):
+                end = offsets[-1][1] if offsets else 0
+                prepared.append(text[:end])
+                lengths.append(len(ids))
+            return prepared, lengths
+
+        encoded = tokenizer(texts, add_special_tokens=False, truncation=True, max_length=max_tokens)
+        prepared = [tokenizer.decode(ids, skip_special_tokens=True) for ids in encoded["input_ids"]]
+        return prepared, [len(ids) for ids in encoded["input_ids"]]
+    except Exception as e:
+        logging.warning(f"Tokenizer failed, truncating by words: {str(e)}")
+        return _prepare_by_words(texts, max_tokens)
+
+def length_buckets(lengths: List[int], batch_size: int) -> List[List[int]]:
+    """
+    Group input indices into batches of similar token length
+
+    Inputs are sorted by length and cut into consecutive runs of batch_size,
+    so each batch pads to a length close to that of its shortest member.
+
+    Returns:
+        Lists of indices into lengths, one list per batch
+    """
+    batch_size = max(1, batch_size)
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    return [order[start:start + batch_size] for start in range(0, len(order), batch_size)]
+
+def padding_stats(lengths: List[int], buckets: List[List[int]]) -> Dict[str, Any]:
+    """
+    Compare tokens actually used with the padded total the model computes over
+
+    Counts premise tokens only; the hypothesis and special tokens add the
+    same amount to every input.
+    """
+    used = sum(lengths[i] for bucket in buckets for i in bucket)
+    padded = sum(max((lengths[i] for i in bucket), default=0) * len(bucket) for bucket in buckets)
+    return {
+        "used_tokens": used,
+        "padded_tokens": padded,
+        "padding_efficiency": round(used / padded, 3) if padded else 1.0
+    }
+
+def _prepare_by_words(texts: List[str], max_tokens: int) -> Tuple[List[str], List[int]]:
+    prepared, lengths = [], []
+    for text in texts:
+        words = list(_WORD_RE.finditer(text))
+        if len(words) > max_tokens:
+            prepared.append(text[:words[max_tokens - 1].end()])
+            lengths.append(max_tokens)
+        else:
+            prepared.append(text)
+            lengths.append(len(words))
+    return prepared, lengths
@@ -0,0 +1,308 @@
+import io
+import os
+import json
+import math
+import zlib
+import logging
+import threading
+from collections import Counter
+from typing import Dict, List, Any, Optional, Set, Tuple
+from bm25_index import tokenize
+from shared_files import atomic_write, SharedInstances
+
+# Import numpy with fallback
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+VECTOR_INDEX_FILENAME = ".vector_index.npz"
+DENSE_EMBEDDER = os.environ.get("DENSE_EMBEDDER", "hashing")
+DENSE_DIMENSIONS = int(os.environ.get("DENSE_DIMENSIONS", "4096"))
+DENSE_CHUNK_WORDS = int(os.environ.get("DENSE_CHUNK_WORDS", "200"))
+
+# Bump when the on-disk layout changes so old indexes are rebuilt
+INDEX_FORMAT_VERSION = 2
+
+class HashingEmbedder:
+    """
+    Offline embedder: signed feature hashing of unigrams and bigrams
+
+    Term weights are sublinear (1 + log tf) and rows are L2-normalized, so a
+    dot product is a cosine similarity. Needs no model download and gives
+    the same vectors in every process.
+    """
+
+    def __init__(self, dimensions: int = DENSE_DIMENSIONS):
+        self.dimensions = dimensions
+        self.name = f"hashing-{dimensions}"
+
+    def encode(self, texts: List[str]) -> "np.ndarray":
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            features = Counter(tokens)
+            features.update(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+            for feature, tf in features.items():
+                hashed = zlib.crc32(feature.encode("utf-8"))
+                sign = 1.0 if hashed & 0x80000000 else -1.0
+                vectors[row, hashed % self.dimensions] += sign * (1.0 + math.log(tf))
+        return _normalize(vectors)
+
+class SentenceTransformerEmbedder:
+    """
+    Embedder backed by a sentence-transformers model (optional dependency)
+    """
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.name = f"sentence-transformers:{model_name}"
+
+    def encode(self, texts: List[str]) -> "np.ndarray":
+        vectors = self.model.encode(texts, convert_to_numpy=True, show_progress_bar=False)
+        return _normalize(vectors.astype(np.float32))
+
+_embedders = {}
+
+def get_embedder(spec: str = DENSE_EMBEDDER):
+    """
+    Return a shared embedder for a spec: "hashing" or "sentence-transformers:<model>"
+    """
+    if not NUMPY_AVAILABLE:
+        raise Exception("Dense retrieval requires numpy")
+
+    if spec not in _embedders:
+        if spec == "hashing":
+            _embedders[spec] = HashingEmbedder()
+        elif spec.startswith("sentence-transformers:"):
+            _embedders[spec] = SentenceTransformerEmbedder(spec.split(":", 1)[1])
+        else:
+            raise Exception(f"Unknown dense embedder: {spec}")
+    return _embedders[spec]
+
+def chunk_page(text: str, chunk_words: int = DENSE_CHUNK_WORDS) -> List[str]:
+    """
+    Split page text into chunks of roughly chunk_words words
+    """
+    words = text.split()
+    return [" ".join(words[i:i + chunk_words]) for i in range(0, len(words), chunk_words)]
+
+class VectorIndex:
+    """
+    NumPy-backed index of page-chunk embeddings, saved next to the corpus
+
+    Rows of `vectors` are L2-normalized chunk embeddings; `doc_ids` and
+    `page_numbers` say where each chunk came from. PDFs are embedded once
+    per content hash, and the whole index is rebuilt if the embedder
+    changes. A query is one encode call plus a matrix-vector product. As in
+    the BM25 index, each page keeps a small info dict from the caller.
+    """
+
+    def __init__(self, path: str, embedder):
+        self.path = path
+        self.embedder = embedder
+        self.lock = threading.RLock()
+        self.documents = []  # [{"filename": ..., "digest": ..., "pages": [info per page]}]
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+        self.doc_ids = np.zeros(0, dtype=np.int32)
+        self.page_numbers = np.zeros(0, dtype=np.int32)
+        self.loaded_mtime = None
+        self._dirty = False
+        self._load()
+
+    def update_document(self, filename: str, digest: str, page_texts: List[str],
+                        page_info: Optional[List[Dict[str, Any]]] = None) -> bool:
+        """
+        Embed a PDF's page chunks unless this content version is already indexed
+
+        Args:
+            page_info: JSON-serializable info kept for each page (see page_info())
+
+        Returns:
+            True if the index changed
+        """
+        with self.lock:
+            for entry in self.documents:
+                if entry["filename"] == filename and entry["digest"] == digest:
+                    return False
+            self.remove_document(filename)
+
+            chunks, pages = [], []
+            for page_num, text in enumerate(page_texts):
+                for chunk in chunk_page(text):
+                    chunks.append(chunk)
+                    pages.append(page_num + 1)
+
+            doc_id = len(self.documents)
+            self.documents.append({"filename": filename, "digest": digest,
+                                   "pages": list(page_info) if page_info else [{} for _ in page_texts]})
+            if chunks:
+                vectors = self.embedder.encode(chunks)
+                self.vectors = vectors if not len(self.doc_ids) else np.vstack([self.vectors, vectors])
+                self.doc_ids = np.concatenate([self.doc_ids, np.full(len(chunks), doc_id, dtype=np.int32)])
+                self.page_numbers = np.concatenate([self.page_numbers, np.array(pages, dtype=np.int32)])
+
+            self._dirty = True
+            return True
+
+    def remove_document(self, filename: str) -> bool:
+        """
+        Drop a PDF's rows and renumber the remaining documents
+        """
+        with self.lock:
+            doc_id = next((i for i, entry in enumerate(self.documents) if entry["filename"] == filename), None)
+            if doc_id is None:
+                return False
+
+            keep = self.doc_ids != doc_id
+            self.vectors = self.vectors[keep]
+            self.page_numbers = self.page_numbers[keep]
+            doc_ids = self.doc_ids[keep]
+            self.doc_ids = np.where(doc_ids > doc_id, doc_ids - 1, doc_ids).astype(np.int32)
+            del self.documents[doc_id]
+
+            self._dirty = True
+            return True
+
+    def is_current(self, filename: str, digest: Optional[str]) -> bool:
+        """
+        Whether this content version of a PDF is indexed
+        """
+        with self.lock:
+            return any(entry["filename"] == filename and entry["digest"] == digest for entry in self.documents)
+
+    def page_info(self, filename: str) -> List[Dict[str, Any]]:
+        """
+        The info stored for each page of an indexed PDF, in page order
+        """
+        with self.lock:
+            return next((entry["pages"] for entry in self.documents if entry["filename"] == filename), [])
+
+    def retain(self, filenames: List[str]) -> None:
+        """
+        Remove every indexed document not in filenames (e.g. deleted uploads)
+        """
+        keep = set(filenames)
+        with self.lock:
+            for filename in [entry["filename"] for entry in self.documents if entry["filename"] not in keep]:
+                self.remove_document(filename)
+
+    def search(self, query: str, top_k: int,
+               pages: Optional[Set[Tuple[str, int]]] = None) -> Dict[Tuple[str, int], float]:
+        """
+        Return the top_k pages most similar to the query
+
+        A page's similarity is that of its best-matching chunk. With pages,
+        only chunks of those (filename, page_number) pages are considered;
+        the mask is built from the chunk arrays, so its cost in Python grows
+        with the number of candidate pages, not chunks.
+
+        Returns:
+            {(filename, page_number): cosine similarity}
+        """
+        with self.lock:
+            if not len(self.doc_ids) or top_k <= 0:
+                return {}
+
+            similarities = self.vectors @ self.embedder.encode([query])[0]
+            available = len(similarities)
+            if pages is not None:
+                allowed = self._page_mask(pages)
+                available = int(allowed.sum())
+                if not available:
+                    return {}
+                if available < len(allowed):
+                    similarities = np.where(allowed, similarities, -np.inf)
+
+            best = {}
+            # Over-fetch chunks so that top_k distinct pages survive aggregation
+            candidates = min(available, top_k * 4)
+            order = np.argpartition(-similarities, candidates - 1)[:candidates]
+            for row in order[np.argsort(-similarities[order])]:
+                key = (self.documents[self.doc_ids[row]]["filename"], int(self.page_numbers[row]))
+                if key not in best:
+                    best[key] = float(similarities[row])
+                    if len(best) == top_k:
+                        break
+            return best
+
+    def _page_mask(self, pages: Set[Tuple[str, int]]) -> "np.ndarray":
+        """
+        Boolean mask of the chunks that belong to the given pages
+
+        Each chunk's (doc_id, page_number) is packed into one integer key and
+        matched against the keys of the wanted pages with np.isin.
+        """
+        doc_index = {entry["filename"]: doc_id for doc_id, entry in enumerate(self.documents)}
+        stride = int(self.page_numbers.max()) + 1
+        wanted = np.fromiter((doc_index[filename] * stride + page for filename, page in pages
+                              if filename in doc_index and 0 <= page < stride), dtype=np.int64)
+        keys = self.doc_ids.astype(np.int64) * stride + self.page_numbers
+        return np.isin(keys, wanted)
+
+    def save(self) -> None:
+        """
+        Persist the index if it changed since it was loaded or last saved
+        """
+        with self.lock:
+            if not self._dirty:
+                return
+
+            meta = json.dumps({"version": INDEX_FORMAT_VERSION, "embedder": self.embedder.name,
+                               "documents": self.documents})
+            buffer = io.BytesIO()
+            np.savez(buffer, vectors=self.vectors, doc_ids=self.doc_ids,
+                     page_numbers=self.page_numbers, meta=np.array(meta))
+
+            with atomic_write(self.path, "wb") as f:
+                f.write(buffer.getvalue())
+
+            self._dirty = False
+            self.loaded_mtime = os.path.getmtime(self.path)
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "embedder": self.embedder.name,
+                "documents": len(self.documents),
+                "chunks": int(len(self.doc_ids))
+            }
+
+    def _load(self) -> None:
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                meta = json.loads(str(data["meta"]))
+                if meta.get("version") != INDEX_FORMAT_VERSION:
+                    return
+                if meta["embedder"] != self.embedder.name:
+                    logging.info(f"Rebuilding vector index: embedder changed to {self.embedder.name}")
+                    return
+                self.vectors = data["vectors"]
+                self.doc_ids = data["doc_ids"]
+                self.page_numbers = data["page_numbers"]
+                self.documents = meta["documents"]
+            self.loaded_mtime = os.path.getmtime(self.path)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logging.warning(f"Rebuilding unreadable vector index {self.path}: {str(e)}")
+
+_indexes = SharedInstances()
+
+def get_vector_index(input_dir: str, embedder_spec: str = DENSE_EMBEDDER) -> VectorIndex:
+    """
+    Return the vector index stored alongside a corpus directory
+
+    Shared within the process, one per embedder (see
+    shared_files.SharedInstances).
+    """
+    embedder = get_embedder(embedder_spec)
+    path = os.path.join(input_dir, VECTOR_INDEX_FILENAME)
+    return _indexes.get(path, lambda: VectorIndex(path, embedder), key=(path, embedder_spec))
+
+def _normalize(vectors: "np.ndarray") -> "np.ndarray":
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms